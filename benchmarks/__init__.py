@@ -0,0 +1,9 @@
+'''
+Benchmarks for the site. These run against a local SQLite database using benchmarks.settings, so no Postgres
+server is needed. Run a benchmark as a module from the project root, for example:
+
+    python -m benchmarks.login_storm
+
+benchmarks.run is the main suite; it seeds data with benchmarks.seed, runs every scenario and compares against a
+saved baseline.
+'''
@@ -0,0 +1,70 @@
+'''
+Latency of cheap GETs while a storm of logins is going on.
+
+A thread pool stands in for the WSGI worker threads. Logins and GETs are submitted to it interleaved and the
+latency of each GET is measured from the time it was submitted, so time spent queued behind logins that are
+pinning the workers counts. The run is done once hashing inline and once with the hashing pool.
+
+    python -m benchmarks.login_storm [--threads 8] [--logins 400] [--gets 400]
+'''
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import setup, summarize
+
+LOGIN_URL = '/controllers/admin/authentication/'
+GET_URL = '/db/models/label/'
+
+def seed():
+    from db.models import Poster, Label
+    user = Poster.objects.create_user('storm@example.com', 'password')
+    user.level = 3
+    user.save()
+    for i in range(20):
+        Label.objects.create(name = 'label{}'.format(i), user = user)
+
+def login():
+    from django.test import Client
+    r = Client().post(LOGIN_URL, json.dumps({'email' : 'storm@example.com', 'password' : 'password'}),
+                      content_type = 'application/json')
+    return r.status_code
+
+def get(submitted):
+    from django.test import Client
+    Client().get(GET_URL)
+    return time.perf_counter() - submitted
+
+def run(threads, logins, gets):
+    statuses = {}
+    latencies = []
+    with ThreadPoolExecutor(max_workers = threads) as workers:
+        login_futures, get_futures = [], []
+        for i in range(max(logins, gets)):
+            if i < logins:
+                login_futures.append(workers.submit(login))
+            if i < gets:
+                get_futures.append(workers.submit(get, time.perf_counter()))
+        for f in login_futures:
+            statuses[f.result()] = statuses.get(f.result(), 0) + 1
+        latencies = [f.result() for f in get_futures]
+    return latencies, statuses
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split('\n')[0])
+    parser.add_argument('--threads', type = int, default = 8, help = 'stand-in WSGI worker threads')
+    parser.add_argument('--logins', type = int, default = 400)
+    parser.add_argument('--gets', type = int, default = 400)
+    args = parser.parse_args()
+
+    setup()
+    from django.test.utils import override_settings
+    seed()
+    for name, workers in (('inline hashing', 0), ('hashing pool', 2)):
+        with override_settings(HASHING_POOL_WORKERS = workers):
+            latencies, statuses = run(args.threads, args.logins, args.gets)
+        print(summarize('GET during storm, ' + name, latencies), 'login statuses:', statuses)
+
+if __name__ == '__main__':
+    main()
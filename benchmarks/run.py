@@ -0,0 +1,170 @@
+'''
+The benchmark suite. Seeds a fresh SQLite database and runs each scenario through the full middleware stack with
+the Django test client, reporting throughput, p50/p99 latency, queries per request and peak Python memory.
+
+Save a run as the baseline and compare later runs against it to see regressions:
+
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json [--fail-on-regression]
+
+Use --only to run some of the scenarios and the seed options (see benchmarks.seed) to change the data volume.
+'''
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from benchmarks import seed as seeder
+from benchmarks.utils import setup, sync_replicas, percentile, queries
+
+def _client(login = None):
+    from django.test import Client
+    c = Client()
+    if login:
+        c.post('/controllers/admin/authentication/', json.dumps({'email' : login, 'password' : 'password'}),
+               content_type = 'application/json')
+    return c
+
+def scenarios(sizes):
+    '''
+    Get the scenarios as (name, setup) pairs where setup returns a function that runs a single request.
+    '''
+    ids = ','.join(str(i) for i in range(1, min(sizes['posts'], 50) + 1))
+
+    def get(url):
+        def make():
+            c = _client()
+            return lambda i: c.get(url)
+        return make
+
+    def columnar():
+        c = _client()
+        def run(i):
+            resp = c.get('/db/models/post/?_format=columnar')
+            b''.join(resp.streaming_content) #the rows are read and encoded as the stream is consumed
+            return resp
+        return run
+
+    def bulk_write():
+        c = _client()
+        def run(i):
+            data = [{"post_id" : (i * 10 + j) % sizes['posts'] + 1, "user_id" : 1, "text" : "Bulk comment."}
+                    for j in range(10)]
+            return c.post('/db/models/comment/', json.dumps({"data" : data}), content_type = 'application/json')
+        return run
+
+    def post_snapshot():
+        c = _client()
+        return lambda i: c.get('/db/models/post/{}/?_expand&_depth=1'.format(i % 50 + 1))
+
+    def by_label():
+        c = _client()
+        return lambda i: c.get('/controllers/blog/search/post/bylabel/label{}/'.format(i % 10))
+
+    def login():
+        c = _client()
+        body = json.dumps({'email' : 'poster1@example.com', 'password' : 'password'})
+        return lambda i: c.post('/controllers/admin/authentication/', body, content_type = 'application/json')
+
+    return [
+        ("get_plain", get('/db/models/post/')),
+        ("get_fields", get('/db/models/post/?_fields=id,title')),
+        ("get_columnar", columnar),
+        ("get_expand", get('/db/models/post/?_expand&ids=' + ids)),
+        ("get_expand_depth2", get('/db/models/post/?_expand&_depth=2&ids=' + ids)),
+        ("post_snapshot", post_snapshot),
+        ("bulk_write", bulk_write),
+        ("by_label", by_label),
+        ("login", login),
+    ]
+
+#the requests of the separate pass that peak memory is measured in
+memory_requests = 50
+
+def measure(make, requests):
+    '''
+    Run a scenario and get its numbers. Tracing allocations slows every request down, so peak memory is measured in
+    a second pass of at most memory_requests requests and the timed pass runs without it. Queries are counted on
+    every connection and thread (see benchmarks.utils.count_queries).
+    '''
+    run = make()
+    run(0) #warm up
+    latencies = []
+    statuses = {}
+    before = queries()
+    start = time.perf_counter()
+    for i in range(requests):
+        t = time.perf_counter()
+        status = run(i).status_code
+        latencies.append(time.perf_counter() - t)
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - start
+    count = queries() - before
+    tracemalloc.start()
+    for i in range(min(requests, memory_requests)):
+        run(requests + i)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"requests" : requests, "throughput" : requests / elapsed,
+            "p50_ms" : percentile(latencies, 50) * 1000, "p99_ms" : percentile(latencies, 99) * 1000,
+            "queries" : count / float(requests), "peak_kb" : peak / 1024.0,
+            "statuses" : {str(k) : v for k, v in statuses.items()}}
+
+#how much worse a number may get before it is called a regression
+tolerances = {"throughput" : -0.15, "p50_ms" : 0.20, "p99_ms" : 0.30, "queries" : 0.0, "peak_kb" : 0.25}
+
+def compare(results, baseline):
+    '''
+    Print each number next to its baseline and get the list of regressions.
+    '''
+    regressions = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            continue
+        for key, tolerance in sorted(tolerances.items()):
+            if not b[key]:
+                continue
+            change = (r[key] - b[key]) / b[key]
+            worse = change < tolerance if tolerance < 0 else change > tolerance
+            print("  {:<20} {:<11} {:>10.2f} -> {:>10.2f} ({:+.1%}){}".format(
+                name, key, b[key], r[key], change, "  REGRESSION" if worse else ""))
+            if worse:
+                regressions.append((name, key))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split('\n')[0])
+    parser.add_argument('--requests', type = int, default = 200, help = 'requests per scenario')
+    parser.add_argument('--only', default = '', help = 'csv of scenario names to run')
+    parser.add_argument('--baseline', help = 'json file of a previous run to compare against')
+    parser.add_argument('--save-baseline', help = 'write the results to this json file')
+    parser.add_argument('--fail-on-regression', action = 'store_true')
+    seeder.add_arguments(parser)
+    args = parser.parse_args()
+
+    setup()
+    sizes = seeder.seed(**{k : getattr(args, k) for k in seeder.defaults})
+    sync_replicas()
+    print("Seeded", sizes)
+    only = set(filter(None, args.only.split(',')))
+    results = {}
+    for name, make in scenarios(sizes):
+        if only and name not in only:
+            continue
+        r = results[name] = measure(make, args.requests)
+        print("{:<20} {:>8.1f} req/s  p50={:8.2f}ms  p99={:8.2f}ms  queries={:6.1f}  peak={:8.0f}KB  {}".format(
+            name, r["throughput"], r["p50_ms"], r["p99_ms"], r["queries"], r["peak_kb"], r["statuses"]))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
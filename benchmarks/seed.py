@@ -0,0 +1,98 @@
+'''
+Synthetic data for the benchmarks. Creates Posters, Labels, Posts, nested Comments and Contacts in bulk with a
+fixed random seed, so every run of a given size gets the same data.
+
+Labels are picked with a Zipf-like weighting (a few labels are on most posts, most labels are on a few), which is
+what a real label cloud looks like. Comments form threads: each comment either starts a new thread on a post or
+replies to an earlier comment on the same post, up to the given nesting depth.
+
+    python -m benchmarks.seed --posts 2000 --comments 20000
+'''
+import argparse
+import random
+
+defaults = {
+    "posters" : 200,
+    "labels" : 100,
+    "posts" : 1000,
+    "comments" : 10000,
+    "contacts" : 2000,
+    "max_labels" : 6, #the most labels on a single post or comment
+    "max_depth" : 4, #the deepest a comment reply chain goes
+}
+
+def _bulk(model, objs, batch = 500):
+    for i in range(0, len(objs), batch):
+        model.objects.bulk_create(objs[i:i + batch])
+
+def _pick_labels(rng, names, weights, most):
+    k = rng.randint(1, most)
+    return set(rng.choices(names, weights = weights, k = k))
+
+def seed(posters = defaults["posters"], labels = defaults["labels"], posts = defaults["posts"],
+         comments = defaults["comments"], contacts = defaults["contacts"], max_labels = defaults["max_labels"],
+         max_depth = defaults["max_depth"], rng_seed = 2015):
+    '''
+    Fill the database with the given volumes. Ids are assigned here so related rows can be bulk created without
+    reading anything back.
+
+    @return a dictionary of the created counts
+    '''
+    from django.contrib.auth.hashers import make_password
+    from django.core.management import call_command
+    from db.models import Poster, Label, Post, Comment, Contact
+    rng = random.Random(rng_seed)
+    password = make_password('password') #hashing once keeps seeding fast; every poster shares it
+
+    _bulk(Poster, [Poster(id = i, email = 'poster{}@example.com'.format(i), password = password,
+                          level = 5 if i == 1 else rng.choice((1, 1, 1, 3, 3, 4)))
+                   for i in range(1, posters + 1)])
+    creators = list(Poster.objects.filter(level__gte = 3).values_list('id', flat = True))
+
+    names = ['label{}'.format(i) for i in range(labels)]
+    weights = [1.0 / (rank + 1) for rank in range(labels)]
+    _bulk(Label, [Label(name = n, user_id = rng.choice(creators), notes = 'Notes about {}.'.format(n)) for n in names])
+
+    _bulk(Post, [Post(id = i, title = 'Post number {}'.format(i), text = 'Lorem ipsum dolor sit amet. ' * rng.randint(5, 60),
+                      user_id = rng.choice(creators)) for i in range(1, posts + 1)])
+    through = Post.labels.through
+    _bulk(through, [through(post_id = i, label_id = n) for i in range(1, posts + 1)
+                    for n in _pick_labels(rng, names, weights, max_labels)])
+
+    threads = {} #post id -> [(comment id, depth)]
+    objs = []
+    for i in range(1, comments + 1):
+        post_id = rng.randint(1, posts)
+        parents = threads.setdefault(post_id, [])
+        parent = rng.choice(parents) if parents and rng.random() < 0.6 else None
+        if parent is not None and parent[1] >= max_depth:
+            parent = None
+        objs.append(Comment(id = i, post_id = post_id, comment_id = parent[0] if parent else None,
+                            title = 'Re: post {}'.format(post_id) if parent is None else None,
+                            text = 'A comment. ' * rng.randint(1, 30), user_id = rng.randint(1, posters)))
+        parents.append((i, parent[1] + 1 if parent else 1))
+    _bulk(Comment, objs)
+    through = Comment.labels.through
+    _bulk(through, [through(comment_id = i, label_id = n) for i in range(1, comments + 1) if rng.random() < 0.2
+                    for n in _pick_labels(rng, names, weights, max_labels)])
+
+    _bulk(Contact, [Contact(email = 'contact{}@example.com'.format(i), phone = '555-{:04d}'.format(i),
+                            notes = 'Please get back to me.', user_id = i if i <= posters else None)
+                    for i in range(1, contacts + 1)])
+    call_command('rebuild_counters') #the label through rows were created around the signals
+    return {"posters" : posters, "labels" : labels, "posts" : posts, "comments" : comments, "contacts" : contacts}
+
+def add_arguments(parser):
+    for name, value in sorted(defaults.items()):
+        parser.add_argument('--' + name.replace('_', '-'), type = int, default = value)
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split('\n')[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+    from benchmarks.utils import setup
+    setup()
+    print(seed(**{k : getattr(args, k) for k in defaults}))
+
+if __name__ == '__main__':
+    main()
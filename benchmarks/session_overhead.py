@@ -0,0 +1,45 @@
+'''
+Per-request overhead of the session engine for a logged in client.
+
+The same cheap GET is run with the database session engine and with home.sessions, reporting latency and the
+number of queries each request makes.
+
+    python -m benchmarks.session_overhead [--requests 2000]
+'''
+import argparse
+import time
+
+from benchmarks.utils import setup, summarize
+
+GET_URL = '/db/models/label/'
+
+def run(engine, requests):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import override_settings, CaptureQueriesContext
+    with override_settings(SESSION_ENGINE = engine):
+        c = Client()
+        c.login(username = 'session@example.com', password = 'password')
+        c.get(GET_URL) #warm up the caches
+        latencies = []
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(requests):
+                start = time.perf_counter()
+                c.get(GET_URL)
+                latencies.append(time.perf_counter() - start)
+    return latencies, len(queries) / float(requests)
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split('\n')[0])
+    parser.add_argument('--requests', type = int, default = 2000)
+    args = parser.parse_args()
+
+    setup()
+    from db.models import Poster
+    Poster.objects.create_user('session@example.com', 'password')
+    for engine in ('django.contrib.sessions.backends.db', 'home.sessions'):
+        latencies, per_request = run(engine, args.requests)
+        print(summarize(engine, latencies), 'queries/request={:.2f}'.format(per_request))
+
+if __name__ == '__main__':
+    main()
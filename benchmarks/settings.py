@@ -0,0 +1,50 @@
+'''
+Settings for the benchmarks. Everything is the same as the site except the database is a local SQLite file and
+logs go to the benchmark directory.
+'''
+import os
+import tempfile
+
+BENCH_DIR = os.environ.setdefault('HOME_BENCH_DIR', os.path.join(tempfile.gettempdir(), 'home_bench'))
+os.environ.setdefault('HOME_LOG_ROOT', os.path.join(BENCH_DIR, 'logs'))
+if not os.path.exists(BENCH_DIR):
+    os.makedirs(BENCH_DIR)
+
+from home.settings import *
+
+ALLOWED_HOSTS = ['testserver']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BENCH_DIR, 'bench.sqlite3'),
+    }
+}
+
+# Set HOME_BENCH_POOL to the pool size to run the benchmarks through the pooled backend.
+if os.environ.get('HOME_BENCH_POOL'):
+    DATABASES['default'].update({'ENGINE' : 'home.dbpool', 'CONN_MAX_AGE' : 0,
+                                 'POOL' : {'ENGINE' : 'django.db.backends.sqlite3',
+                                           'MAX_SIZE' : int(os.environ['HOME_BENCH_POOL'])}})
+
+# Set HOME_BENCH_REPLICAS to a number of SQLite copies of the database to read from. They are copied from the
+# primary after seeding (see benchmarks.utils.sync_replicas), so they never see the benchmark's writes.
+DATABASE_REPLICAS = []
+for i in range(int(os.environ.get('HOME_BENCH_REPLICAS', 0))):
+    alias = 'replica{}'.format(i + 1)
+    DATABASES[alias] = dict(DATABASES['default'], NAME = os.path.join(BENCH_DIR, alias + '.sqlite3'))
+    DATABASE_REPLICAS.append(alias)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+}
+
+CACHES['sessions']['LOCATION'] = os.path.join(BENCH_DIR, 'sessions')
+METRICS_DIR = os.path.join(BENCH_DIR, 'metrics')
+SNAPSHOT_DIR = os.path.join(BENCH_DIR, 'snapshots')
+# There is no worker running during the benchmarks, so jobs run in the request that defers them.
+JOBS_ALWAYS_EAGER = True
+
+# Measure the views rather than the route cache; nothing fits in a zero byte cache.
+ROUTE_CACHE_MAX_BYTES = int(os.environ.get('HOME_BENCH_ROUTE_CACHE_BYTES', 0))
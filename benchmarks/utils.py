@@ -0,0 +1,94 @@
+'''
+Helpers shared by the benchmarks.
+'''
+import os
+import time
+import shutil
+import threading
+
+def setup():
+    '''
+    Set up Django with the benchmark settings and create the tables in a fresh SQLite database.
+    '''
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+    db = settings.DATABASES['default']['NAME']
+    if os.path.exists(db):
+        os.remove(db)
+    if settings.SNAPSHOT_DIR and os.path.isdir(settings.SNAPSHOT_DIR):
+        shutil.rmtree(settings.SNAPSHOT_DIR) #the new rows reuse the old ids
+    call_command('migrate', interactive = False, verbosity = 0)
+    count_queries()
+
+def sync_replicas():
+    '''
+    Copy the primary SQLite file over each replica's.
+    '''
+    from django.conf import settings
+    from django.db import connections
+    for alias in settings.DATABASE_REPLICAS:
+        connections[alias].close()
+        shutil.copyfile(settings.DATABASES['default']['NAME'], settings.DATABASES[alias]['NAME'])
+
+_queries = [0]
+_queries_lock = threading.Lock()
+
+def _count_query(alias, seconds):
+    with _queries_lock:
+        _queries[0] += 1
+
+def _on_connection_created(sender, connection, **kwargs):
+    from home import slowqueries
+    slowqueries.install(connection)
+
+def count_queries():
+    '''
+    Count the queries of every connection on every thread, such as the ones id batches are fetched on (see
+    mviews/idbatch.py), with the cursor wrapper of the slow query log. Read the count with queries().
+    '''
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+    from home import slowqueries
+    connection_created.connect(_on_connection_created, dispatch_uid = 'benchmarks.utils')
+    for conn in connections.all():
+        slowqueries.install(conn)
+    if _count_query not in slowqueries.observers:
+        slowqueries.observers.append(_count_query)
+
+def queries():
+    '''
+    Get the number of queries run since count_queries was called.
+    '''
+    with _queries_lock:
+        return _queries[0]
+
+def percentile(values, p):
+    '''
+    Get the p-th percentile (0-100) of the values using the nearest rank.
+    '''
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+    return values[k]
+
+def summarize(name, latencies):
+    '''
+    Format the count, p50 and p99 of a list of latencies in seconds as a single line.
+    '''
+    return "{:<28} n={:<6} p50={:8.2f}ms p99={:8.2f}ms".format(
+        name, len(latencies), percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000)
+
+class Timer(object):
+    '''
+    Context manager that records the elapsed wall-clock seconds in the elapsed attribute.
+    '''
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -14,6 +14,18 @@ from controllers.utils import read
 from db.models import Poster as User
 from django.db.utils import IntegrityError
 from django.contrib.auth import logout
+from django.utils.decorators import method_decorator
+from controllers.utils import has_level
+from home import hashing, slowqueries
+import json
+
+def busy(e):
+    '''
+    Send a 503 error for when the hashing pool is saturated, asking the client to retry shortly.
+    '''
+    r = err(e, 503)
+    r['Retry-After'] = '1'
+    return r
 
 class Poster(View):
     '''
@@ -35,6 +47,8 @@ class Poster(View):
             return resp(request, (p,))
         except IntegrityError as ie:
             return err(ie)
+        except hashing.PoolSaturated as ps:
+            return busy(ps)
 
 class Authentication(View):
     '''
@@ -59,10 +73,52 @@ class Authentication(View):
             return err(e)
         except AuthenticationError as ae:
             return err(ae, 401)
+        except hashing.PoolSaturated as ps:
+            return busy(ps)
     
     def delete(self, request, *args, **kwargs):
         '''
         Log the person out. Logout requires nothing but the cookie to work. Will always return 204.
         ''' 
         logout(request)
-        return oresp(request) 
\ No newline at end of file
+        return oresp(request)
+
+class SlowQueries(View):
+    '''
+    The slow queries of the process serving the request. See home/slowqueries.py.
+    '''
+    
+    @method_decorator(has_level("master"))
+    def get(self, request, *args, **kwargs):
+        '''
+        Get the top offenders by fingerprint and the most recent slow queries. The query param sort can be one of
+        total_ms (the default), max_ms or count, and limit sets how many offenders are returned. Json returned will
+        be of the following:
+        
+            {
+                "offenders" : [
+                    {
+                    "fingerprint" : <fingerprint>,
+                    "sql" : <normalized sql>,
+                    "count" : <count>,
+                    "total_ms" : <total>,
+                    "max_ms" : <max>,
+                    "plan" : [<explain row>, ...],
+                    "routes" : {<route> : <count>, ...},
+                    "last_view" : <view>
+                    }, ...
+                ],
+                "recent" : [
+                    {"at" : <timestamp>, "ms" : <ms>, "sql" : <sql>, "fingerprint" : <fingerprint>, "route" : <route>,
+                     "view" : <view>, "database" : <alias>}, ...
+                ]
+            }
+        '''
+        sort = request.GET.get("sort", "total_ms")
+        if sort not in ("total_ms", "max_ms", "count"):
+            return err("sort must be one of total_ms, max_ms or count.")
+        limit = request.GET.get("limit", "20")
+        if not limit.isdigit():
+            return err("limit must be a number.")
+        data = {"offenders" : slowqueries.top(sort, int(limit)), "recent" : list(slowqueries.recent)}
+        return oresp(request, json.dumps(data))
@@ -10,6 +10,7 @@ from db.models import Post as BlogPost, Entry, Comment as comment, Label as labe
 from db.models import Poster as User
 from json import loads as load
 from django.utils.decorators import method_decorator
+from mviews import idbatch
 
 
 class Entity(View):
@@ -40,20 +41,37 @@ class Entity(View):
         '''
         A helper method to get the queryset, to be used for GET, PUT, and maybe DELETE. Look at the
         GET docs to see how this works.
+        
+        Ids are not filtered on but cleaned and returned with the queryset, or None if there are none; use ids_qs
+        to get the rows. Raises a ValueError if an id is not valid.
+        
+        @return the queryset and the list of ids
         '''
         args = args[0].split('/')[:-1]
         if not args:
             qs = self.model.objects.all()
-            if "ids" in request.GET:
-                ids = request.GET.get('ids').split(',')
-                qs = qs.filter(id__in = ids)
+            ids = idbatch.clean_ids(self.model, request.GET.get('ids').split(',')) if "ids" in request.GET else None
             reqDict = {field : request.GET[field] for field in self.model._meta.get_all_field_names() if field in request.GET}
-            return qs.filter(**reqDict)      
-        elif len(args) == 1:
-            return self.model.objects.filter(id = args[0])
+            return qs.filter(**reqDict), ids
+        ids = idbatch.clean_ids(self.model, args)
+        if not ids:
+            raise ValueError("Did not contain any valid ids.")
+        elif len(ids) == 1:
+            return self.model.objects.filter(id = ids[0]), None
         else:
             reqDict = {field : request.GET[field] for field in self.model._meta.get_all_field_names() if field in request.GET}
-            return self.model.objects.filter(id__in = args, **reqDict)
+            return self.model.objects.filter(**reqDict), ids
+    
+    def ids_qs(self, qs, ids):
+        '''
+        Apply the ids returned by _get_qs: fetched in order with mviews.idbatch for reads, or as a plain filter to
+        update or delete.
+        '''
+        if ids is None:
+            return qs
+        if self.request.method in ('GET', 'HEAD'):
+            return idbatch.resolve(qs, ids)
+        return qs.filter(pk__in = ids)
     
     def get(self, request, *args, **kwargs):
         '''
@@ -66,10 +84,13 @@ class Entity(View):
                 
         Note that the query params need to match the name of the model fields in order to work.
         '''
-        qs = self._get_qs(request, *args, **kwargs)
+        try:
+            qs, ids = self._get_qs(request, *args, **kwargs)
+        except ValueError as e:
+            return err(e)
         if request.GET.get("expand", False):
             qs = qs.select_related().prefetch_related()
-        return resp(request, qs)
+        return resp(request, self.ids_qs(qs, ids))
     
     def post(self, request, *args, **kwargs):
         '''
@@ -112,7 +133,10 @@ class Entity(View):
         can search for a set of entities to update at once.
         '''
         j = load(read(request))
-        qs = self._get_qs(request, *args, **kwargs)
+        try:
+            qs = self.ids_qs(*self._get_qs(request, *args, **kwargs))
+        except ValueError as e:
+            return err(e)
         entity = qs.update(**j["data"])
         if len(j) > 1: #there are many2many fields to add and delete, lets add them
             for m2m in self.m2ms:
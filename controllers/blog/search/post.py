@@ -8,12 +8,16 @@ from controllers.utils import response as resp, err, other_response as oresp
 from db.models import Label
 import json
 from django.core.exceptions import ObjectDoesNotExist
+from home.routecache import CachePolicy
 
 class ByLabel(View):
     '''
     Get all the posts of a certain label.
     '''
     
+    cache_policy = CachePolicy(ttl = 60, stale_while_revalidate = 600,
+                               invalidated_by = ("db.post", "db.label", "db.post_labels"))
+    
     def get(self, request, *args, **kwargs):
         '''
         Get a list of all posts related to a request. Returns just the post id and title. Must pass in id through the
@@ -3,3 +3,80 @@ Created on May 17, 2015
 
 @author: derigible
 '''
+import csv
+import json
+
+from django.views.generic.base import View
+from django.utils.decorators import method_decorator
+
+from controllers.utils import other_response as oresp
+from controllers.utils import err, has_level
+from db import contacts
+
+class Submit(View):
+    '''
+    The contact form.
+    '''
+    
+    def post(self, request, *args, **kwargs):
+        '''
+        Leave contact information:
+        
+            {"email" : "<email>", "phone" : "<phone>", "business" : "<business>", "notes" : "<notes>"}
+            
+        Only the email is required. The contact is checked and buffered, and this returns 202 without waiting on
+        the database; it becomes a Contact within CONTACT_FLUSH_SECONDS (see db/contacts.py). A contact with an
+        email that already has one updates it with the fields sent when the buffer is written.
+        '''
+        try:
+            record = contacts.clean_submission(json.loads(request.body.decode("utf-8")))
+        except ValueError as e: #includes a body that is not json
+            return err(e)
+        contacts.submit(record)
+        resp = oresp(request, json.dumps({"accepted" : True}))
+        resp.status_code = 202
+        return resp
+
+class Import(View):
+    '''
+    Bulk import of contacts, such as a mailing list.
+    '''
+    
+    @method_decorator(has_level("master"))
+    def post(self, request, *args, **kwargs):
+        '''
+        Import the contacts in the payload. The payload is streamed, so it can be as large as needed. Send either
+        text/csv with a header row of Contact field names or application/x-ndjson with one json object per line:
+        
+            {"email" : "<email>", "phone" : "<phone>", "business" : "<business>", "notes" : "<notes>"}
+            
+        The format can also be forced with the query param format=csv|ndjson. The chunk_size query param sets
+        how many contacts are written per query.
+        
+        Json returned will be of the following:
+        
+            {
+                "created" : <count>,
+                "updated" : <count>,
+                "duplicate" : <count>,
+                "invalid" : <count>,
+                "failed" : <count>
+            }
+            
+        updated counts the contacts whose email already had one, which get the fields the record has (the fields
+        it leaves out or empty keep their values). duplicate counts the records whose email came again later in
+        the same chunk (the last one is kept), invalid the lines that are not json objects or whose contact
+        clean_submission rejects (a missing or bad email, or a field that is not a string or is too long), and
+        failed the contacts of chunks that could not be written. Bad lines are counted and skipped, they do not
+        stop the import.
+        '''
+        fmt = request.GET.get("format") or ("csv" if "csv" in request.META.get("CONTENT_TYPE", "") else "ndjson")
+        chunk_size = request.GET.get("chunk_size", "500")
+        if not chunk_size.isdigit() or int(chunk_size) < 1:
+            return err("chunk_size must be a positive number.")
+        lines = (line.decode("utf-8") for line in request)
+        try:
+            totals = contacts.import_contacts(lines, fmt, int(chunk_size))
+        except (ValueError, KeyError, csv.Error) as e:
+            return err(e)
+        return oresp(request, json.dumps(totals))
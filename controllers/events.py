@@ -0,0 +1,70 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+'''
+import json
+import time
+import queue
+
+from django.conf import settings
+from django.http.response import StreamingHttpResponse
+from django.views.generic.base import View
+
+from controllers.utils import err
+from home import pubsub
+
+class Stream(View):
+    '''
+    A server-sent event stream of new and changed posts, comments and labels, to use instead of polling.
+    '''
+
+    def get(self, request, *args, **kwargs):
+        '''
+        Open an event stream (Content-Type text/event-stream). Filter it with csvs of post ids and label names:
+
+            /controllers/events/stream/?post=1,2&label=python,django
+
+        Leaving both out streams everything. Each event is sent as:
+
+            event: <post|comment|label>
+            data: {"type" : ..., "action" : "saved" | "deleted" | "labeled", "id" : <id>, "post" : <post id>,
+                   "labels" : [<label name>, ...]}
+
+        A comment line is sent every PUBSUB_KEEPALIVE_SECONDS to keep proxies from closing the connection. The
+        stream ends after PUBSUB_STREAM_SECONDS, or with an evicted event if the client falls PUBSUB_BUFFER events
+        behind; EventSource clients reconnect on their own. Returns 503 if the process already has
+        PUBSUB_MAX_SUBSCRIBERS streams open.
+        '''
+        try:
+            posts = [int(p) for p in request.GET.get('post', '').split(',') if p]
+        except ValueError:
+            return err("post must be a csv of post ids.")
+        labels = [l for l in request.GET.get('label', '').split(',') if l]
+        try:
+            sub = pubsub.bus.subscribe(posts, labels)
+        except queue.Full:
+            resp = err("Too many event streams are open. Try again later.", 503)
+            resp['Retry-After'] = 5
+            return resp
+        resp = StreamingHttpResponse(self.events(sub), content_type = 'text/event-stream')
+        resp['Cache-Control'] = 'no-cache'
+        resp['X-Accel-Buffering'] = 'no' #have nginx send events as they come instead of buffering them
+        return resp
+
+    def events(self, sub):
+        keepalive = getattr(settings, 'PUBSUB_KEEPALIVE_SECONDS', 15)
+        ends = time.time() + getattr(settings, 'PUBSUB_STREAM_SECONDS', 300)
+        try:
+            yield "retry: 2000\n\n"
+            while time.time() < ends:
+                event = sub.get(min(keepalive, max(0, ends - time.time())))
+                if sub.evicted:
+                    yield "event: evicted\ndata: {}\n\n"
+                    return
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield "event: {}\ndata: {}\n\n".format(event["type"], json.dumps(event))
+        finally:
+            pubsub.bus.unsubscribe(sub)
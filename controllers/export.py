@@ -0,0 +1,56 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+'''
+from django.core.exceptions import ValidationError
+from django.http.response import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.generic.base import View
+
+from controllers.utils import err, has_level
+from mviews import export
+
+content_types = {"csv" : "text/csv; charset=utf-8", "ndjson" : "application/x-ndjson"}
+
+class Table(View):
+    '''
+    A whole ModelAsView table as a download, for analysts who would otherwise page through GET.
+    '''
+
+    @method_decorator(has_level("master"))
+    def get(self, request, *args, **kwargs):
+        '''
+        Stream every row of a table in pk order:
+
+            /controllers/export/table/<app_label.model_name>/?format=csv|ndjson&after=<pk>
+
+        CSV (the default) starts with a header row of the column names; NDJSON is one json object per line. Pass
+        after to get only the rows after that pk, such as to pick up a download that was cut off. The response is
+        gzipped if the client accepts it. Rows are read and encoded a chunk at a time, so any table can be
+        downloaded without the server holding it. For exports to files, resuming and split across processes, use
+        the export_table command.
+        '''
+        label = args[0].strip('/') if args and args[0] else ''
+        try:
+            model = export.get_model(label)
+        except (LookupError, ValueError):
+            return err("There is no table {} to export.".format(label), 404)
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in export.formats:
+            return err("format must be csv or ndjson.")
+        after = request.GET.get('after')
+        if after is not None:
+            try:
+                after = model._meta.pk.to_python(after)
+            except ValidationError:
+                return err("after must be a {}.".format(model._meta.pk.name))
+        compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        using = model._default_manager.db #pick the database while the request's routing still applies
+        resp = StreamingHttpResponse(export.stream(model, fmt, compress, after, using),
+                                     content_type = content_types[fmt])
+        resp['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(label, fmt)
+        if compress:
+            resp['Content-Encoding'] = 'gzip'
+        resp['Vary'] = 'Accept-Encoding'
+        return resp
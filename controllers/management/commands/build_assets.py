@@ -0,0 +1,21 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+'''
+from django.core.management.base import BaseCommand
+
+from home import assets
+
+class Command(BaseCommand):
+    '''
+    Fingerprint and precompress the static files so they can be served without compressing on every request.
+    '''
+    help = 'Copy the files under ASSET_SOURCE_DIRS into ASSET_ROOT with content hashed names, gzip and brotli variants and a manifest.'
+    
+    def handle(self, *args, **options):
+        manifest = assets.build()
+        for name, entry in sorted(manifest.items()):
+            self.stdout.write("{} -> {} [{}]".format(name, entry["path"], ", ".join(entry["encodings"]) or "identity"))
+        if assets.brotli is None:
+            self.stdout.write("The brotli package is not installed; only gzip variants were written.")
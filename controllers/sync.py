@@ -0,0 +1,118 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+'''
+import json
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.views.generic.base import View
+from django.core.serializers.json import DjangoJSONEncoder
+
+from controllers.utils import other_response as oresp
+from controllers.utils import err
+from mviews import models as mviews_models
+from mviews.modelviews import BaseModelAsView as BaseView
+
+def parse_cursor(cursor):
+    '''
+    Read a cursor of the changes feed: the last seq read, then the seqs that were missing below it with the time
+    they were first missed, as in 120:117@1790000000,118@1790000000. Raises a ValueError if it is not one.
+
+    @return the seq and a dictionary of missing seq to when it was first missed
+    '''
+    since, _, gaps = cursor.partition(':')
+    return int(since), dict(tuple(int(n) for n in gap.split('@')) for gap in gaps.split(',') if gap)
+
+def format_cursor(since, gaps):
+    return ":".join([str(since)] + ([",".join("{}@{}".format(seq, seen) for seq, seen in sorted(gaps.items()))]
+                                    if gaps else []))
+
+class Changes(View):
+    '''
+    The changes feed of the ModelAsView models. Clients that mirror a model download it once and then only ask for
+    what changed since the last change they saw.
+    '''
+
+    def get(self, request, *args, **kwargs):
+        '''
+        Get the changes of a model after a cursor, oldest first:
+
+            /controllers/sync/changes/<model>/?since=<cursor>&limit=<n>
+
+        The model is a model name of the db app, such as post or label. Leave out since (or pass 0) to start from
+        the first change, and after that pass the cursor of the last page as is. At most limit changes of all models
+        are read per page (SYNC_PAGE_SIZE by default, SYNC_PAGE_MAX at most), so a page can be empty and still have
+        more after it.
+
+        Json returned will be of the following:
+
+            {
+                "changes" : [
+                    {
+                    "seq" : <seq>,
+                    "pk" : <pk> | null,
+                    "deleted" : true | false,
+                    "data" : { <the row as GET returns it> } | null
+                    }, ...
+                ],
+                "cursor" : "<the since to pass for the next page>",
+                "more" : true | false
+            }
+
+        A row that changed more than once in a page is only in it once, with its latest seq. A change with a null
+        pk means rows were created in bulk with keys that are not known; fetch the model again. Deleted rows and
+        rows that are gone by the time the page is read have no data.
+
+        Seqs are handed out when a change is written but become visible when its transaction commits, so a page can
+        have holes that are filled in later. The cursor carries the seqs that were missing (see parse_cursor) and
+        the next pages send their changes as they show up, until SYNC_GAP_SECONDS have gone by, after which a hole
+        is taken to be a rolled back transaction.
+        '''
+        name = args[0].strip('/') if args and args[0] else ''
+        try:
+            model = apps.get_model('db', name)
+        except LookupError:
+            return err("There is no model {}.".format(name), 404)
+        if not issubclass(model, BaseView):
+            return err("There is no changes feed for {}.".format(name), 404)
+        try:
+            since, gaps = parse_cursor(request.GET.get('since', '0'))
+            limit = min(int(request.GET.get('limit', getattr(settings, 'SYNC_PAGE_SIZE', 100))),
+                        getattr(settings, 'SYNC_PAGE_MAX', 500))
+        except ValueError:
+            return err("since must be a cursor from the feed and limit a number.")
+        if limit < 1:
+            return err("limit must be at least 1.")
+        Change = mviews_models.Change
+        columns = ('seq', 'model', 'object_pk', 'deleted')
+        page = list(Change.objects.filter(seq__gt = since).order_by('seq').values_list(*columns)[:limit + 1])
+        more = len(page) > limit
+        page = page[:limit]
+        filled = list(Change.objects.filter(seq__in = list(gaps)).values_list(*columns)) if gaps else []
+        for row in filled:
+            del gaps[row[0]]
+        now = int(time.time())
+        most = getattr(settings, 'SYNC_GAP_MAX', 100)
+        expected = since + 1
+        for row in page:
+            for seq in range(max(expected, row[0] - most), row[0]): #a jump of the sequence is not all holes
+                gaps[seq] = now
+            expected = row[0] + 1
+        wait = getattr(settings, 'SYNC_GAP_SECONDS', 300)
+        gaps = dict(sorted((seq, seen) for seq, seen in gaps.items() if now - seen <= wait)[-most:]) #the newest
+        label = Change.label(model)
+        latest = {}
+        for seq, row_model, pk, deleted in sorted(filled + page):
+            if row_model == label:
+                latest.pop(pk, None) #keep the latest change of each row, in seq order
+                latest[pk] = (seq, deleted)
+        pk_field = model._meta.pk
+        live = [pk_field.to_python(pk) for pk, (seq, deleted) in latest.items() if pk is not None and not deleted]
+        rows = {str(r[pk_field.attname]) : r for r in model.objects.filter(pk__in = live).values()} if live else {}
+        changes = [{"seq" : seq, "pk" : pk, "deleted" : deleted, "data" : None if deleted else rows.get(pk)}
+                   for pk, (seq, deleted) in latest.items()]
+        data = {"changes" : changes, "cursor" : format_cursor(page[-1][0] if page else since, gaps), "more" : more}
+        return oresp(request, json.dumps(data, cls = DjangoJSONEncoder))
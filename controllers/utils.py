@@ -145,6 +145,9 @@ def authenticate(request, email = None, password = None):
     request object. This assumes it is a json object. If other formats are used, you must pass in email and password
     separately. The user object will be placed in the request object after successful login.
     
+    The password is checked in the hashing pool (see Poster.check_password), so this raises a
+    hashing.PoolSaturated error if too many logins are already waiting on it.
+    
     @param request: the request to log in
     @param email: the email of the poster
     @param password: the password of the poster
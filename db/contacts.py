@@ -0,0 +1,233 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+Bulk import of Contacts. Records are streamed from CSV or NDJSON lines and written a chunk at a time, so memory
+stays the same no matter how large the input is. Each chunk costs one IN query for the existing Contacts, one IN
+query for the Posters to link to, one bulk_create for the new Contacts and an UPDATE per update_batch_size of the
+Contacts that already existed.
+
+Contacts submitted through the contact form are buffered the same way: submit appends them to a spool (see
+home/spool.py) and a job (see home/jobs.py) imports what has been spooled every CONTACT_FLUSH_SECONDS, or sooner
+once CONTACT_FLUSH_SIZE have come in, so a burst of submissions becomes a few bulk writes.
+'''
+import csv
+import json
+import time
+import logging
+import threading
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Case, When, Value, F, TextField
+from django.db.utils import IntegrityError
+
+from db.models import Contact, Poster, PosterManager
+from mviews.models import Change
+from home import jobs
+from home.spool import Spool
+
+logger = logging.getLogger(__name__)
+
+import_fields = ("email", "phone", "business", "notes")
+
+#the Contacts updated per query: each takes up to seven parameters (its email and value for each of the three
+#fields, and its email in the IN) and SQLite allows 999
+update_batch_size = 100
+
+def read_records(lines, fmt = "csv"):
+    '''
+    Lazily parse contact records from an iterable of text lines. CSV input needs a header row with the Contact
+    field names; NDJSON input is one json object per line. Fields that are not Contact fields are dropped. A line
+    that is not a json object is passed on as None, for import_chunk to count as invalid.
+
+    @param lines: an iterable of decoded lines, such as an open file
+    @param fmt: either csv or ndjson
+    @return a generator of dictionaries
+    '''
+    if fmt == "csv":
+        rows = csv.DictReader(lines)
+    elif fmt == "ndjson":
+        rows = (_parse_line(line) for line in lines if line.strip())
+    else:
+        raise ValueError("Format {} is not supported. Use csv or ndjson.".format(fmt))
+    for row in rows:
+        yield {f : row[f] for f in import_fields if row.get(f)} if isinstance(row, dict) else None
+
+def _parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def chunked(iterable, size):
+    '''
+    Split an iterable into lists of at most size items without reading ahead more than one chunk.
+    '''
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def import_chunk(records):
+    '''
+    Write one chunk of contact records. Records that clean_submission rejects (no valid email, fields that are not
+    strings or are too long) are counted as invalid. Emails are normalized the same way Contact.save does it,
+    duplicates inside the chunk keep the last record, and emails that already have a Contact update it instead, so
+    the unique email constraint is never hit. An update only sets the fields the record has, an empty field keeps
+    what the Contact had. New Contacts are linked to the Poster with the same email. If the chunk still fails on a
+    constraint after looking the existing Contacts up again, none of it is written and its contacts are counted as
+    failed.
+
+    @param records: a list of dictionaries with Contact fields
+    @return a dictionary with the created, updated, duplicate, invalid and failed counts
+    '''
+    counts = {"created" : 0, "updated" : 0, "duplicate" : 0, "invalid" : 0, "failed" : 0}
+    by_email = {}
+    for r in records:
+        try:
+            r = clean_submission(r)
+        except ValueError:
+            counts["invalid"] += 1
+            continue
+        r["email"] = PosterManager.normalize_email(r["email"])
+        if r["email"] in by_email:
+            counts["duplicate"] += 1
+        by_email[r["email"]] = r
+
+    for attempt in range(2):
+        existing = dict(Contact.objects.filter(email__in = by_email.keys()).values_list("email", "id"))
+        posters = dict(Poster.objects.filter(email__in = by_email.keys()).values_list("email", "id"))
+        new = [Contact(user_id = posters.get(email), **r) for email, r in by_email.items() if email not in existing]
+        try:
+            with transaction.atomic():
+                Contact.objects.bulk_create(new)
+                update_existing([by_email[email] for email in existing])
+                #neither sends signals, so record the changes for the sync feed with the new and updated ids
+                Change.record(Contact, list(Contact.objects.filter(email__in = [c.email for c in new])
+                                            .values_list("id", flat = True)) + list(existing.values()))
+            break
+        except IntegrityError:
+            if attempt: #someone else keeps inserting the same emails, give up on this chunk
+                logger.exception("Could not import a chunk of %s contacts.", len(by_email))
+                counts["failed"] += len(by_email)
+                return counts
+    counts["updated"] += len(existing)
+    counts["created"] += len(new)
+    return counts
+
+def update_existing(records):
+    '''
+    Set the fields of the records on the Contacts with their emails, update_batch_size Contacts per query. Each field
+    is a CASE on the email that falls back to the current value, so records only change the fields they have.
+
+    @param records: a list of cleaned dictionaries with Contact fields and normalized emails
+    '''
+    for batch in chunked(records, update_batch_size):
+        update = {}
+        for f in import_fields:
+            if f == "email":
+                continue
+            whens = [When(email = r["email"], then = Value(r[f])) for r in batch if f in r]
+            if whens:
+                update[f] = Case(*whens, default = F(f), output_field = TextField())
+        if update:
+            Contact.objects.filter(email__in = [r["email"] for r in batch]).update(**update)
+
+def import_contacts(lines, fmt = "csv", chunk_size = 500):
+    '''
+    Stream contact records from the lines and import them a chunk at a time.
+
+    @param lines: an iterable of decoded lines, such as an open file
+    @param fmt: either csv or ndjson
+    @param chunk_size: the number of records to write per chunk
+    @return a dictionary with the total created, updated, duplicate, invalid and failed counts
+    '''
+    totals = {"created" : 0, "updated" : 0, "duplicate" : 0, "invalid" : 0, "failed" : 0}
+    for chunk in chunked(read_records(lines, fmt), chunk_size):
+        for k, v in import_chunk(chunk).items():
+            totals[k] += v
+    return totals
+
+def clean_submission(data):
+    '''
+    Validate a contact submitted through the contact form.
+
+    @param data: the decoded json of the submission
+    @return a dictionary of the Contact fields to spool
+    @raise ValueError: if the submission is not a valid contact
+    '''
+    if not isinstance(data, dict):
+        raise ValueError("The contact must be a json object.")
+    record = {}
+    for f in import_fields:
+        v = data.get(f)
+        if v is None or v == "":
+            continue
+        if not isinstance(v, str):
+            raise ValueError("{} must be a string.".format(f))
+        if len(v) > getattr(settings, 'CONTACT_MAX_FIELD_LENGTH', 5000):
+            raise ValueError("{} is too long.".format(f))
+        record[f] = v.strip()
+    try:
+        validate_email(record.get("email", ""))
+    except ValidationError:
+        raise ValueError("A valid email is required.")
+    return record
+
+_spool = None
+_state = {"count" : 0, "timer" : 0}
+_lock = threading.Lock()
+
+def spool():
+    global _spool
+    if _spool is None:
+        _spool = Spool(settings.CONTACT_SPOOL_DIR, getattr(settings, 'CONTACT_SPOOL_FSYNC', True))
+    return _spool
+
+def submit(record):
+    '''
+    Spool a cleaned contact and make sure a flush is coming: one CONTACT_FLUSH_SECONDS after the first contact since
+    the last, and one right away when this process has spooled CONTACT_FLUSH_SIZE since it last asked for one.
+    '''
+    spool().append(record)
+    now = time.time()
+    wait = getattr(settings, 'CONTACT_FLUSH_SECONDS', 5)
+    with _lock:
+        _state["count"] += 1
+        full = _state["count"] >= getattr(settings, 'CONTACT_FLUSH_SIZE', 500)
+        if full:
+            _state["count"] = 0
+        due = now >= _state["timer"]
+        if due:
+            _state["timer"] = now + wait
+    if full:
+        jobs.defer(flush_submissions, dedupe_key = "flush_submissions:full")
+    if due:
+        jobs.defer(flush_submissions, delay = wait, dedupe_key = "flush_submissions")
+
+@jobs.task
+def flush_submissions():
+    '''
+    Import the spooled contacts of every process in chunks of CONTACT_FLUSH_SIZE. Importing updates the Contacts
+    that already have an email, so a flush that dies part way can run again. A chunk that keeps failing on the unique
+    email is imported a contact at a time and the contacts that still fail are logged and dropped, so one bad
+    record cannot hold up every later contact. If another flush is draining, this one runs again later for what
+    was spooled after that one took its files.
+    '''
+    chunk_size = getattr(settings, 'CONTACT_FLUSH_SIZE', 500)
+    def handle(records):
+        for chunk in chunked(records, chunk_size):
+            if import_chunk(chunk)["failed"]:
+                for record in chunk:
+                    if import_chunk([record])["failed"]:
+                        logger.error("Dropping the spooled contact %s.", record)
+    if spool().drain(handle) is None:
+        jobs.defer(flush_submissions, delay = getattr(settings, 'CONTACT_FLUSH_SECONDS', 5),
+                   dedupe_key = "flush_submissions")
@@ -0,0 +1,40 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+'''
+import os
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from db import staticexport
+
+class Command(BaseCommand):
+    '''
+    Export the posts, label pages and comment threads to static files for the web server to serve. See
+    db/staticexport.py for the layout.
+    '''
+    help = 'Export the blog to static json (and optionally html) files, rendering only what changed since the last run.'
+    option_list = BaseCommand.option_list + (
+        make_option('--out', dest = 'out', default = None,
+                    help = 'The directory to export to. Defaults to EXPORT_DIR.'),
+        make_option('--html', dest = 'html', action = 'store_true', default = False,
+                    help = 'Also write html pages into EXPORT_HTML_DIR.'),
+        make_option('--full', dest = 'full', action = 'store_true', default = False,
+                    help = 'Render everything instead of what changed since the last run.'),
+        make_option('--workers', dest = 'workers', type = 'int', default = None,
+                    help = 'The number of worker processes. Defaults to the number of cpus.'),
+        make_option('--chunk-size', dest = 'chunk_size', type = 'int', default = 200,
+                    help = 'The number of posts or labels each worker renders at a time.'),
+    )
+    
+    def handle(self, *args, **options):
+        out = options['out'] or settings.EXPORT_DIR
+        html_dir = settings.EXPORT_HTML_DIR if options['html'] else None
+        totals = staticexport.export(os.path.abspath(out), html_dir = html_dir, full = options['full'],
+                                     workers = options['workers'], chunk_size = options['chunk_size'],
+                                     log = self.stdout.write)
+        self.stdout.write("Wrote {posts} posts and {labels} labels, removed {removed_posts} posts and "
+                          "{removed_labels} labels.".format(**totals))
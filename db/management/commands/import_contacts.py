@@ -0,0 +1,40 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+'''
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from db.contacts import import_contacts
+
+class Command(BaseCommand):
+    '''
+    Import a mailing list of contacts from a CSV or NDJSON file. The file is streamed, so it can be of any size.
+    '''
+    args = '<file>'
+    help = 'Import contacts from a CSV (with a header row) or NDJSON file. Use - to read from stdin.'
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest = 'format', default = None,
+                    help = 'csv or ndjson. Guessed from the file extension if not given.'),
+        make_option('--chunk-size', dest = 'chunk_size', type = 'int', default = 500,
+                    help = 'The number of contacts written per query.'),
+    )
+    
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Pass in exactly one file to import.")
+        path = args[0]
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        try:
+            if path == '-':
+                totals = import_contacts(sys.stdin, fmt, options['chunk_size'])
+            else:
+                with open(path, newline = '', encoding = 'utf-8') as f:
+                    totals = import_contacts(f, fmt, options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write("Created {created}, updated {updated}, duplicate {duplicate}, invalid {invalid}, "
+                          "failed {failed}.".format(**totals))
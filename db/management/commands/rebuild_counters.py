@@ -0,0 +1,45 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+'''
+from django.db import transaction
+from django.db.models import Count
+from django.core.management.base import BaseCommand
+
+from db.models import Post, Label, Comment
+
+def rebuild(model, field, counts, chunk_size = 500):
+    '''
+    Set a counter field of every row from a query of (pk, count) pairs. Rows are zeroed first and then set with
+    one UPDATE per distinct count and chunk of pks.
+
+    @return the number of rows whose counter was wrong
+    '''
+    before = dict(model.objects.values_list("pk", field))
+    counts = dict(counts)
+    by_count = {}
+    for pk, n in counts.items():
+        by_count.setdefault(n, []).append(pk)
+    model.objects.exclude(**{field : 0}).update(**{field : 0})
+    for n, pks in by_count.items():
+        for i in range(0, len(pks), chunk_size):
+            model.objects.filter(pk__in = pks[i:i + chunk_size]).update(**{field : n})
+    return sum(1 for pk, n in before.items() if counts.get(pk, 0) != n)
+
+class Command(BaseCommand):
+    '''
+    Recount Post.comment_count and Label.post_count. They are kept up to date as comments and labels change, but
+    rows written without going through the models (such as raw SQL or bulk creates of the label through table)
+    are not counted.
+    '''
+    help = 'Recount the comments of every post and the posts of every label.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts = rebuild(Post, "comment_count",
+                            Comment.objects.values("post_id").annotate(n = Count("id")).values_list("post_id", "n"))
+            labels = rebuild(Label, "post_count",
+                             Post.labels.through.objects.values("label_id").annotate(n = Count("id"))
+                             .values_list("label_id", "n"))
+        self.stdout.write("Fixed the counts of {} posts and {} labels.".format(posts, labels))
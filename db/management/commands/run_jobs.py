@@ -0,0 +1,41 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+'''
+import time
+from optparse import make_option
+
+from django.db import close_old_connections
+from django.core.management.base import BaseCommand
+
+from home import jobs
+
+class Command(BaseCommand):
+    '''
+    The worker of the background job queue (see home/jobs.py). Run as many as the jobs need; they take jobs from
+    the same SQLite file, each job going to one worker at a time.
+    '''
+    help = 'Run queued background jobs, waiting for more when the queue is empty.'
+    option_list = BaseCommand.option_list + (
+        make_option('--burst', dest = 'burst', action = 'store_true', default = False,
+                    help = 'Exit once there are no jobs due instead of waiting for more.'),
+        make_option('--poll', dest = 'poll', type = 'float', default = 1,
+                    help = 'The seconds to wait before looking again when there are no jobs due.'),
+    )
+
+    def handle(self, *args, **options):
+        ran = 0
+        try:
+            while True:
+                close_old_connections() #like a request would, so a dropped database connection does not stick
+                if jobs.run_one() is not None:
+                    ran += 1
+                elif options['burst']:
+                    break
+                else:
+                    time.sleep(options['poll'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write("Ran {} jobs. Queue: {}.".format(ran, jobs.counts()))
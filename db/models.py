@@ -3,11 +3,19 @@ Created on May 17, 2015
 
 @author: derigible
 '''
-from django.db import models as m
+from collections import Counter
+
+from django.db import models as m, transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, pre_delete, post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.conf import settings
 
-from mviews.modelviews import ModelAsView as mav
+from mviews.modelviews import ModelAsView as mav, bulk_saved
+from mviews.models import Change
+from home import hashing, snapshots, pubsub, jobs
+from home.routecache import CachePolicy
 
 
 class PosterManager(BaseUserManager):
@@ -73,11 +81,31 @@ class Poster(AbstractBaseUser):
         Override of AbstractBaseUser.set_password(self, raw_password):
         
         This method will do some constraint validation on the password before saving it if settings.VALIDATE_PASSWORD_RULES is set to True
+        
+        The password is hashed in the hashing pool, so this raises a hashing.PoolSaturated error if too many hashes
+        are already waiting on it.
         '''
         if settings.VALIDATE_PASSWORD_RULES:
             if len(self.password) < 5:
                 raise ValueError("The password needs to be over 4 characters long.")
-        super(Poster, self).set_password(raw_password, *args, **kwargs)
+        if raw_password is None:
+            super(Poster, self).set_password(raw_password, *args, **kwargs)
+        else:
+            self.password = hashing.make_password(raw_password)
+    
+    def check_password(self, raw_password):
+        '''
+        Override of AbstractBaseUser.check_password(self, raw_password):
+        
+        Checks the password in the hashing pool, so this raises a hashing.PoolSaturated error if too many hashes are
+        already waiting on it. A password stored with an outdated hasher or work factor is hashed again and saved.
+        '''
+        if not hashing.check_password(raw_password, self.password):
+            return False
+        if hashing.must_update(self.password):
+            self.set_password(raw_password)
+            self.save(update_fields = ["password"])
+        return True
     
     @classmethod    
     def get_level_name(self, level):
@@ -91,9 +119,51 @@ class Poster(AbstractBaseUser):
         else:
             raise ValueError("The submitted level is not an allowed level number.")
     
+    @classmethod
+    def check_levels(self, entries, level, field = "user"):
+        '''
+        Ensure that the Poster of every entry is of the given level or above. Posters already loaded on an entry are
+        used as is, all of the others are resolved with a single IN query for their levels, so checking a batch costs
+        at most one query no matter how many entries are in it.
+        
+        Raises a PermissionError if any entry's Poster is not allowed.
+        
+        @param entries: an iterable of model instances with a foreign key to a Poster
+        @param level: the minimum level as either a level number or a level name
+        @param field: the name of the foreign key field to the Poster
+        '''
+        entries = list(entries)
+        if not entries:
+            return
+        level_num = level if isinstance(level, int) else self.get_level_by_name(level)
+        fk = entries[0]._meta.get_field(field)
+        levels = {}
+        for e in entries:
+            poster = getattr(e, fk.get_cache_name(), None)
+            if poster is not None:
+                levels[getattr(e, fk.attname)] = poster.level
+        missing = set(getattr(e, fk.attname) for e in entries) - set(levels) - {None}
+        if missing:
+            levels.update(self.objects.filter(id__in = missing).values_list("id", "level"))
+        for e in entries:
+            if levels.get(getattr(e, fk.attname), -1) < level_num:
+                raise PermissionError('Poster is not of level {} or above. Cannot save or update.'.format(
+                                      level if isinstance(level, int) else '"{}"'.format(level)))
+    
     def __str__(self):
         return self.email
 
+class LevelCheckedManager(m.Manager):
+    '''
+    Manager for models that can only be written by a Poster of a certain level. The model sets the level with the
+    required_level variable. Since bulk_create bypasses save, the level check is done here for the whole batch at once.
+    '''
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        Poster.check_levels(objs, self.model.required_level)
+        return super(LevelCheckedManager, self).bulk_create(objs, *args, **kwargs)
+
 class Label(mav):
     '''
     Label of a comment or post. Only Posters of level 3 or above can create and update, level 1 and above to add, and level 4 and above to create/update/delete.
@@ -102,8 +172,12 @@ class Label(mav):
     created = m.DateTimeField('When the label was created.', auto_now_add = True)
     notes = m.TextField("Any notes about the label to help clarify what it is.", null=True)
     user = m.ForeignKey(Poster)
+    post_count = m.IntegerField("The number of posts with the label. Kept up to date by the signals below.", default = 0)
+    
+    objects = LevelCheckedManager()
     
     register_route = True
+    required_level = 3
     
     def save(self, *args, **kwargs):
         '''
@@ -111,8 +185,7 @@ class Label(mav):
         
         Raises a PermissionError if not allowed.
         '''
-        if self.user.level < 3:
-            raise PermissionError('Poster is not of level 3 or above. Cannot save or update.')
+        Poster.check_levels((self,), self.required_level)
         super(Label, self).save(*args, **kwargs)
         
     def delete(self, *args, **kwargs):
@@ -131,6 +204,8 @@ class Entry(mav):
     text = m.TextField('The text of the entry.')
     user = m.ForeignKey(Poster)
     
+    objects = LevelCheckedManager()
+    
     register_route = True
     
     class Meta:
@@ -142,18 +217,53 @@ class Post(Entry):
     '''
     title = m.TextField('The title of the blogpost.')
     labels = m.ManyToManyField(Label, related_name="posts")
+    comment_count = m.IntegerField('The number of comments on the post. Kept up to date by Comment.', default = 0)
+    
+    required_level = "creator"
+    #the rendered posts include their comments and labels
+    cache_policy = CachePolicy(ttl = 30, stale_while_revalidate = 300,
+                               invalidated_by = ("db.post", "db.comment", "db.label", "db.post_labels", "db.poster"))
+    #a post with its author, labels and comments is kept pre-rendered; see the snapshot receivers below
+    snapshot_params = {"_expand" : "", "_depth" : "1"}
     
     def save(self, *args, **kwargs):
         '''
         Save the post only after ensuring that the user making it the has the sufficient level. Raise an AuthenticationError
         if not.
         '''
-        if self.user.level < Poster.get_level_by_name("creator"):
-            raise PermissionError('Poster is not of level "creator" or above. Cannot save or update.')
+        Poster.check_levels((self,), self.required_level)
         super(Post, self).save(*args, **kwargs)
     
     def __str__(self):
         return self.title
+
+def count_by(counts, model, field):
+    '''
+    Add to the counter field of many rows, with one UPDATE per distinct amount rather than one per row.
+    
+    @param counts: a dictionary of pk to the amount to add
+    @param model: the model of the counter
+    @param field: the name of the counter field
+    '''
+    by_amount = {}
+    for pk, n in counts.items():
+        if n:
+            by_amount.setdefault(n, []).append(pk)
+    for n, pks in by_amount.items():
+        model.objects.filter(pk__in = pks).update(**{field : F(field) + n})
+
+class CommentManager(LevelCheckedManager):
+    '''
+    Keeps Post.comment_count up to date for comments created in bulk.
+    '''
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using = self.db):
+            created = super(CommentManager, self).bulk_create(objs, *args, **kwargs)
+            count_by(Counter(o.post_id for o in objs), Post, "comment_count")
+        snapshots.refresh(Post, (o.post_id for o in objs)) #after the block, so the render sees the comments
+        return created
         
 class Comment(Entry):
     '''
@@ -164,15 +274,92 @@ class Comment(Entry):
     post = m.ForeignKey(Post, related_name = "comments")
     labels = m.ManyToManyField(Label, related_name="comments")
     
+    objects = CommentManager()
+    
+    required_level = "commenter"
+    
     def save(self, *args, **kwargs):
         '''
         Save the comment only after ensuring that the user making it the has the sufficient level. Raise an AuthenticationError
-        if not.
+        if not. A new comment is counted on its post in the same transaction, and then the post's snapshot is
+        refreshed once that has been committed.
         '''
-        if self.user.level < Poster.get_level_by_name("commenter"):
-            raise PermissionError('Poster is not of level "commenter" or above. Cannot save or update.')
-        super(Comment, self).save(*args, **kwargs)
+        Poster.check_levels((self,), self.required_level)
+        adding = self._state.adding
+        with transaction.atomic(using = kwargs.get("using")):
+            super(Comment, self).save(*args, **kwargs)
+            if adding:
+                Post.objects.filter(pk = self.post_id).update(comment_count = F("comment_count") + 1)
+        snapshots.refresh(Post, (self.post_id,))
+
+@receiver(post_delete, sender = Comment)
+def uncount_comment(sender, instance, **kwargs):
+    '''
+    Deletes run in a transaction and send this for every comment, including the replies deleted along with a
+    comment, so the count stays right however the comment was deleted.
+    '''
+    Post.objects.filter(pk = instance.post_id).update(comment_count = F("comment_count") - 1)
+
+@receiver(m2m_changed, sender = Post.labels.through)
+def count_labels(sender, instance, action, reverse, pk_set, **kwargs):
+    '''
+    Keep Label.post_count up to date as labels are added to and removed from posts, from either side. Django only
+    passes the pks that were really added to post_add, but passes every pk asked for to the removes, so the rows
+    that really go away are looked up before they do.
+    '''
+    through = Post.labels.through
+    if action in ("pre_remove", "pre_clear"):
+        rows = through.objects.filter(**{"label_id" if reverse else "post_id" : instance.pk})
+        if action == "pre_remove":
+            rows = rows.filter(**{"post_id__in" if reverse else "label_id__in" : pk_set})
+        instance._removed_labels = list(rows.values_list("label_id", flat = True))
+        return
+    if action == "post_add":
+        labels = [instance.pk] * len(pk_set) if reverse else pk_set
+        amount = 1
+    elif action in ("post_remove", "post_clear"):
+        labels = instance.__dict__.pop("_removed_labels", ())
+        amount = -1
+    else:
+        return
+    count_by({name : n * amount for name, n in Counter(labels).items()}, Label, "post_count")
+    snapshot_counted_posts(labels)
+
+@receiver(pre_delete, sender = Post)
+def uncount_post_labels(sender, instance, **kwargs):
+    '''
+    Deleting a post deletes its label rows without sending m2m_changed.
+    '''
+    labels = list(Post.labels.through.objects.filter(post_id = instance.pk).values_list("label_id", flat = True))
+    count_by({name : -1 for name in labels}, Label, "post_count")
+    snapshot_counted_posts(labels)
+
+def snapshot_counted_posts(labels):
+    '''
+    The snapshots of posts embed the post_count of their labels, which count_by changes without sending post_save,
+    so every post with a label whose count changed is rendered again.
+    '''
+    if labels:
+        snapshots.refresh(Post, Post.labels.through.objects.filter(label_id__in = set(labels))
+                          .values_list("post_id", flat = True))
+    
+class ContactManager(m.Manager):
+    '''
+    Since bulk_create bypasses save, the emails of contacts created in bulk are normalized here, and the contacts
+    are tied to the Posters with their emails with a single IN query for the whole batch.
+    '''
     
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for o in objs:
+            o.email = PosterManager.normalize_email(o.email)
+        unlinked = [o for o in objs if o.user_id is None]
+        if unlinked:
+            posters = dict(Poster.objects.filter(email__in = set(o.email for o in unlinked)).values_list("email", "id"))
+            for o in unlinked:
+                o.user_id = posters.get(o.email)
+        return super(ContactManager, self).bulk_create(objs, *args, **kwargs)
+
 class Contact(mav):
     '''
     Contact me references. Attempts to tie them to a Poster once a user is created.
@@ -184,17 +371,175 @@ class Contact(mav):
     contacted = m.DateTimeField("The datetime that the contact was created.", auto_now_add = True)
     user = m.ForeignKey(Poster, related_name = "contacts", null=True)
     
+    objects = ContactManager()
+    
     register_route = True
     
     def save(self, *args, **kwargs):
         '''
-        Checks to see if the contact is already a poster. If so, adds to ForeignKey.
+        Normalizes the email and has a job tie the contact to the Poster with that email, if there is one.
         '''
         self.email = PosterManager.normalize_email(self.email)
-        u = Poster.objects.filter(email = self.email)
-        if len(u) > 0:
-            self.user = u[0]
         super(Contact, self).save(*args, **kwargs)
+        if self.user_id is None:
+            jobs.defer(link_contacts, self.email, dedupe_key = "link_contacts:{}".format(self.email))
         
     def __str(self):
-        return self.email + " : " + self.notes
\ No newline at end of file
+        return self.email + " : " + self.notes
+
+@jobs.task
+def link_contacts(email):
+    '''
+    Tie the unlinked Contacts with an email to the Poster with that email, if there is one yet.
+    '''
+    user_id = Poster.objects.filter(email = email).values_list("id", flat = True).first()
+    if user_id is None:
+        return
+    with transaction.atomic():
+        contacts = list(Contact.objects.filter(email = email, user__isnull = True).values_list("id", flat = True))
+        if contacts:
+            Contact.objects.filter(pk__in = contacts).update(user = user_id)
+            Change.record(Contact, contacts) #update sends no signals
+
+@receiver(post_save, sender = Poster)
+def link_poster_contacts(sender, instance, created = False, raw = False, **kwargs):
+    if created and not raw:
+        jobs.defer(link_contacts, instance.email, dedupe_key = "link_contacts:{}".format(instance.email))
+
+@receiver(post_save, sender = Post)
+@receiver(post_delete, sender = Post)
+def snapshot_post(sender, instance, **kwargs):
+    snapshots.refresh(Post, (instance.pk,))
+
+@receiver(post_delete, sender = Comment)
+def snapshot_comment_post(sender, instance, **kwargs):
+    snapshots.refresh(Post, (instance.post_id,))
+
+@receiver(bulk_saved, sender = Post)
+def snapshot_saved_posts(sender, pks, **kwargs):
+    snapshots.refresh(Post, pks)
+
+@receiver(bulk_saved, sender = Comment)
+def snapshot_saved_comment_posts(sender, pks, created, **kwargs):
+    if not created: #CommentManager refreshes the posts of comments created in bulk
+        snapshots.refresh(Post, Comment.objects.filter(pk__in = pks).values_list("post_id", flat = True))
+
+def _labeled_posts(label):
+    return list(Post.labels.through.objects.filter(label_id = label.pk).values_list("post_id", flat = True))
+
+@receiver(m2m_changed, sender = Post.labels.through)
+def labeled_posts_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    '''
+    Refresh the snapshots and record the changes of posts whose labels changed. Clearing the posts of a label does
+    not say which posts they were, so they are looked up before the clear.
+    '''
+    if action == "pre_clear" and reverse:
+        instance._cleared_posts = _labeled_posts(instance)
+        return
+    if action in ("post_add", "post_remove"):
+        posts = pk_set if reverse else (instance.pk,)
+    elif action == "post_clear":
+        posts = instance.__dict__.pop("_cleared_posts", ()) if reverse else (instance.pk,)
+    else:
+        return
+    snapshots.refresh(Post, posts)
+    Change.record(Post, posts)
+    labels = [instance.pk] if reverse else list(pk_set or ())
+    for pk in posts:
+        pubsub.publish({"type" : "post", "action" : "labeled", "id" : pk, "post" : pk, "labels" : labels})
+
+@receiver(m2m_changed, sender = Comment.labels.through)
+def labeled_comments_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        Change.record(Comment, (instance.pk,))
+    else: #clearing the comments of a label does not say which they were
+        Change.record(Comment, pk_set if pk_set is not None else (None,))
+
+@receiver(post_save, sender = Label)
+def snapshot_label_posts(sender, instance, **kwargs):
+    snapshots.refresh(Post, _labeled_posts(instance))
+
+@receiver(bulk_saved, sender = Label)
+def snapshot_saved_label_posts(sender, pks, **kwargs):
+    snapshots.refresh(Post, Post.labels.through.objects.filter(label_id__in = pks).values_list("post_id", flat = True))
+
+@receiver(pre_delete, sender = Label)
+def remember_label_posts(sender, instance, **kwargs):
+    instance._deleted_from_posts = _labeled_posts(instance)
+
+@receiver(post_delete, sender = Label)
+def snapshot_unlabeled_posts(sender, instance, **kwargs):
+    snapshots.refresh(Post, instance.__dict__.pop("_deleted_from_posts", ()))
+
+@receiver(post_save, sender = Poster)
+def snapshot_poster_posts(sender, instance, **kwargs):
+    '''
+    The author, last_login and level included, is part of the snapshot, so every save of a poster (logins as well)
+    renders the poster's posts again.
+    '''
+    snapshots.refresh(Post, Post.objects.filter(user_id = instance.pk).values_list("id", flat = True))
+
+@receiver(pre_delete, sender = Post)
+def remember_post_labels(sender, instance, **kwargs):
+    instance._deleted_labels = list(instance.labels.values_list("name", flat = True))
+
+def _publish_saved_posts(pks):
+    '''
+    A new post has no labels yet when it is saved, so the events read them once the transaction commits. Labels
+    added after that (outside the transaction) are published as labeled events by labeled_posts_changed.
+    '''
+    def events():
+        labels = {}
+        for post, label in Post.labels.through.objects.filter(post_id__in = pks).values_list("post_id", "label_id"):
+            labels.setdefault(post, []).append(label)
+        return [{"type" : "post", "action" : "saved", "id" : pk, "post" : pk, "labels" : labels.get(pk, [])}
+                for pk in pks]
+    pubsub.publish(events)
+
+@receiver(post_save, sender = Post)
+def publish_post(sender, instance, **kwargs):
+    _publish_saved_posts([instance.pk])
+
+@receiver(bulk_saved, sender = Post)
+def publish_saved_posts(sender, pks, **kwargs):
+    if pks:
+        _publish_saved_posts(list(pks))
+
+@receiver(post_delete, sender = Post)
+def publish_deleted_post(sender, instance, **kwargs):
+    pubsub.publish({"type" : "post", "action" : "deleted", "id" : instance.pk, "post" : instance.pk,
+                    "labels" : instance.__dict__.pop("_deleted_labels", [])})
+
+@receiver(post_save, sender = Comment)
+@receiver(post_delete, sender = Comment)
+def publish_comment(sender, instance, **kwargs):
+    '''
+    Comments are published with the labels of their post, so a stream of a label gets the comments on its posts.
+    '''
+    labels = list(Post.labels.through.objects.filter(post_id = instance.post_id).values_list("label_id", flat = True))
+    pubsub.publish({"type" : "comment", "action" : "saved" if "created" in kwargs else "deleted",
+                    "id" : instance.pk, "post" : instance.post_id, "labels" : labels})
+
+@receiver(bulk_saved, sender = Comment)
+def publish_saved_comments(sender, pks, **kwargs):
+    comments = list(Comment.objects.filter(pk__in = pks).values_list("id", "post_id"))
+    labels = {}
+    for post, label in (Post.labels.through.objects.filter(post_id__in = set(post for pk, post in comments))
+                        .values_list("post_id", "label_id")):
+        labels.setdefault(post, []).append(label)
+    for pk, post in comments:
+        pubsub.publish({"type" : "comment", "action" : "saved", "id" : pk, "post" : post,
+                        "labels" : labels.get(post, [])})
+
+@receiver(post_save, sender = Label)
+@receiver(post_delete, sender = Label)
+def publish_label(sender, instance, **kwargs):
+    pubsub.publish({"type" : "label", "action" : "saved" if "created" in kwargs else "deleted", "id" : instance.pk,
+                    "post" : None, "labels" : [instance.pk]})
+
+@receiver(bulk_saved, sender = Label)
+def publish_saved_labels(sender, pks, **kwargs):
+    for pk in pks:
+        pubsub.publish({"type" : "label", "action" : "saved", "id" : pk, "post" : None, "labels" : [pk]})
@@ -0,0 +1,245 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+Exports the blog to static files so a web server can answer most reads without Django. Each file is laid out
+under the URL it stands in for, with the body that URL would return:
+
+    <out>/db/models/post/<id>/index.json                     a post with ?_expand&_depth=1 (its snapshot)
+    <out>/controllers/blog/search/post/bylabel/<name>/index.json    the posts of a label, as ByLabel returns them
+    <out>/threads/<post id>.json                             the comments of a post nested into threads
+
+and, if html_dir is given, html_dir/posts/<id>.html and html_dir/labels/<name>.html pages.
+
+Posts are split into chunks of consecutive pks and the chunks are rendered in a process pool. Every file is
+written to a temporary name and moved into place, so the server never sees a partly written one.
+
+Runs are incremental. The state file in <out> records when the last run started and the comment and post counts
+(see Post.comment_count and Label.post_count) it saw, so the next run renders only the posts that were updated,
+commented on, had comments edited or had labels added or removed since (going by last_updated and the change log of
+mviews.models.Change), or whose comment count changed (a comment was deleted), and the labels that were saved
+since, whose post count changed, or that are on any of those posts. Posts and labels that are gone have their files removed. Edits to the
+authors of posts do not touch any of these, so they need a full run.
+'''
+import os
+import json
+from collections import OrderedDict
+from concurrent import futures
+from urllib.parse import urlencode, quote
+
+from django.db import connections
+from django.http import QueryDict
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.html import escape
+from django.core.serializers.json import DjangoJSONEncoder
+
+from db import models
+from mviews import expansion
+from mviews.models import Change
+from mviews.serializer import serialize
+
+state_name = ".export_state.json"
+
+def post_path(out, pk):
+    return os.path.join(out, "db", "models", "post", str(pk), "index.json")
+
+def safe_label(name):
+    '''
+    Whether a label name can be used as a single path component: no separators, NULs, or . and .. that would point
+    out of the directory. The other labels are not exported.
+    '''
+    return bool(name) and name not in (".", "..") and not any(c in name for c in ("/", "\\", os.sep, "\0"))
+
+def label_path(out, name):
+    if not safe_label(name):
+        raise ValueError("The label {!r} cannot be used as a file name.".format(name))
+    return os.path.join(out, "controllers", "blog", "search", "post", "bylabel", name, "index.json")
+
+def label_page(html_dir, name):
+    if not safe_label(name):
+        raise ValueError("The label {!r} cannot be used as a file name.".format(name))
+    return os.path.join(html_dir, "labels", "{}.html".format(name))
+
+def thread_path(out, pk):
+    return os.path.join(out, "threads", "{}.json".format(pk))
+
+def atomic_write(path, data):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok = True)
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp, "w", encoding = "utf-8") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def threads(comments):
+    '''
+    Nest comment rows into threads: every comment gets a replies list and the top level is the comments that do
+    not reply to another.
+    '''
+    by_id = OrderedDict((c["id"], dict(c, replies = [])) for c in comments)
+    top = []
+    for c in by_id.values():
+        parent = by_id.get(c["comment_id"])
+        (parent["replies"] if parent is not None else top).append(c)
+    return top
+
+def _thread_html(thread):
+    return "<ul>{}</ul>".format("".join(
+        "<li><h4>{}</h4><p>{}</p>{}</li>".format(escape(c["title"] or ""), escape(c["text"]),
+                                                 _thread_html(c["replies"]) if c["replies"] else "")
+        for c in thread))
+
+def _page(title, body):
+    return ('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{}</title>\n</head>\n<body>\n{}\n'
+            '</body>\n</html>\n').format(escape(title), body)
+
+def export_posts(out, pks, html_dir = None):
+    '''
+    Render a chunk of posts with their comment threads. Run in the worker processes.
+
+    @param out: the output directory
+    @param pks: the primary keys of the posts
+    @param html_dir: where to write html pages, or None for none
+    @return the number of posts written
+    '''
+    try:
+        view = models.Post()
+        view.set_params(QueryDict(urlencode(models.Post.snapshot_params)))
+        rows = expansion.expand(view, models.Post.objects.filter(pk__in = pks).select_related())
+        comments = {}
+        for c in models.Comment.objects.filter(post_id__in = pks).order_by("created", "id").values(
+                "id", "post_id", "comment_id", "title", "text", "user_id", "created", "last_updated"):
+            comments.setdefault(c["post_id"], []).append(c)
+        for row in rows:
+            atomic_write(post_path(out, row.pk), serialize(view, [row]))
+            thread = threads(comments.get(row.pk, ()))
+            atomic_write(thread_path(out, row.pk), json.dumps(thread, cls = DjangoJSONEncoder))
+            if html_dir:
+                labels = "".join('<a href="../labels/{0}.html">{1}</a> '.format(escape(quote(l.pk)), escape(l.pk))
+                                 for l in row.labels.all() if safe_label(l.pk))
+                atomic_write(os.path.join(html_dir, "posts", "{}.html".format(row.pk)), _page(row.title,
+                    "<h1>{}</h1>\n<p>{}</p>\n<p>{}</p>\n{}".format(escape(row.title), escape(row.text), labels,
+                                                                  _thread_html(thread))))
+        return len(rows)
+    finally:
+        for conn in connections.all():
+            conn.close()
+
+def export_labels(out, names, html_dir = None):
+    '''
+    Render the ByLabel page of a chunk of labels. Run in the worker processes.
+    '''
+    try:
+        posts = OrderedDict((name, []) for name in names)
+        for label, pk, title in models.Post.labels.through.objects.filter(label_id__in = names).values_list(
+                "label_id", "post_id", "post__title"):
+            posts[label].append({"id" : pk, "title" : title})
+        for name, p in posts.items():
+            atomic_write(label_path(out, name), json.dumps(p))
+            if html_dir:
+                atomic_write(label_page(html_dir, name), _page(name,
+                    "<h1>{}</h1>\n<ul>{}</ul>".format(escape(name), "".join(
+                        '<li><a href="../posts/{}.html">{}</a></li>'.format(x["id"], escape(x["title"])) for x in p))))
+        return len(posts)
+    finally:
+        for conn in connections.all():
+            conn.close()
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _load_state(out):
+    try:
+        with open(os.path.join(out, state_name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _changed(model, since):
+    '''
+    The pks (as strings) of the rows of a model with a change recorded since a time. None is among them if rows
+    were created in bulk without their keys being known.
+    '''
+    return set(Change.objects.filter(model = Change.label(model), at__gte = since)
+               .values_list("object_pk", flat = True))
+
+def export(out, html_dir = None, full = False, workers = None, chunk_size = 200, log = None):
+    '''
+    Export everything that changed since the last run, or everything if full is True or there was no last run.
+
+    @param out: the output directory
+    @param html_dir: where to write html pages, or None for none
+    @param workers: the number of worker processes, defaulting to the number of cpus
+    @param chunk_size: the number of posts or labels per task
+    @param log: a function to call with progress messages
+    @return a dictionary of the counts of posts and labels written and removed
+    '''
+    log = log or (lambda msg: None)
+    state = None if full else _load_state(out)
+    started = timezone.now()
+    comment_counts = {str(pk) : n for pk, n in models.Post.objects.values_list("id", "comment_count")}
+    post_counts = dict(models.Label.objects.values_list("name", "post_count"))
+    if state is None:
+        posts = sorted(int(pk) for pk in comment_counts)
+        labels = sorted(post_counts)
+        gone_posts, gone_labels = [], []
+    else:
+        since = parse_datetime(state["since"])
+        old_comments, old_posts = state["comment_counts"], state["post_counts"]
+        posts = set(models.Post.objects.filter(last_updated__gte = since).values_list("id", flat = True))
+        posts.update(models.Comment.objects.filter(last_updated__gte = since).values_list("post_id", flat = True))
+        posts.update(int(pk) for pk, n in comment_counts.items() if old_comments.get(pk) != n)
+        changed = _changed(models.Post, since) #label membership changes touch the change log but not last_updated
+        if None in changed:
+            changed = comment_counts
+        posts.update(int(pk) for pk in changed if pk in comment_counts) #deleted posts are removed below
+        comments = _changed(models.Comment, since) #a PUT edits a comment without touching last_updated
+        commented = models.Comment.objects.values_list("post_id", flat = True)
+        if None not in comments and len(comments) < 900: #past SQLite's parameter limit just redo them all
+            commented = commented.filter(pk__in = [int(pk) for pk in comments])
+        posts.update(commented.distinct())
+        posts = sorted(posts)
+        labels = set(name for name, n in post_counts.items() if old_posts.get(name) != n)
+        labels.update(name for name in _changed(models.Label, since) if name in post_counts)
+        labels.update(models.Post.labels.through.objects.filter(post_id__in = posts).values_list("label_id", flat = True)
+                      if len(posts) < 900 else post_counts) #past SQLite's parameter limit just redo them all
+        gone_posts = [pk for pk in old_comments if pk not in comment_counts]
+        gone_labels = [name for name in old_posts if name not in post_counts]
+    unsafe = [name for name in labels if not safe_label(name)]
+    if unsafe:
+        log("Skipping the labels {} whose names cannot be file names.".format(", ".join(repr(n) for n in unsafe)))
+    labels = sorted(name for name in labels if safe_label(name))
+    gone_labels = [name for name in gone_labels if safe_label(name)]
+    log("Rendering {} posts and {} labels.".format(len(posts), len(labels)))
+
+    for conn in connections.all():
+        conn.close() #the workers must not share the parent's connections
+    with futures.ProcessPoolExecutor(max_workers = workers) as pool:
+        tasks = [pool.submit(export_posts, out, chunk, html_dir) for chunk in _chunks(posts, chunk_size)]
+        tasks += [pool.submit(export_labels, out, chunk, html_dir) for chunk in _chunks(labels, chunk_size)]
+        for task in futures.as_completed(tasks):
+            task.result()
+
+    for pk in gone_posts:
+        remove(post_path(out, pk))
+        remove(thread_path(out, pk))
+        if html_dir:
+            remove(os.path.join(html_dir, "posts", "{}.html".format(pk)))
+    for name in gone_labels:
+        remove(label_path(out, name))
+        if html_dir:
+            remove(label_page(html_dir, name))
+    atomic_write(os.path.join(out, state_name), json.dumps({"since" : started.isoformat(),
+                                                            "comment_counts" : comment_counts,
+                                                            "post_counts" : post_counts}))
+    return {"posts" : len(posts), "labels" : len(labels), "removed_posts" : len(gone_posts),
+            "removed_labels" : len(gone_labels)}
@@ -0,0 +1,167 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+Precompressed, content-hashed static assets. The build_assets command copies every file under ASSET_SOURCE_DIRS
+into ASSET_ROOT under a name containing a hash of its content, writes gzip and brotli variants once at maximum
+compression, and records it all in a manifest. The serve view then only has to pick a file: the variant the client
+accepts is sent as is, so nothing is compressed on the request path.
+
+Hashed names never change content, so they are sent with far-future cache headers. The plain names (such as
+index.html) are also served, with an ETag of the hash, so pages that link to them still work. The ETag of a
+compressed variant has the encoding appended ("<hash>-gzip"), since its bytes differ from the plain file's.
+
+Brotli variants are only written if the brotli package is installed.
+'''
+import os
+import re
+import gzip
+import json
+import hashlib
+import mimetypes
+
+from django.conf import settings
+from django.http import Http404
+from django.http.response import HttpResponseNotModified, FileResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = "manifest.json"
+FAR_FUTURE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+
+#types that are already compressed gain nothing from another pass
+compressed_types = re.compile(r'^(image/(?!svg)|video/|audio/|font/woff|application/(zip|gzip|x-gzip|x-brotli|pdf))')
+
+encodings = (("br", ".br"), ("gzip", ".gz"))
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(64*1024), b''):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+def _hashed_name(name, digest):
+    base, ext = os.path.splitext(name)
+    return "{}.{}{}".format(base, digest, ext)
+
+def _write(path, data):
+    '''
+    Write the file atomically so a running site never serves a half written asset.
+    '''
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def build(source_dirs = None, root = None):
+    '''
+    Fingerprint and precompress every file under the source dirs into the root, and write the manifest. Files
+    whose compressed variants are not smaller than the original only get the original.
+
+    @param source_dirs: the dirs to collect from; defaults to ASSET_SOURCE_DIRS
+    @param root: the dir to write to; defaults to ASSET_ROOT
+    @return the manifest dictionary of name to its hashed name, content type and encodings
+    '''
+    source_dirs = source_dirs or settings.ASSET_SOURCE_DIRS
+    root = root or settings.ASSET_ROOT
+    manifest = {}
+    for source in source_dirs:
+        for dirpath, dirnames, filenames in os.walk(source):
+            for filename in filenames:
+                src = os.path.join(dirpath, filename)
+                name = os.path.relpath(src, source).replace(os.sep, '/')
+                digest = _hash_file(src)
+                hashed = _hashed_name(name, digest)
+                dest = os.path.join(root, *hashed.split('/'))
+                if not os.path.exists(os.path.dirname(dest)):
+                    os.makedirs(os.path.dirname(dest))
+                with open(src, 'rb') as f:
+                    data = f.read()
+                content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                entry = {"path" : hashed, "hash" : digest, "content_type" : content_type,
+                         "encodings" : []}
+                if not os.path.exists(dest):
+                    _write(dest, data)
+                if not compressed_types.match(content_type):
+                    variants = {"gzip" : lambda d: gzip.compress(d, compresslevel = 9, mtime = 0)}
+                    if brotli is not None:
+                        variants["br"] = lambda d: brotli.compress(d, quality = 11)
+                    for encoding, suffix in encodings:
+                        if encoding not in variants:
+                            continue
+                        if not os.path.exists(dest + suffix):
+                            compressed = variants[encoding](data)
+                            if len(compressed) >= len(data):
+                                continue
+                            _write(dest + suffix, compressed)
+                        entry["encodings"].append(encoding)
+                manifest[name] = entry
+    if not os.path.exists(root):
+        os.makedirs(root)
+    _write(os.path.join(root, MANIFEST), json.dumps(manifest, indent = 2, sort_keys = True).encode('utf-8'))
+    return manifest
+
+_manifest = (None, None) #(mtime, lookup)
+
+def _lookup():
+    '''
+    Get the lookup of both plain and hashed names to manifest entries, reloading it when the manifest changes.
+    '''
+    global _manifest
+    path = os.path.join(settings.ASSET_ROOT, MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    if _manifest[0] != mtime:
+        with open(path) as f:
+            manifest = json.load(f)
+        lookup = {}
+        for name, entry in manifest.items():
+            lookup[name] = (entry, False)
+            lookup[entry["path"]] = (entry, True)
+        _manifest = (mtime, lookup)
+    return _manifest[1]
+
+def _accepted(request):
+    '''
+    Get the set of content codings the client accepts, leaving out any sent with q=0.
+    '''
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding and not re.match(r'^\s*q=0(\.0*)?\s*$', params):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def serve(request, path):
+    '''
+    Serve a built asset by either its plain or hashed name, picking the smallest variant the client accepts.
+    '''
+    found = _lookup().get(path)
+    if found is None:
+        raise Http404("Asset {} not found.".format(path))
+    entry, hashed = found
+    accepted = _accepted(request)
+    encoding = next((e for e, _ in encodings if e in entry["encodings"] and e in accepted), None)
+    etag = '"{}-{}"'.format(entry["hash"], encoding) if encoding else '"{}"'.format(entry["hash"])
+    if etag in [t.strip() for t in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        resp = HttpResponseNotModified()
+    else:
+        full = os.path.join(settings.ASSET_ROOT, *entry["path"].split('/'))
+        suffix = dict(encodings)[encoding] if encoding else ''
+        resp = FileResponse(open(full + suffix, 'rb'), content_type = entry["content_type"])
+        resp['Content-Length'] = os.path.getsize(full + suffix)
+        if encoding:
+            resp['Content-Encoding'] = encoding
+    resp['ETag'] = etag
+    resp['Cache-Control'] = FAR_FUTURE if hashed else REVALIDATE
+    patch_vary_headers(resp, ('Accept-Encoding',))
+    return resp
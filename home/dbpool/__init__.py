@@ -0,0 +1,3 @@
+'''
+A database backend that pools connections in front of another backend. See home/dbpool/base.py.
+'''
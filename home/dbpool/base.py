@@ -0,0 +1,261 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+A pooled database backend. It wraps any other backend, so the existing DATABASES config only needs its ENGINE
+moved into a POOL dictionary:
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'home.dbpool',
+            'NAME': 'home',
+            ...
+            'CONN_MAX_AGE': 0, #give the connection back to the pool at the end of every request
+            'POOL': {
+                'ENGINE': 'django.db.backends.postgresql_psycopg2',
+                'MIN_SIZE': 2, #connections opened on first use and kept open
+                'MAX_SIZE': 20, #the most connections open at once
+                'TIMEOUT': 2, #seconds to wait for a free connection before failing with PoolTimeout
+                'RECYCLE': 60*17, #seconds before a connection is closed and replaced
+                'VALIDATE': True, #run a cheap query on every checkout and replace broken connections
+            },
+        }
+    }
+
+Django opens and closes a connection per thread as before, but opening takes one from the pool and closing gives it
+back, so the number of real connections is bounded by MAX_SIZE no matter how many threads there are. Connections
+that had errors or were closed in the middle of a transaction are not given back but closed.
+'''
+import os
+import time
+import threading
+from collections import deque
+from importlib import import_module
+
+from django.db.utils import OperationalError
+
+class PoolTimeout(OperationalError):
+
+    def __init__(self, alias, timeout):
+        super(PoolTimeout, self).__init__(
+            "No connection to database {} was free within {} seconds.".format(alias, timeout))
+
+class Pool(object):
+    '''
+    The connections of one database alias in one process.
+    '''
+
+    def __init__(self, alias, min_size = 0, max_size = 10, timeout = 2, recycle = None, validate = True):
+        self.alias = alias
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.validate = validate
+        self.idle = deque()
+        self.born = {} #id(connection) -> when it was opened
+        self.size = 0
+        self.filled = False
+        self.counters = {"checkouts" : 0, "waits" : 0, "timeouts" : 0, "opened" : 0, "closed" : 0,
+                         "invalid" : 0, "wait_seconds" : 0.0}
+        self._cond = threading.Condition()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counters)
+            stats.update({"size" : self.size, "idle" : len(self.idle), "in_use" : self.size - len(self.idle)})
+        return stats
+
+    def available(self):
+        '''
+        The number of connections that can be checked out right now without waiting: the idle ones and the ones
+        the pool still has room to open.
+        '''
+        with self._cond:
+            return len(self.idle) + self.max_size - self.size
+
+    def _open(self, connect):
+        try:
+            conn = connect()
+        except Exception:
+            with self._cond:
+                self.size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.born[id(conn)] = time.time()
+            self.counters["opened"] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self.born.pop(id(conn), None)
+            self.counters["closed"] += 1
+            self.size -= 1
+            self._cond.notify()
+
+    def _expired(self, conn):
+        return self.recycle is not None and time.time() - self.born.get(id(conn), 0) > self.recycle
+
+    def _is_valid(self, conn):
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _fill(self, connect):
+        '''
+        Open the minimum number of connections the first time the pool is used.
+        '''
+        with self._cond:
+            if self.filled:
+                return
+            self.filled = True
+        while True:
+            with self._cond:
+                if self.size >= self.min_size:
+                    return
+                self.size += 1 #reserve the slot of the one connection about to be opened; _open gives it back on failure
+            try:
+                self.checkin(self._open(connect))
+            except Exception:
+                return #the real checkout will report the error
+
+    def checkout(self, connect):
+        '''
+        Get a connection, opening one with connect if none are idle and the pool is not full. Waits at most the
+        timeout for one to be given back.
+
+        Raises PoolTimeout if none were free in time.
+        '''
+        if not self.filled:
+            self._fill(connect)
+        deadline = time.time() + self.timeout
+        waited = False
+        while True:
+            with self._cond:
+                conn = None
+                if self.idle:
+                    conn = self.idle.pop()
+                elif self.size < self.max_size:
+                    self.size += 1
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.counters["timeouts"] += 1
+                        raise PoolTimeout(self.alias, self.timeout)
+                    if not waited:
+                        waited = True
+                        self.counters["waits"] += 1
+                    start = time.time()
+                    self._cond.wait(remaining)
+                    self.counters["wait_seconds"] += time.time() - start
+                    continue
+                self.counters["checkouts"] += 1
+            if conn is None:
+                return self._open(connect)
+            if self._expired(conn):
+                self._discard(conn)
+                continue
+            if self.validate and not self._is_valid(conn):
+                self.counters["invalid"] += 1
+                self._discard(conn)
+                continue
+            return conn
+
+    def checkin(self, conn):
+        '''
+        Give a connection back, closing it instead if it is too old.
+        '''
+        if self._expired(conn):
+            self._discard(conn)
+            return
+        with self._cond:
+            self.idle.append(conn)
+            self._cond.notify()
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+def get_pool(alias, options):
+    '''
+    Get the pool of the alias in this process. Pools are not shared with forked processes.
+    '''
+    global _pools, _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools = {}
+            _pools_pid = os.getpid()
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = Pool(alias, min_size = options.get('MIN_SIZE', 0),
+                                        max_size = options.get('MAX_SIZE', 10), timeout = options.get('TIMEOUT', 2),
+                                        recycle = options.get('RECYCLE'), validate = options.get('VALIDATE', True))
+        return pool
+
+def stats():
+    '''
+    Get the stats of every pool in this process by alias.
+    '''
+    with _pools_lock:
+        pools = dict(_pools) if _pools_pid == os.getpid() else {}
+    return {alias : pool.stats() for alias, pool in pools.items()}
+
+_wrappers = {}
+
+def pooled_wrapper(engine):
+    '''
+    Build the pooled DatabaseWrapper class of a backend.
+    '''
+    if engine in _wrappers:
+        return _wrappers[engine]
+    backend = import_module(engine + '.base')
+
+    class PooledDatabaseWrapper(backend.DatabaseWrapper):
+
+        @property
+        def pool(self):
+            return get_pool(self.alias, self.settings_dict['POOL'])
+
+        def get_new_connection(self, conn_params):
+            parent = super(PooledDatabaseWrapper, self)
+            return self.pool.checkout(lambda: parent.get_new_connection(conn_params))
+
+        def _close(self):
+            if self.connection is None:
+                return
+            if self.errors_occurred or self.in_atomic_block:
+                self.pool._discard(self.connection)
+                return
+            try:
+                self.connection.rollback() #never hand over an open transaction
+            except Exception:
+                self.pool._discard(self.connection)
+                return
+            self.pool.checkin(self.connection)
+
+    _wrappers[engine] = PooledDatabaseWrapper
+    return PooledDatabaseWrapper
+
+class DatabaseWrapper(object):
+    '''
+    Django instantiates the backend's DatabaseWrapper for each alias and thread, so this hands back an instance of
+    the pooled wrapper of the backend named in POOL['ENGINE'].
+    '''
+
+    def __new__(cls, settings_dict, *args, **kwargs):
+        if 'ENGINE' not in settings_dict.get('POOL', {}):
+            raise ValueError("The pooled database backend needs the wrapped backend in DATABASES[...]['POOL']['ENGINE'].")
+        return pooled_wrapper(settings_dict['POOL']['ENGINE'])(settings_dict, *args, **kwargs)
@@ -0,0 +1,139 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+Sends the reads of GET and HEAD requests to read replicas. ReplicaMiddleware marks the requests that are reads and
+ReplicaRouter (in DATABASE_ROUTERS) hands out one of the DATABASE_REPLICAS aliases for their queries. Every other
+query, and every query outside of a request, goes to the primary.
+
+Replicas are picked round robin, or with DATABASE_REPLICA_SELECTION = 'least_latency' by the lowest moving average
+of query time, which home.slowqueries measures for every query.
+
+A client that wrote something reads from the primary for the next DATABASE_REPLICA_STICKY_SECONDS, so it sees its
+own writes even if the replicas are behind. The deadline is kept in the session, where the client cannot set or
+drop it, so ReplicaMiddleware has to come after SessionMiddleware. A client without a session cookie is only read
+from the primary once a write gives it one.
+
+A replica that errors is left out for DATABASE_REPLICA_RETRY_SECONDS. The router connects to a replica before
+handing it to a request, so a replica that is down is skipped for the next one (or the primary) without the request
+seeing an error. A replica that fails after that, in the middle of a query, fails the request, except in
+BaseModelAsView.get, which tells the routers through their replica_failed method and retries the read on the
+primary; the next requests go elsewhere either way.
+'''
+import time
+import threading
+import itertools
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from . import slowqueries
+
+sticky_key = '_dbsticky_until'
+primary_only = ('sessions',) #apps whose reads must always see the latest write
+
+_local = threading.local()
+_lock = threading.Lock()
+_counter = itertools.count()
+_down = {} #alias -> when to try it again
+_latency = {} #alias -> moving average of query seconds
+
+def replicas():
+    '''
+    Get the replica aliases that are not down.
+    '''
+    now = time.time()
+    return [a for a in getattr(settings, 'DATABASE_REPLICAS', ()) if _down.get(a, 0) <= now]
+
+def replica_failed(alias):
+    '''
+    Leave a replica out for DATABASE_REPLICA_RETRY_SECONDS.
+    '''
+    if alias in getattr(settings, 'DATABASE_REPLICAS', ()):
+        with _lock:
+            _down[alias] = time.time() + getattr(settings, 'DATABASE_REPLICA_RETRY_SECONDS', 30)
+
+def _observe(alias, seconds):
+    if alias in _latency or alias in getattr(settings, 'DATABASE_REPLICAS', ()):
+        average = _latency.get(alias)
+        _latency[alias] = seconds if average is None else average * 0.8 + seconds * 0.2
+
+slowqueries.observers.append(_observe)
+
+def _pick(up):
+    if getattr(settings, 'DATABASE_REPLICA_SELECTION', 'round_robin') == 'least_latency':
+        return min(up, key = lambda a: _latency.get(a, 0.0))
+    return up[next(_counter) % len(up)]
+
+def choose():
+    '''
+    Pick a replica that can be connected to, or None if none are up. Replicas that cannot be connected to are left
+    out as if they had failed.
+    '''
+    up = replicas()
+    while up:
+        alias = _pick(up)
+        try:
+            connections[alias].ensure_connection()
+            return alias
+        except DatabaseError:
+            replica_failed(alias)
+            up.remove(alias)
+    return None
+
+class ReplicaRouter(object):
+    '''
+    Route the reads of read requests to a replica and everything else to the primary. A request sticks to the
+    replica it was first given so its queries see a single snapshot.
+    '''
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db #related objects come from where the instance did
+        if not getattr(_local, 'read', False) or model._meta.app_label in primary_only:
+            return DEFAULT_DB_ALIAS
+        alias = getattr(_local, 'alias', None)
+        if alias is None or _down.get(alias, 0) > time.time():
+            alias = _local.alias = choose() or DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        _local.read = False #read what this request wrote from the primary as well
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def replica_failed(self, alias):
+        replica_failed(alias)
+
+class ReplicaMiddleware(object):
+    '''
+    Mark GET and HEAD requests as reads unless the client wrote recently, and make clients that write stick to the
+    primary for a while.
+    '''
+
+    def _sticky(self, request):
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES: #no session to look in, so do not load one
+            return False
+        return request.session.get(sticky_key, 0) > time.time()
+
+    def process_request(self, request):
+        _local.alias = None
+        _local.read = request.method in ('GET', 'HEAD') and not self._sticky(request)
+
+    def process_exception(self, request, exception):
+        alias = getattr(_local, 'alias', None)
+        if isinstance(exception, DatabaseError) and alias not in (None, DEFAULT_DB_ALIAS):
+            replica_failed(alias)
+
+    def process_response(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            seconds = getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 5)
+            if seconds and getattr(settings, 'DATABASE_REPLICAS', ()) and hasattr(request, 'session'):
+                request.session[sticky_key] = time.time() + seconds
+        _local.alias = None
+        _local.read = False
+        return response
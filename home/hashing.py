@@ -0,0 +1,108 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+Password hashing off the request thread. Hashing is run in a bounded process pool so that a burst of logins or
+registrations can only pin HASHING_POOL_WORKERS cores, and once HASHING_POOL_QUEUE hashes are waiting any new
+request fails fast with PoolSaturated instead of queueing behind them.
+
+The pool is configured through the following settings:
+
+    HASHING_POOL_WORKERS: the number of hashing processes; 0 hashes inline in the request thread
+    HASHING_POOL_QUEUE: the most hashes that may be running or waiting at once
+    HASHING_POOL_TIMEOUT: the seconds to wait on a single hash before giving up
+'''
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+class PoolSaturated(Exception):
+
+    def __init__(self):
+        super(PoolSaturated, self).__init__("Too many logins at once. Try again shortly.")
+
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_slots = None
+
+def _init_worker():
+    '''
+    Make sure Django is set up in the hashing process. This is a no-op when the process was forked from a running
+    site, but is needed when processes are spawned.
+    '''
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "home.settings")
+        django.setup()
+
+def _get_pool():
+    '''
+    Get the pool for this process, creating it on first use. The pid is checked so that a pool created before a
+    WSGI server forks its workers is not shared with them.
+    '''
+    global _pool, _pool_pid, _slots
+    if _pool is None or _pool_pid != os.getpid():
+        with _lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _slots = threading.BoundedSemaphore(getattr(settings, "HASHING_POOL_QUEUE", 4))
+                _pool = ProcessPoolExecutor(max_workers = settings.HASHING_POOL_WORKERS, initializer = _init_worker)
+                _pool_pid = os.getpid()
+    return _pool
+
+def _run(func, *args):
+    '''
+    Run the hashing function in the pool, or inline if the pool is turned off.
+
+    Raises PoolSaturated if the queue is full or the hash took longer than the timeout.
+    '''
+    if not getattr(settings, "HASHING_POOL_WORKERS", 0):
+        return func(*args)
+    pool = _get_pool()
+    slots = _slots
+    if not slots.acquire(blocking = False):
+        raise PoolSaturated()
+    try:
+        future = pool.submit(func, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda f: slots.release()) #a hash given up on keeps its slot until it is done
+    try:
+        return future.result(timeout = getattr(settings, "HASHING_POOL_TIMEOUT", 10))
+    except TimeoutError:
+        raise PoolSaturated()
+
+def make_password(password):
+    '''
+    Hash the raw password with the default hasher.
+
+    @param password: the raw password
+    @return the encoded password
+    '''
+    return _run(hashers.make_password, password)
+
+def must_update(encoded):
+    '''
+    Whether the encoded password should be hashed again with the current hasher settings. This does not hash, so it
+    is run inline.
+    '''
+    try:
+        return hashers.identify_hasher(encoded).must_update(encoded)
+    except ValueError:
+        return False
+
+def check_password(password, encoded):
+    '''
+    Check the raw password against the encoded password.
+
+    @param password: the raw password
+    @param encoded: the encoded password as stored on the user
+    @return True if they match
+    '''
+    return _run(hashers.check_password, password, encoded)
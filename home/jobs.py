@@ -0,0 +1,214 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+A durable job queue in a local SQLite file (JOBS_DB) for side effects that do not have to happen in the request.
+Register a function with @task and call defer to have the run_jobs command run it later:
+
+    @jobs.task
+    def link_contact(pk):
+        ...
+
+    jobs.defer(link_contact, contact.pk, dedupe_key = "contact:{}".format(contact.pk))
+
+Arguments must be json-able. Deferring waits for the current transaction to commit where Django supports that, but
+the queue is not in the same database, so tasks must be safe to run after a rollback as well (read what they need
+again rather than trusting their arguments). Django before 1.9 has no on_commit, so there a job deferred inside an
+atomic block is queued right away, only held back JOBS_UNCOMMITTED_DELAY seconds, and may still run before the
+commit or after a rollback. Callers that need the committed rows should defer after their atomic block.
+
+A job with a dedupe_key is not queued again while a job with the same key is still waiting, so a burst of saves of
+one object runs its task once. A worker takes a job for JOBS_VISIBILITY_SECONDS; if the worker dies, the job is
+taken again after that. A task that raises is retried after JOBS_RETRY_SECONDS * 2 ** attempts, up to
+JOBS_MAX_ATTEMPTS times, and is then kept as failed for inspection.
+
+With JOBS_ALWAYS_EAGER the tasks run right away in the calling process instead, which is handy for development and
+tests where no worker is running.
+'''
+import json
+import time
+import logging
+import sqlite3
+import threading
+import traceback
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+_local = threading.local()
+
+schema = (
+    """CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        args TEXT NOT NULL,
+        dedupe_key TEXT,
+        state TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        run_at REAL NOT NULL,
+        locked_until REAL,
+        last_error TEXT,
+        created REAL NOT NULL)""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key) WHERE state = 'queued'",
+    "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, run_at)",
+)
+
+def task(func):
+    '''
+    Register a function as a task under its dotted path.
+    '''
+    func.task_name = "{}.{}".format(func.__module__, func.__name__)
+    registry[func.task_name] = func
+    return func
+
+def lookup(name):
+    '''
+    Get a task by name, importing its module if it is not registered yet.
+    '''
+    if name not in registry:
+        import_module(name.rsplit('.', 1)[0])
+    return registry[name]
+
+def connect():
+    '''
+    Get this thread's connection to the queue, creating the tables on first use.
+    '''
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(settings.JOBS_DB, timeout = 30, isolation_level = None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        for statement in schema:
+            conn.execute(statement)
+        _local.conn = conn
+    return conn
+
+def _run(name, args, kwargs):
+    try:
+        lookup(name)(*args, **kwargs)
+    except Exception:
+        logger.exception("Task %s failed.", name)
+
+def _enqueue(name, args, kwargs, dedupe_key, delay, max_attempts):
+    now = time.time()
+    connect().execute("INSERT OR IGNORE INTO jobs (name, args, dedupe_key, max_attempts, run_at, created) "
+                      "VALUES (?, ?, ?, ?, ?, ?)",
+                      (name, json.dumps([args, kwargs]), dedupe_key, max_attempts, now + delay, now))
+
+def defer(func, *args, dedupe_key = None, delay = 0, max_attempts = None, **kwargs):
+    '''
+    Queue a task to run in the worker once the current transaction commits. Without transaction.on_commit
+    (Django < 1.9) it is queued right away, and inside an atomic block delayed by JOBS_UNCOMMITTED_DELAY more.
+
+    @param func: the task, or its name
+    @param dedupe_key: if given, the job is dropped while another with the same key is waiting
+    @param delay: the least seconds to wait before running it
+    @param max_attempts: the most times to try it, defaulting to JOBS_MAX_ATTEMPTS
+    '''
+    name = func if isinstance(func, str) else func.task_name
+    on_commit = getattr(transaction, 'on_commit', None)
+    if on_commit is None and transaction.get_connection().in_atomic_block:
+        delay += getattr(settings, 'JOBS_UNCOMMITTED_DELAY', 5) #most transactions are done by then
+    if getattr(settings, 'JOBS_ALWAYS_EAGER', False):
+        work = lambda: _run(name, args, kwargs)
+    else:
+        max_attempts = max_attempts or getattr(settings, 'JOBS_MAX_ATTEMPTS', 5)
+        work = lambda: _enqueue(name, list(args), kwargs, dedupe_key, delay, max_attempts)
+    if on_commit is None:
+        work()
+    else:
+        on_commit(work)
+
+def claim():
+    '''
+    Take the next job that is due, or a job whose worker let its visibility timeout lapse. A job that has timed
+    out max_attempts times (such as one that keeps killing its worker) is marked failed instead of being taken.
+
+    @return (id, name, args, kwargs, attempts) or None if there is nothing to do
+    '''
+    conn = connect()
+    while True:
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id, name, args, attempts, max_attempts, state FROM jobs WHERE "
+                               "(state = 'queued' AND run_at <= ?) OR (state = 'running' AND locked_until < ?) "
+                               "ORDER BY run_at LIMIT 1", (now, now)).fetchone()
+            if row is not None and row[5] == 'running' and row[3] >= row[4]:
+                conn.execute("UPDATE jobs SET state = 'failed', locked_until = NULL, last_error = ? WHERE id = ?",
+                             ("Timed out on all {} attempts.".format(row[3]), row[0]))
+            elif row is not None:
+                conn.execute("UPDATE jobs SET state = 'running', attempts = attempts + 1, locked_until = ? "
+                             "WHERE id = ?", (now + getattr(settings, 'JOBS_VISIBILITY_SECONDS', 300), row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        if row[5] == 'running' and row[3] >= row[4]:
+            logger.error("Task %s timed out on all %s attempts.", row[1], row[3])
+            continue
+        args, kwargs = json.loads(row[2])
+        return row[0], row[1], args, kwargs, row[3] + 1
+
+def _failed(pk, name, attempts, error):
+    '''
+    Queue a failed job to be tried again after a backoff, or mark it failed for good. If a job with the same
+    dedupe_key was queued while this one ran, that one does the work and this one is dropped.
+    '''
+    conn = connect()
+    row = conn.execute("SELECT max_attempts FROM jobs WHERE id = ?", (pk,)).fetchone()
+    if row is not None and attempts < row[0]:
+        delay = getattr(settings, 'JOBS_RETRY_SECONDS', 10) * 2 ** (attempts - 1)
+        try:
+            conn.execute("UPDATE jobs SET state = 'queued', run_at = ?, locked_until = NULL, last_error = ? "
+                         "WHERE id = ?", (time.time() + delay, error, pk))
+        except sqlite3.IntegrityError:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (pk,))
+            logger.warning("Task %s failed on attempt %s; a newer job with its dedupe_key will run instead.\n%s",
+                           name, attempts, error)
+        else:
+            logger.warning("Task %s failed on attempt %s; retrying in %ss.\n%s", name, attempts, delay, error)
+    else:
+        conn.execute("UPDATE jobs SET state = 'failed', locked_until = NULL, last_error = ? WHERE id = ?",
+                     (error, pk))
+        logger.error("Task %s failed for good after %s attempts.\n%s", name, attempts, error)
+
+def run_one():
+    '''
+    Claim and run a single job. Errors of the task, and of recording its outcome, are logged rather than raised,
+    so they never stop the worker; a job whose outcome could not be recorded is taken again after its visibility
+    timeout.
+
+    @return the name of the task that ran, or None if there was nothing to do
+    '''
+    job = claim()
+    if job is None:
+        return None
+    pk, name, args, kwargs, attempts = job
+    try:
+        lookup(name)(*args, **kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        try:
+            _failed(pk, name, attempts, error)
+        except Exception:
+            logger.exception("Could not record the failure of task %s.\n%s", name, error)
+        return name
+    try:
+        connect().execute("DELETE FROM jobs WHERE id = ?", (pk,))
+    except Exception:
+        logger.exception("Could not remove the finished job %s of task %s.", pk, name)
+    return name
+
+def counts():
+    '''
+    Get the number of jobs in each state.
+    '''
+    return dict(connect().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
@@ -0,0 +1,147 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+Logging that never touches the disk on the request thread. QueuedRotatingFileHandler takes the same arguments as
+logging.handlers.RotatingFileHandler, so it can be swapped in through the LOGGING setting, but all it does on the
+request thread is format the record and put the line on a queue. A single writer thread per process takes the lines
+off the queue in batches, writes each file once per batch, and does the size-based rotation.
+
+The queue is bounded by LOG_QUEUE_SIZE. If the disk cannot keep up and the queue fills, new records are dropped
+rather than making the request wait, and the writer logs how many were dropped once it catches up. LOG_BATCH_SIZE
+is the most lines written per batch.
+'''
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    '''
+    A RotatingFileHandler that writes a batch of already formatted lines with a single flush. Only used from the
+    writer thread.
+    '''
+
+    def write_batch(self, lines):
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            pos = self.stream.tell()
+            for line in lines:
+                if self.maxBytes > 0 and pos + len(line) >= self.maxBytes and pos > 0:
+                    self.stream.flush()
+                    self.doRollover()
+                    if self.stream is None: #doRollover leaves it closed when delay is set
+                        self.stream = self._open()
+                    pos = self.stream.tell()
+                self.stream.write(line)
+                pos += len(line)
+            self.stream.flush()
+        finally:
+            self.release()
+
+class _Writer(object):
+    '''
+    The per-process queue and writer thread. Both are created on first use and again after a fork, since a forked
+    WSGI worker does not get the parent's thread.
+    '''
+
+    def __init__(self):
+        self.pid = None
+        self.queue = None
+        self.thread = None
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize = getattr(settings, 'LOG_QUEUE_SIZE', 10000))
+            self.dropped = 0
+            self.thread = threading.Thread(target = self._run, name = 'log-writer', daemon = True)
+            self.thread.start()
+            self.pid = os.getpid()
+
+    def put(self, target, line):
+        if self.pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait((target, line))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        batch_size = getattr(settings, 'LOG_BATCH_SIZE', 256)
+        reported = 0
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            try:
+                while len(batch) < batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            stop = None in batch
+            by_target = {}
+            for entry in batch:
+                if entry is not None:
+                    by_target.setdefault(entry[0], []).append(entry[1])
+            if self.dropped != reported and by_target:
+                target, lines = next(iter(by_target.items()))
+                lines.append("[WARNING] [{}] [logqueue]: dropped {} log records because the log queue was full\n".format(
+                    time.strftime('%Y-%m-%d %H:%M:%S'), self.dropped - reported))
+                reported = self.dropped
+            for target, lines in by_target.items():
+                try:
+                    target.write_batch(lines)
+                except Exception:
+                    pass #there is nowhere left to report a failing log file
+            if stop:
+                return
+
+    def stop(self, timeout = 5):
+        '''
+        Write out what is left on the queue. Called at exit.
+        '''
+        if self.pid == os.getpid() and self.thread.is_alive():
+            try:
+                self.queue.put(None, timeout = timeout)
+            except queue.Full:
+                return
+            self.thread.join(timeout)
+
+_writer = _Writer()
+atexit.register(_writer.stop)
+
+class QueuedRotatingFileHandler(logging.Handler):
+    '''
+    A drop-in replacement for RotatingFileHandler that hands the writing and rotation to the writer thread.
+    '''
+
+    def __init__(self, filename, mode = 'a', maxBytes = 0, backupCount = 0, encoding = None, delay = True):
+        logging.Handler.__init__(self)
+        self.target = BatchRotatingFileHandler(filename, mode, maxBytes, backupCount, encoding, delay = True)
+
+    def emit(self, record):
+        try:
+            _writer.put(self.target, self.format(record) + self.target.terminator)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.target.close()
+        logging.Handler.close(self)
+
+def dropped():
+    '''
+    Get the number of records this process dropped because the queue was full.
+    '''
+    return _writer.dropped if _writer.pid == os.getpid() else 0
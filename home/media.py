@@ -0,0 +1,120 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+Serving of the files under MEDIA_ROOT without copying them through Python. Whole files are sent as a FileResponse,
+which Django hands to the server's wsgi.file_wrapper so servers that support it send the file with sendfile. When
+the server has no file_wrapper, and for byte ranges, the file is memory mapped and sent in slices of the mapping
+straight from the page cache instead of through read calls into Python buffers.
+
+If a front end server can send the files itself, set MEDIA_SENDFILE to hand them off:
+
+    'x-accel-redirect': nginx; MEDIA_ACCEL_PREFIX is the internal location that maps to MEDIA_ROOT
+    'x-sendfile': Apache mod_xsendfile and lighttpd; the full path of the file is sent
+'''
+import os
+import re
+import mmap
+import stat
+import mimetypes
+
+from django.conf import settings
+from django.http import Http404
+from django.http.response import (HttpResponse, HttpResponseNotModified, FileResponse, StreamingHttpResponse)
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+CHUNK = 256*1024
+
+range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def _resolve(path):
+    '''
+    Get the full path of a media file, making sure it is inside MEDIA_ROOT.
+    '''
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    full = os.path.abspath(os.path.join(root, path))
+    if not full.startswith(root + os.sep):
+        raise Http404("{} is not a media file.".format(path))
+    return full
+
+def _byte_range(header, size):
+    '''
+    Parse a single byte range from a Range header. Multiple ranges are not supported, so those (and anything that
+    does not parse) return None and the whole file is sent, which the spec allows.
+
+    @return (start, end) inclusive, None for the whole file, or False if the range cannot be satisfied
+    '''
+    match = range_re.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start: #the last n bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+def _mapped(full, start, end):
+    '''
+    Stream bytes start to end (inclusive) of the file through a memory mapping.
+    '''
+    with open(full, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        try:
+            for offset in range(start, end + 1, CHUNK):
+                yield mm[offset:min(offset + CHUNK, end + 1)]
+        finally:
+            mm.close()
+
+def serve(request, path):
+    '''
+    Serve a file from MEDIA_ROOT, honoring If-Modified-Since and single byte Range requests.
+    '''
+    full = _resolve(path)
+    try:
+        st = os.stat(full)
+    except OSError:
+        raise Http404("{} does not exist.".format(path))
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404("{} is not a file.".format(path))
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), st.st_mtime, st.st_size):
+        return HttpResponseNotModified()
+    content_type = mimetypes.guess_type(full)[0] or 'application/octet-stream'
+
+    handoff = getattr(settings, 'MEDIA_SENDFILE', None)
+    if handoff:
+        resp = HttpResponse(content_type = content_type)
+        if handoff == 'x-accel-redirect':
+            resp['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + os.path.relpath(
+                full, os.path.abspath(settings.MEDIA_ROOT)).replace(os.sep, '/')
+        else:
+            resp['X-Sendfile'] = full
+    else:
+        byte_range = _byte_range(request.META.get('HTTP_RANGE', ''), st.st_size) if st.st_size else None
+        if byte_range is False:
+            resp = HttpResponse(status = 416)
+            resp['Content-Range'] = 'bytes */{}'.format(st.st_size)
+            return resp
+        if byte_range is not None:
+            start, end = byte_range
+            resp = StreamingHttpResponse(_mapped(full, start, end), status = 206, content_type = content_type)
+            resp['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, st.st_size)
+            resp['Content-Length'] = end - start + 1
+        elif 'wsgi.file_wrapper' in request.META or not st.st_size:
+            resp = FileResponse(open(full, 'rb'), content_type = content_type)
+            resp['Content-Length'] = st.st_size
+        else:
+            resp = StreamingHttpResponse(_mapped(full, 0, st.st_size - 1), content_type = content_type)
+            resp['Content-Length'] = st.st_size
+    resp['Accept-Ranges'] = 'bytes'
+    resp['Last-Modified'] = http_date(st.st_mtime)
+    return resp
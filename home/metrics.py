@@ -0,0 +1,256 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+Per-route request metrics without an external APM. Routes.add tags every request with the unformatted route it
+matched, and MetricsMiddleware records the latency and response size of each request into fixed-bucket histograms
+labeled by route, method and status.
+
+Every process keeps its own histograms in memory and a background thread writes them to METRICS_DIR every
+METRICS_FLUSH_SECONDS, so the metrics view can merge all of the workers on the box. The view (mounted at
+METRICS_URL) sends the Prometheus text exposition format, or json with
+estimated p50/p99 per route when passed format=json.
+
+Behind a proxy on the same box every request comes from 127.0.0.1, so the view is only open to METRICS_ALLOWED_IPS
+for requests that carry no X-Forwarded-For or X-Real-IP header, that is the ones that did not come through a proxy.
+If METRICS_TOKEN is set the view instead needs "Authorization: Bearer <METRICS_TOKEN>", wherever it is called from.
+'''
+import os
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from django.http.response import HttpResponse, HttpResponseForbidden
+
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+size_buckets = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, float('inf'))
+
+class Registry(object):
+    '''
+    The histograms of a single process. Each series is keyed by (route, method, status) and holds the bucket counts,
+    sum and count of both latency and size.
+    '''
+
+    def __init__(self):
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, seconds, size):
+        key = (route, method, str(status))
+        with self._lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = {"latency" : [[0] * len(latency_buckets), 0.0, 0],
+                                        "size" : [[0] * len(size_buckets), 0.0, 0]}
+            for name, buckets, value in (("latency", latency_buckets, seconds), ("size", size_buckets, size)):
+                h = s[name]
+                for i, bound in enumerate(buckets):
+                    if value <= bound:
+                        h[0][i] += 1
+                        break
+                h[1] += value
+                h[2] += 1
+
+    def dump(self):
+        '''
+        Get a json-able copy of the series.
+        '''
+        with self._lock:
+            return [[list(k), copy.deepcopy(v)] for k, v in self.series.items()]
+
+_registry = Registry()
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+def _counters():
+    '''
+    The other per-process counters worth exporting.
+    '''
+    from .routecache import route_cache
+    from . import logqueue
+    from .dbpool.base import stats as pool_stats
+    counters = {"home_route_cache_{}_total".format(k) : v for k, v in route_cache.stats().items()
+                if k not in ("entries", "bytes")}
+    counters["home_route_cache_bytes"] = route_cache.size
+    counters["home_log_records_dropped_total"] = logqueue.dropped()
+    from .pubsub import bus
+    pubsub_stats = bus.stats()
+    counters["home_pubsub_subscribers"] = pubsub_stats["subscribers"]
+    counters["home_pubsub_evictions_total"] = pubsub_stats["evictions"]
+    counters["home_pubsub_published_total"] = pubsub_stats["published"]
+    for alias, stats in pool_stats().items():
+        for k, v in stats.items():
+            name = "home_db_pool_" + k if k in ("size", "idle", "in_use") else "home_db_pool_{}_total".format(k)
+            counters['{}{{alias="{}"}}'.format(name, _escape(alias))] = v
+    return counters
+
+def _snapshot():
+    return {"series" : _registry.dump(), "counters" : _counters()}
+
+def _flush_forever():
+    directory = settings.METRICS_DIR
+    path = os.path.join(directory, "{}.json".format(os.getpid()))
+    while True:
+        time.sleep(getattr(settings, "METRICS_FLUSH_SECONDS", 5))
+        try:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(path + ".tmp", "w") as f:
+                json.dump(_snapshot(), f)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+def _ensure_flusher():
+    global _flusher_pid
+    if _flusher_pid != os.getpid() and getattr(settings, "METRICS_DIR", None):
+        with _flusher_lock:
+            if _flusher_pid != os.getpid():
+                threading.Thread(target = _flush_forever, name = "metrics-flusher", daemon = True).start()
+                _flusher_pid = os.getpid()
+
+class MetricsMiddleware(object):
+    '''
+    Record the latency, status and size of every request under the route it matched. Put this first in the
+    middleware so the latency covers the rest of the middleware as well.
+    '''
+
+    def process_request(self, request):
+        request._metrics_start = time.perf_counter()
+        _ensure_flusher()
+
+    def process_response(self, request, response):
+        start = getattr(request, '_metrics_start', None)
+        if start is None:
+            return response
+        if response.streaming:
+            size = int(response.get('Content-Length', 0))
+        else:
+            size = len(response.content)
+        _registry.observe(getattr(request, 'route_pattern', 'unmatched'), request.method, response.status_code,
+                          time.perf_counter() - start, size)
+        return response
+
+def _merged():
+    '''
+    Merge the live metrics of this process with the ones the other processes wrote to METRICS_DIR. Files that have
+    not been written to in METRICS_STALE_SECONDS belong to workers that are gone and are removed.
+    '''
+    snapshots = [_snapshot()]
+    directory = getattr(settings, "METRICS_DIR", None)
+    if directory and os.path.isdir(directory):
+        stale = time.time() - getattr(settings, "METRICS_STALE_SECONDS", 300)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.endswith(".json") or name == "{}.json".format(os.getpid()):
+                continue
+            try:
+                if os.stat(path).st_mtime < stale:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    series = OrderedDict()
+    counters = OrderedDict()
+    for snap in snapshots:
+        for key, s in snap["series"]:
+            merged = series.setdefault(tuple(key), {"latency" : [[0] * len(latency_buckets), 0.0, 0],
+                                                    "size" : [[0] * len(size_buckets), 0.0, 0]})
+            for name in ("latency", "size"):
+                merged[name][0] = [a + b for a, b in zip(merged[name][0], s[name][0])]
+                merged[name][1] += s[name][1]
+                merged[name][2] += s[name][2]
+        for name, v in snap["counters"].items():
+            counters[name] = counters.get(name, 0) + v
+    return series, counters
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _bound(b):
+    return "+Inf" if b == float('inf') else repr(b)
+
+def exposition(series, counters):
+    '''
+    Format merged metrics in the Prometheus text exposition format.
+    '''
+    lines = []
+    for name, metric, buckets, help_text in (
+            ("home_request_duration_seconds", "latency", latency_buckets, "Request latency by route."),
+            ("home_response_size_bytes", "size", size_buckets, "Response size by route.")):
+        lines.append("# HELP {} {}".format(name, help_text))
+        lines.append("# TYPE {} histogram".format(name))
+        for (route, method, status), s in sorted(series.items()):
+            labels = 'route="{}",method="{}",status="{}"'.format(_escape(route), method, status)
+            counts, total, count = s[metric]
+            cumulative = 0
+            for bound, c in zip(buckets, counts):
+                cumulative += c
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, _bound(bound), cumulative))
+            lines.append('{}_sum{{{}}} {}'.format(name, labels, total))
+            lines.append('{}_count{{{}}} {}'.format(name, labels, count))
+    typed = set()
+    for name, v in sorted(counters.items()):
+        bare = name.split('{')[0]
+        if bare not in typed:
+            typed.add(bare)
+            lines.append("# TYPE {} {}".format(bare, "counter" if bare.endswith("_total") else "gauge"))
+        lines.append("{} {}".format(name, v))
+    return "\n".join(lines) + "\n"
+
+def quantile(q, counts, buckets):
+    '''
+    Estimate a quantile from bucket counts by interpolating within the bucket it falls in, the same way
+    Prometheus' histogram_quantile does.
+    '''
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    cumulative = 0
+    for i, c in enumerate(counts):
+        if cumulative + c >= rank:
+            lower = buckets[i - 1] if i else 0.0
+            upper = buckets[i]
+            if upper == float('inf'):
+                return lower
+            return lower + (upper - lower) * ((rank - cumulative) / float(c))
+        cumulative += c
+    return buckets[-2]
+
+def allowed(request):
+    '''
+    Whether the request may read the metrics: it has the METRICS_TOKEN if one is set, and otherwise comes straight
+    from one of METRICS_ALLOWED_IPS rather than through a proxy.
+    '''
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        return constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), "Bearer " + token)
+    if 'HTTP_X_FORWARDED_FOR' in request.META or 'HTTP_X_REAL_IP' in request.META:
+        return False
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1',))
+
+def view(request):
+    '''
+    The internal metrics endpoint.
+    '''
+    if not allowed(request):
+        return HttpResponseForbidden()
+    series, counters = _merged()
+    if request.GET.get('format') == 'json':
+        routes = []
+        for (route, method, status), s in sorted(series.items()):
+            counts = s["latency"][0]
+            routes.append({"route" : route, "method" : method, "status" : status, "count" : s["latency"][2],
+                           "p50" : quantile(0.5, counts, latency_buckets),
+                           "p99" : quantile(0.99, counts, latency_buckets),
+                           "bytes" : s["size"][1]})
+        return HttpResponse(json.dumps({"routes" : routes, "counters" : counters}), content_type = "application/json")
+    return HttpResponse(exposition(series, counters), content_type = "text/plain; version=0.0.4")
@@ -0,0 +1,22 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+'''
+from django.middleware.gzip import GZipMiddleware as DjangoGZipMiddleware
+
+from .assets import compressed_types
+
+class GZipMiddleware(DjangoGZipMiddleware):
+    '''
+    GZip only the responses that are worth compressing on the fly. Streaming responses (such as files and
+    precompressed assets), responses that already have a Content-Encoding and content types that are already
+    compressed are passed through untouched.
+    '''
+    
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if compressed_types.match(response.get('Content-Type', '')):
+            return response
+        return super(GZipMiddleware, self).process_response(request, response)
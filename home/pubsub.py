@@ -0,0 +1,191 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+A publish/subscribe bus for pushing new content to clients instead of having them poll. The models publish small
+events (see the publish receivers in db/models.py) and the event stream in controllers/events.py subscribes.
+
+Every subscriber gets a queue of at most PUBSUB_BUFFER events. A subscriber that falls that far behind is evicted
+rather than letting its queue grow or blocking the publisher; its stream ends and the client reconnects.
+
+Events are fanned out to the other processes on the box over Unix datagram sockets in PUBSUB_DIR. A process binds
+<pid>.sock there when it gets its first subscriber, and a thread hands what arrives on it to the local
+subscribers. Publishing sends the event to every socket in the directory, removing the ones no process is
+listening on anymore. Processes without subscribers do not bind, so they are not sent anything.
+'''
+import os
+import json
+import queue
+import errno
+import socket
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+class Subscription(object):
+    '''
+    The queue of one subscriber. posts and labels are sets to filter on; an event matches if either is empty or it
+    is about one of the posts or labels.
+    '''
+
+    def __init__(self, posts = (), labels = (), size = 100):
+        self.posts = set(posts)
+        self.labels = set(labels)
+        self.queue = queue.Queue(maxsize = size)
+        self.evicted = False
+
+    def matches(self, event):
+        if self.posts and event.get("post") not in self.posts:
+            return False
+        if self.labels and not self.labels.intersection(event.get("labels", ())):
+            return False
+        return True
+
+    def get(self, timeout):
+        '''
+        Wait for the next event. Returns None on timeout.
+        '''
+        try:
+            return self.queue.get(timeout = timeout)
+        except queue.Empty:
+            return None
+
+class Bus(object):
+    '''
+    The subscribers of this process.
+    '''
+
+    def __init__(self):
+        self.subscribers = set()
+        self.evictions = 0
+        self.published = 0
+        self._lock = threading.Lock()
+        self._sock = None
+        self._pid = None
+
+    def _directory(self):
+        return getattr(settings, 'PUBSUB_DIR', None)
+
+    def _listen(self):
+        '''
+        Bind the socket of this process and start handing what arrives on it to the local subscribers.
+        '''
+        directory = self._directory()
+        if not directory or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        os.makedirs(directory, exist_ok = True)
+        path = os.path.join(directory, "{}.sock".format(os.getpid()))
+        if os.path.exists(path):
+            os.remove(path) #left by an earlier process with the same pid
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        self._sock = sock
+        threading.Thread(target = self._receive, args = (sock,), name = "pubsub-receiver", daemon = True).start()
+
+    def _receive(self, sock):
+        while True:
+            try:
+                data = sock.recv(65536)
+                self.deliver(json.loads(data.decode('utf-8')))
+            except Exception:
+                logger.exception("Could not receive an event.")
+
+    def subscribe(self, posts = (), labels = ()):
+        '''
+        Add a subscriber. Raises queue.Full if there are already PUBSUB_MAX_SUBSCRIBERS in this process.
+        '''
+        sub = Subscription(posts, labels, getattr(settings, 'PUBSUB_BUFFER', 100))
+        with self._lock:
+            if len(self.subscribers) >= getattr(settings, 'PUBSUB_MAX_SUBSCRIBERS', 50):
+                raise queue.Full("Too many subscribers.")
+            self._listen()
+            self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self.subscribers.discard(sub)
+
+    def deliver(self, event):
+        '''
+        Hand an event to the matching subscribers of this process, evicting the ones whose queue is full.
+        '''
+        with self._lock:
+            subs = list(self.subscribers)
+        for sub in subs:
+            if not sub.matches(event):
+                continue
+            try:
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                sub.evicted = True
+                with self._lock:
+                    self.evictions += 1
+                    self.subscribers.discard(sub)
+
+    def publish(self, event):
+        '''
+        Send an event to the subscribers of every process on the box.
+
+        @param event: a json-able dictionary, kept well under the 64KB a datagram can hold
+        '''
+        with self._lock:
+            self.published += 1
+        self.deliver(event)
+        directory = self._directory()
+        if not directory or not os.path.isdir(directory):
+            return
+        data = json.dumps(event).encode('utf-8')
+        own = "{}.sock".format(os.getpid())
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sender.setblocking(False)
+        try:
+            for name in os.listdir(directory):
+                if not name.endswith(".sock") or name == own:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    sender.sendto(data, path)
+                except OSError as e:
+                    if e.errno in (errno.ECONNREFUSED, errno.ENOENT):
+                        try:
+                            os.remove(path) #nobody is listening on it anymore
+                        except OSError:
+                            pass
+                    #a full socket buffer (EAGAIN) means that process is behind; drop it like a full queue would
+        finally:
+            sender.close()
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers" : len(self.subscribers), "evictions" : self.evictions, "published" : self.published}
+
+bus = Bus()
+
+def _publish(event):
+    try:
+        if callable(event):
+            event = event()
+        for e in (event if isinstance(event, list) else [event]):
+            bus.publish(e)
+    except Exception:
+        logger.exception("Could not publish %s.", event) #pushing is best effort; never fail the write over it
+
+def publish(event):
+    '''
+    Publish an event once the current transaction commits, where Django supports that.
+
+    @param event: the event, a list of them, or a function returning either for events that should be built from
+                  what was committed
+    '''
+    on_commit = getattr(transaction, 'on_commit', None)
+    if on_commit is None:
+        _publish(event)
+    else:
+        on_commit(lambda: _publish(event))
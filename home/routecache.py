@@ -0,0 +1,238 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+A response cache enforced at the routing layer. Routes opt in by declaring a CachePolicy, either passed to
+Routes.add/add_list as cache=<policy> or set as the cache_policy variable on a view next to routes and prefix.
+Routes without a policy are never cached.
+
+All cached routes share one in-process cache that is bounded to ROUTE_CACHE_MAX_BYTES of response content and
+evicts the least recently used responses first. Any successful write (POST, PUT, DELETE...) through a cached route
+drops the cached responses of that route, and a policy can name the models whose saves and deletes (from anywhere in
+the process) drop them too.
+'''
+import time
+import threading
+from collections import OrderedDict
+from functools import wraps
+from importlib import import_module
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.http import HttpRequest
+from django.http.response import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+class CachePolicy(object):
+    '''
+    How the responses of a route may be cached.
+
+    @param ttl: the seconds a response is fresh
+    @param vary_accept: if True, responses are cached per Accept header and sent with Vary: Accept
+    @param cache_authenticated: if False, requests from logged in Posters always go to the view; if True, they are
+                                cached separately for each Poster
+    @param stale_while_revalidate: the seconds after ttl that a stale response is still sent while it is refreshed
+                                   in the background
+    @param invalidated_by: the app_label.model_name of the models (m2m through models included) whose saves and
+                           deletes drop the cached responses of the route
+    '''
+
+    def __init__(self, ttl = 60, vary_accept = True, cache_authenticated = False, stale_while_revalidate = 0,
+                 invalidated_by = ()):
+        self.ttl = ttl
+        self.vary_accept = vary_accept
+        self.cache_authenticated = cache_authenticated
+        self.stale_while_revalidate = stale_while_revalidate
+        self.invalidated_by = tuple(invalidated_by)
+
+def _user_id(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated():
+        return user.pk
+    return None
+
+def _fresh_request(request, user_id):
+    '''
+    A copy of what a cached GET depends on (path, query, Accept and user), for refreshing it after the original
+    request has finished and its session, user and body may be closed.
+    '''
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import AnonymousUser
+    fresh = HttpRequest()
+    fresh.method = 'GET'
+    fresh.path = request.path
+    fresh.path_info = getattr(request, 'path_info', request.path)
+    fresh.GET = request.GET.copy()
+    fresh.META = {k : v for k, v in request.META.items()
+                  if k in ('QUERY_STRING', 'HTTP_ACCEPT', 'HTTP_HOST', 'SERVER_NAME', 'SERVER_PORT', 'wsgi.url_scheme')}
+    fresh.session = import_module(settings.SESSION_ENGINE).SessionStore() #empty and never saved
+    fresh.user = AnonymousUser() if user_id is None else get_user_model().objects.get(pk = user_id)
+    return fresh
+
+class _Entry(object):
+    __slots__ = ('route', 'fresh_until', 'stale_until', 'status', 'content', 'headers')
+
+    def __init__(self, route, policy, response):
+        now = time.time()
+        self.route = route
+        self.fresh_until = now + policy.ttl
+        self.stale_until = self.fresh_until + policy.stale_while_revalidate
+        self.status = response.status_code
+        self.content = response.content
+        self.headers = list(response.items())
+
+    def response(self):
+        resp = HttpResponse(self.content, status = self.status)
+        for k, v in self.headers:
+            resp[k] = v
+        return resp
+
+class RouteCache(object):
+    '''
+    The cache shared by all of the cached routes, with hit/miss counters.
+    '''
+
+    def __init__(self, max_bytes = 16*1024*1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self._entries = OrderedDict()
+        self._revalidating = set()
+        self._dependents = {} #app_label.model_name -> the routes its writes invalidate
+        self._lock = threading.Lock()
+
+    def stats(self):
+        '''
+        Get the counters and current size of the cache as a dictionary.
+        '''
+        with self._lock:
+            return {"hits" : self.hits, "stale_hits" : self.stale_hits, "misses" : self.misses,
+                    "bypasses" : self.bypasses, "entries" : len(self._entries), "bytes" : self.size}
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, route, policy, response):
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return
+        entry = _Entry(route, policy, response)
+        if len(entry.content) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old.content)
+            self._entries[key] = entry
+            self.size += len(entry.content)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last = False)
+                self.size -= len(evicted.content)
+
+    def invalidate(self, route):
+        '''
+        Drop all of the cached responses of a route.
+        '''
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.route == route]:
+                self.size -= len(self._entries.pop(key).content)
+
+    def invalidate_model(self, label):
+        '''
+        Drop the cached responses of every route whose policy is invalidated by the model.
+        '''
+        for route in self._dependents.get(label, ()):
+            self.invalidate(route)
+
+    def _render(self, key, route, policy, func, request, args, kwargs):
+        '''
+        Call the view and cache its response.
+        '''
+        response = func(request, *args, **kwargs)
+        if policy.vary_accept:
+            patch_vary_headers(response, ('Accept',))
+        self._store(key, route, policy, response)
+        return response
+
+    def _revalidate(self, key, route, policy, func, request, args, kwargs):
+        '''
+        Refresh a stale response in a background thread, with a fresh copy of the request. Only one refresh per key
+        is run at a time.
+        '''
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+        def refresh():
+            try:
+                self._render(key, route, policy, func, _fresh_request(request, key[-1]), args, kwargs)
+            finally:
+                connection.close() #the thread's connection is not closed by request_finished
+                with self._lock:
+                    self._revalidating.discard(key)
+        threading.Thread(target = refresh, daemon = True).start()
+
+    def wrap(self, func, policy, route):
+        '''
+        Wrap a view function so that its responses are cached according to the policy.
+
+        @param func: the view function
+        @param policy: the CachePolicy of the route
+        @param route: the unformatted route, used to invalidate the route's responses on writes
+        @return the wrapped view function
+        '''
+        for label in policy.invalidated_by:
+            self._dependents.setdefault(label, set()).add(route)
+        @wraps(func)
+        def cached(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                response = func(request, *args, **kwargs)
+                if response.status_code < 400:
+                    self.invalidate(route)
+                return response
+            user_id = _user_id(request)
+            if user_id is not None and not policy.cache_authenticated:
+                self._count('bypasses')
+                return func(request, *args, **kwargs)
+            key = (route, request.path, request.META.get('QUERY_STRING', ''),
+                   request.META.get('HTTP_ACCEPT', '') if policy.vary_accept else '', user_id)
+            entry = self._get(key)
+            now = time.time()
+            if entry is not None and now < entry.fresh_until:
+                self._count('hits')
+                return entry.response()
+            if entry is not None and now < entry.stale_until:
+                self._count('stale_hits')
+                self._revalidate(key, route, policy, func, request, args, kwargs)
+                return entry.response()
+            self._count('misses')
+            return self._render(key, route, policy, func, request, args, kwargs)
+        return cached
+
+route_cache = RouteCache(getattr(settings, 'ROUTE_CACHE_MAX_BYTES', 16*1024*1024))
+
+def _label(model):
+    return "{}.{}".format(model._meta.app_label, model._meta.model_name)
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_saved(sender, **kwargs):
+    route_cache.invalidate_model(_label(sender))
+
+@receiver(m2m_changed)
+def invalidate_related(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        route_cache.invalidate_model(_label(sender))
@@ -11,6 +11,8 @@ import sys
 import inspect
 from django.views.generic.base import View
 import pkgutil
+from functools import wraps
+from .routecache import route_cache
 
 def check_if_list(lst):
     if isinstance(lst, str):
@@ -22,6 +24,17 @@ def check_if_list(lst):
     if not (hasattr(lst, "__getitem__") or hasattr(lst, "__iter__")):
         raise TypeError("Must be an iterable: {}".format(lst))
     
+def tag_route(func, route):
+    '''
+    Wrap the view function so that the request records the unformatted route it matched as request.route_pattern,
+    which is used to group the metrics of the route.
+    '''
+    @wraps(func)
+    def tagged(request, *args, **kwargs):
+        request.route_pattern = route
+        return func(request, *args, **kwargs)
+    return tagged
+    
 common_regex = {
                 'name' : "[\w|\d|\+|\.]*",
                 'url_encoded_name' : "[\w|\d|\+|\.|%|\s|\-|_|=|,|;|(|)|:]*",
@@ -86,11 +99,11 @@ class Routes(object):
         @param with_app: set to true if you want the app name to be included in the route
         '''
         view_inst = View()
-        def add_func(app, mod, funcName, func):
+        def add_func(app, mod, funcName, func, cache = None):
             r = "{}/{}/((?:[^/]/*)*)".format(mod.lower(),funcName.lower())
             if with_app:
                 r = "{}/{}".format(app.lower(), r)
-            self.add(r.replace('//', '/'), func, add_ending=False)
+            self.add(r.replace('//', '/'), func, add_ending=False, cache=cache)
         
         def load_views(mod, mod_name, parent_mod_name = ""):
             if parent_mod_name:
@@ -102,7 +115,7 @@ class Routes(object):
                     inst = klass[1]()
                     if isinstance(inst, View) and type(inst) != type(view_inst): #we do not want to add the View class
                         if not hasattr(inst, 'register_route') or (hasattr(inst, 'register_route') and inst.register_route):
-                            add_func(app, name_mod, klass[0], klass[1].as_view())
+                            add_func(app, name_mod, klass[0], klass[1].as_view(), getattr(klass[1], 'cache_policy', None))
                         if hasattr(inst, 'routes'):
                             self.add_view(klass[1])
                 except TypeError as e: #not a View class if init requires input.
@@ -111,7 +124,7 @@ class Routes(object):
                     pass
             if mod_name == "views" and (hasattr(settings, 'REGISTER_VIEWS_PY_FUNCS') and settings.REGISTER_VIEWS_PY_FUNCS):
                 for func in inspect.getmembers(mod, inspect.isfunction):
-                    add_func(app, name_mod, func[0], func[1])
+                    add_func(app, name_mod, func[0], func[1], getattr(func[1], 'cache_policy', None))
         
         def load_module(mod, pkg, path = ""):
             '''
@@ -139,7 +152,7 @@ class Routes(object):
                         mod = il.import_module('.' + mname, loaded_app.__package__)
                         load_views(mod, mname)
    
-    def add(self, route, func, var_mappings= None, add_ending=True, **kwargs):
+    def add(self, route, func, var_mappings= None, add_ending=True, cache=None, **kwargs):
         '''
         Add the name of the route, the value of the route as a unformatted string where the route looks like the following:
         
@@ -153,13 +166,20 @@ class Routes(object):
         
         To pass in a reverse url name lookup, you can use the key word 'django_url_name' in the kwargs dictionary.
         
+        To cache the responses of the route, pass in a home.routecache.CachePolicy as cache. Routes without a policy
+        are never cached.
+        
         @route the unformatted string for the route
         @func the view function to be called
         @var_mappings the list of dictionaries used to fill in the var mappings
         @add_ending adds the appropriate /$ is on the ending if True. Defaults to True
+        @cache the CachePolicy of the route, or None to not cache it
         @kwargs the kwargs to be passed into the urls function
         '''
         self._check_if_format_exists(route)
+        if cache is not None:
+            func = route_cache.wrap(func, cache, route)
+        func = tag_route(func, route)
         
         def add_url(pattern, pmap, ending, opts):
             url_route = '^{}{}'.format(pattern.format(*pmap), '/$' if ending else '')
@@ -188,9 +208,12 @@ class Routes(object):
         {
          "pattern" : <pattern>', 
          "map" :[('<regex_pattern>',), ...],
-         "kwargs" : dict
+         "kwargs" : dict,
+         "cache" : <CachePolicy>
         }
         
+        The cache is optional and overrides any cache passed in for the whole list.
+        
         @routes the list of routes
         @func the function to be called
         @prefix the prefix to attach to the route pattern
@@ -203,6 +226,8 @@ class Routes(object):
                     raise TypeError("Must pass in a dictionary for kwargs.")
                 for k, v in route["kwargs"].items():
                     route_kwargs[k] = v
+            if 'cache' in route:
+                route_kwargs['cache'] = route['cache']
             self.add(route["pattern"] if prefix is None else '{}/{}'.format(prefix, route["pattern"]),
                       func, var_mappings = route.get("map", []), **route_kwargs)
     
@@ -250,6 +275,9 @@ class Routes(object):
         
         If you want to remove the add_ending option, then set add_ending variable to False on the view.
         
+        If the responses of the view should be cached, then set the cache_policy variable to a
+        home.routecache.CachePolicy on the view.
+        
         @view the view to add
         '''
         if not hasattr(view, 'routes'):
@@ -260,6 +288,8 @@ class Routes(object):
             prefix = None
         if hasattr(view, 'add_ending') and 'add_ending' not in kwargs:
             kwargs['add_ending'] = view.add_ending
+        if hasattr(view, 'cache_policy') and 'cache' not in kwargs:
+            kwargs['cache'] = view.cache_policy
         
         self.add_list(view.routes, view.as_view(), prefix = prefix, **kwargs)
 
@@ -0,0 +1,141 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+A session engine that keeps the database as the source of truth but takes it off the request path. Sessions are
+read through an in-process LRU and then a shared local cache (SESSION_CACHE_ALIAS) before falling back to the
+database, and are only written back when the session data actually changed.
+
+Cached entries carry the session's expiry date and are never served past it, so expiry follows SESSION_COOKIE_AGE
+(or set_expiry) exactly as the database engine does. The in-process LRU is not shared between workers, so entries
+there only live SESSION_LRU_TIMEOUT seconds; a logout in one worker is seen by the others once that runs out.
+
+To use, set SESSION_ENGINE = 'home.sessions'. The following settings tune it:
+
+    SESSION_LRU_SIZE: the most sessions kept in each process
+    SESSION_LRU_TIMEOUT: the seconds a session may be served from the process before checking the shared cache
+'''
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.contrib.sessions.models import Session
+from django.core.exceptions import SuspiciousOperation
+from django.utils import timezone
+
+KEY_PREFIX = "home.sessions"
+
+class LRU(object):
+    '''
+    A small thread-safe least recently used mapping of session key to (serve_until, expires_at, session dict).
+    '''
+
+    def __init__(self, size = 1000):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last = False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+_lru = LRU(getattr(settings, "SESSION_LRU_SIZE", 1000))
+
+class SessionStore(DBStore):
+    '''
+    Database session store with a read-through LRU and shared cache in front of it.
+    '''
+
+    def __init__(self, session_key = None):
+        super(SessionStore, self).__init__(session_key)
+        self._loaded = None
+
+    @property
+    def cache(self):
+        return caches[settings.SESSION_CACHE_ALIAS]
+
+    def _cache_key(self, session_key):
+        return "{}.{}".format(KEY_PREFIX, session_key)
+
+    def _remember(self, session_key, data, expire_date):
+        '''
+        Put the session in the shared cache and the LRU until it expires.
+        '''
+        expires_at = expire_date.timestamp()
+        ttl = int(expires_at - time.time())
+        if ttl <= 0:
+            return
+        self.cache.set(self._cache_key(session_key), (expires_at, data), ttl)
+        lru_until = min(expires_at, time.time() + getattr(settings, "SESSION_LRU_TIMEOUT", 5))
+        _lru.set(session_key, (lru_until, expires_at, copy.deepcopy(data)))
+
+    def _forget(self, session_key):
+        _lru.delete(session_key)
+        self.cache.delete(self._cache_key(session_key))
+
+    def load(self):
+        if self.session_key is None: #no cookie, nothing to look up
+            self._loaded = None
+            return {}
+        now = time.time()
+        entry = _lru.get(self.session_key)
+        if entry is not None and entry[0] > now:
+            data = entry[2]
+        else:
+            entry = self.cache.get(self._cache_key(self.session_key))
+            if entry is not None and entry[0] > now:
+                data = entry[1]
+                lru_until = min(entry[0], now + getattr(settings, "SESSION_LRU_TIMEOUT", 5))
+                _lru.set(self.session_key, (lru_until, entry[0], copy.deepcopy(data)))
+            else:
+                try:
+                    s = Session.objects.get(session_key = self.session_key, expire_date__gt = timezone.now())
+                    data = self.decode(s.session_data)
+                except (Session.DoesNotExist, SuspiciousOperation):
+                    self._session_key = None
+                    self._loaded = None
+                    return {}
+                self._remember(self.session_key, data, s.expire_date)
+        #the LRU entry is shared by every request of the process, and nested values are edited in place, so
+        #neither the entry nor the copy to compare against at save may share anything with the session handed out
+        self._loaded = copy.deepcopy(data)
+        return copy.deepcopy(data)
+
+    def save(self, must_create = False):
+        '''
+        Write the session to the database and the caches, unless it was loaded and has not changed since.
+        '''
+        data = self._get_session(no_load = must_create)
+        if not must_create and self._loaded is not None and data == self._loaded:
+            return
+        super(SessionStore, self).save(must_create = must_create)
+        self._remember(self.session_key, data, self.get_expiry_date())
+        self._loaded = copy.deepcopy(data)
+
+    def delete(self, session_key = None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._forget(session_key)
+        super(SessionStore, self).delete(session_key)
+        self._loaded = None
@@ -9,7 +9,7 @@ https://docs.djangoproject.com/en/1.7/ref/settings/
 """
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
-import os,sys
+import os,sys,tempfile
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 
 
@@ -31,6 +31,13 @@ else:
 
 SESSION_COOKIE_AGE = 60*60*24 #keep person logged in for one day right now
 
+# Sessions are read through a per-process LRU and the sessions cache before hitting the database, and only written
+# when they change. See home/sessions.py.
+SESSION_ENGINE = 'home.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_LRU_SIZE = 1000
+SESSION_LRU_TIMEOUT = 5 #seconds a worker trusts its own copy of a session
+
 # Application definition
 
 INSTALLED_APPS = (
@@ -44,13 +51,14 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
-    'django.middleware.cache.UpdateCacheMiddleware',
-    'django.middleware.gzip.GZipMiddleware',
+    'home.metrics.MetricsMiddleware',
+    'home.slowqueries.SlowQueryMiddleware',
+    'home.middleware.GZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'home.dbrouter.ReplicaMiddleware', # Keeps clients that wrote on the primary in their session.
     'django.middleware.common.CommonMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
-    'django.middleware.cache.FetchFromCacheMiddleware'
 )
 
 AUTH_USER_MODEL = 'db.Poster'
@@ -72,18 +80,36 @@ else:
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2', # Add 'postgresql_psycopg2', 'mysql', 'sqlite3' or 'oracle'.
+        'ENGINE': 'home.dbpool', # Pools the connections of the backend in POOL['ENGINE']. See home/dbpool/base.py.
         'NAME': 'home',                      # Or path to database file if using sqlite3.
         'USER': 'postgres',                      # Not used with sqlite3.
         'PASSWORD': pwd,                  # Not used with sqlite3.
         'HOST': 'localhost',                      # prod server needs this
         'PORT': '',                      # Set to empty string for default. Not used with sqlite3.
+        'CONN_MAX_AGE': 0, # Give the connection back to the pool at the end of each request.
+        'POOL': {
+            'ENGINE': 'django.db.backends.postgresql_psycopg2', # Add 'postgresql_psycopg2', 'mysql', 'sqlite3' or 'oracle'.
+            'MIN_SIZE': 2, # Connections opened on first use and kept open.
+            'MAX_SIZE': 20, # The most connections a process has open at once.
+            'TIMEOUT': 2, # Seconds to wait for a free connection before the request fails.
+            'RECYCLE': 60*17, # Seconds before a connection is closed and replaced.
+            'VALIDATE': True, # Check each connection with SELECT 1 as it is taken from the pool.
+        },
     },
     'OPTIONS' : {
         'autocommit' : True,
     }
 }
 
+# Read replicas. GET and HEAD requests read from these aliases of DATABASES; everything else uses default.
+# See home/dbrouter.py. A replica is just another entry in DATABASES, e.g.
+#     DATABASES['replica1'] = dict(DATABASES['default'], HOST = 'replica1.local')
+DATABASE_ROUTERS = ['home.dbrouter.ReplicaRouter']
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_SELECTION = 'round_robin' # Or 'least_latency'.
+DATABASE_REPLICA_STICKY_SECONDS = 5 # Clients that wrote read from the primary for this long.
+DATABASE_REPLICA_RETRY_SECONDS = 30 # How long a replica that errored is left out.
+
 # CACHES = {
 #     'default': {
 #         'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
@@ -91,13 +117,80 @@ DATABASES = {
 #     } 
 # }
 
-OPTIONS = {
-        'CULL_FREQUENCY' : 0
-    }
-
-CACHE_MIDDLEWARE_SECONDS= 0 #store for one minute as default
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sessions': { #shared by all of the workers on the box
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'home_sessions'),
+        'TIMEOUT': SESSION_COOKIE_AGE,
+    },
+}
 
-CONN_MAX_AGE = 60*17
+# Latency and size histograms per route (see home/metrics.py). Each worker writes its histograms to METRICS_DIR so
+# the metrics endpoint can merge them.
+METRICS_URL = '/_metrics/'
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'home_metrics')
+METRICS_FLUSH_SECONDS = 5
+METRICS_STALE_SECONDS = 300
+# Requests from these addresses are let in, unless they came through a proxy (they carry X-Forwarded-For or
+# X-Real-IP, which the nginx config must set). Set METRICS_TOKEN to require "Authorization: Bearer <token>" instead.
+METRICS_ALLOWED_IPS = ('127.0.0.1',)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Responses are cached per route by declaring a CachePolicy on the route (see home/routecache.py) instead of
+# caching everything in middleware. This bounds the memory used by all of the cached responses in a worker.
+ROUTE_CACHE_MAX_BYTES = 16*1024*1024
+
+# Long lists of ids are fetched this many at a time, with the chunks running on this many threads at once
+# (see mviews/idbatch.py). Keep the chunk size under SQLite's limit of 999 query parameters.
+MVIEWS_ID_CHUNK_SIZE = 500
+MVIEWS_ID_WORKERS = 4
+# Each of those threads takes a pooled connection of its own, so they are only used while the pool has this many
+# connections free besides theirs; otherwise the chunks are fetched one after the other on the request's connection.
+# Size POOL['MAX_SIZE'] as the requests served at once plus MVIEWS_ID_WORKERS.
+MVIEWS_ID_POOL_RESERVE = 2
+
+# The largest json payload the ModelAsViews will read (see mviews/context.py); larger ones get a 413.
+MVIEWS_MAX_BODY_BYTES = 5*512*1024 #2.5MB
+
+# The changes feed (see controllers/sync.py). Pages read SYNC_PAGE_SIZE changes unless asked for more, up to
+# SYNC_PAGE_MAX. Seqs missing from a page (their transaction is still open) are carried in the cursor, at most
+# SYNC_GAP_MAX of them, and sent once they commit unless that takes more than SYNC_GAP_SECONDS.
+SYNC_PAGE_SIZE = 100
+SYNC_PAGE_MAX = 500
+SYNC_GAP_SECONDS = 300
+SYNC_GAP_MAX = 100
+
+# Pushed events (see home/pubsub.py and controllers/events.py). Each stream holds a request thread, so keep
+# PUBSUB_MAX_SUBSCRIBERS well under the WSGI thread count.
+PUBSUB_DIR = os.path.join(tempfile.gettempdir(), 'home_pubsub')
+PUBSUB_BUFFER = 100 #events a stream may fall behind before it is evicted
+PUBSUB_MAX_SUBSCRIBERS = 50
+PUBSUB_KEEPALIVE_SECONDS = 15
+PUBSUB_STREAM_SECONDS = 300
+
+# Background jobs (see home/jobs.py), queued in a SQLite file and run by the run_jobs command. A job a worker has
+# held for JOBS_VISIBILITY_SECONDS is given to another worker; failed jobs are retried after JOBS_RETRY_SECONDS,
+# doubling each time, JOBS_MAX_ATTEMPTS times in all. Set JOBS_ALWAYS_EAGER to run them in the request instead,
+# such as when there is no worker running. On Django < 1.9 jobs deferred inside a transaction wait
+# JOBS_UNCOMMITTED_DELAY seconds, as there is no way to wait for the commit.
+JOBS_DB = os.path.join(BASE_DIR, 'jobs.sqlite3')
+JOBS_ALWAYS_EAGER = False
+JOBS_VISIBILITY_SECONDS = 300
+JOBS_RETRY_SECONDS = 10
+JOBS_MAX_ATTEMPTS = 5
+JOBS_UNCOMMITTED_DELAY = 5
+
+# Contact form submissions (see db/contacts.py) are spooled to per-process files in CONTACT_SPOOL_DIR and written
+# in bulk every CONTACT_FLUSH_SECONDS, or once CONTACT_FLUSH_SIZE have come in. CONTACT_SPOOL_FSYNC puts every
+# submission on disk before it is acknowledged.
+CONTACT_SPOOL_DIR = os.path.join(BASE_DIR, 'spool', 'contacts')
+CONTACT_SPOOL_FSYNC = True
+CONTACT_FLUSH_SECONDS = 5
+CONTACT_FLUSH_SIZE = 500
+CONTACT_MAX_FIELD_LENGTH = 5000
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.7/topics/i18n/
@@ -112,9 +205,37 @@ USE_L10N = False
 
 VALIDATE_PASSWORD_RULES = False
 
+# Password hashing is done in a process pool (see home/hashing.py) so logins cannot pin every request thread.
+# Set HASHING_POOL_WORKERS to 0 to hash inline.
+HASHING_POOL_WORKERS = 2
+HASHING_POOL_QUEUE = 4 #most hashes running or waiting before logins get a 503; keep it below the WSGI thread count
+HASHING_POOL_TIMEOUT = 10
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/1.7/howto/static-files/
 
+# Static files are fingerprinted and precompressed into ASSET_ROOT by the build_assets command and served from
+# ASSET_URL by home.assets.serve (see home/assets.py).
+ASSET_URL = '/static/'
+ASSET_SOURCE_DIRS = (
+    os.path.join(BASE_DIR, 'static'),
+    )
+ASSET_ROOT = os.path.join(BASE_DIR, 'assets')
+
+# Pre-rendered json of the most read objects (see home/snapshots.py). Set to None to render every request.
+SNAPSHOT_DIR = os.path.join(BASE_DIR, 'snapshots')
+SNAPSHOT_RECHECK_SECONDS = 30 # Django < 1.9 only: when to render again what was refreshed inside a transaction.
+
+# Where the export_static command writes the blog as static files (see db/staticexport.py), and its html pages
+# with --html.
+EXPORT_DIR = os.path.join(BASE_DIR, 'export')
+EXPORT_HTML_DIR = os.path.join(BASE_DIR, 'static', 'blog')
+
+# Whole tables exported by the export_table command and the controllers/export/table endpoint (see
+# mviews/export.py) are read EXPORT_CHUNK_SIZE rows at a time. The command writes into EXPORT_TABLE_DIR.
+EXPORT_TABLE_DIR = os.path.join(BASE_DIR, 'table_exports') #not under EXPORT_DIR, which the web server serves
+EXPORT_CHUNK_SIZE = 5000
+
     # Absolute filesystem path to the directory that will hold user-uploaded files.
     # Example: "/home/media/media.lawrence.com/media/"
 if 'linux' in sys.platform.lower():
@@ -145,13 +266,31 @@ else:
         #    'django.contrib.staticfiles.finders.DefaultStorageFinder',
         )
 
+# Media files are served by home.media.serve (see home/media.py). Set MEDIA_SENDFILE to 'x-accel-redirect' or
+# 'x-sendfile' to hand the files off to the front end server instead.
+MEDIA_URL = '/media/'
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected_media/'
+
 file_root = '/var/log/django/' if 'linux' in sys.platform.lower()  else os.path.join('C:\\Users', 'derigible', 'logs')
+file_root = os.environ.get('HOME_LOG_ROOT', file_root) #for running locally, such as the benchmarks
 if not os.path.exists(file_root):
     os.mkdir(file_root, 0o755)
     os.mkdir(os.path.join(file_root, 'request'), 0o755)
     os.mkdir(os.path.join(file_root, 'backend'), 0o755)
     os.mkdir(os.path.join(file_root, 'debug'), 0o755)
 
+# The file handlers only queue the formatted records; a writer thread in each process does the writes and the
+# rotation (see home/logqueue.py). Records are dropped and counted if more than LOG_QUEUE_SIZE are waiting.
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 256
+
+# Queries at or over SLOW_QUERY_MS are logged with their route, view and EXPLAIN plan (see home/slowqueries.py).
+SLOW_QUERY_MS = 200
+SLOW_QUERY_BUFFER = 200 #most recent slow queries kept in each process
+SLOW_QUERY_FINGERPRINTS = 500 #most distinct queries aggregated in each process
+SLOW_QUERY_EXPLAIN_SECONDS = 60*60 #how often the plan of the same query is captured again
+
 if 'linux' in sys.platform.lower():
     LOGGING = {
         'version': 1,
@@ -185,43 +324,51 @@ if 'linux' in sys.platform.lower():
                 },
             'file_request': {
                 'level': 'WARNING',
-                'class': 'logging.handlers.RotatingFileHandler',   
+                'class': 'home.logqueue.QueuedRotatingFileHandler',   
                 'filename': os.path.join(file_root, 'request' , 'home_request.log'),
-                'maxBytes': 1024*1024*1, # 1MB
-                'backupCount': 0,
+                'maxBytes': 1024*1024*10, # 10MB
+                'backupCount': 3,
                 'formatter': 'simple'
                 },    
             'file_backend': {
                 'level': 'DEBUG',
-                'class': 'logging.handlers.RotatingFileHandler',
+                'class': 'home.logqueue.QueuedRotatingFileHandler',
                 'filters': ['require_debug_true'],    
                 'filename': os.path.join(file_root, 'backend' , 'home_backend.log'),
-                'maxBytes': 1024*1024*6, # 6MB
-                'backupCount': 0,
+                'maxBytes': 1024*1024*20, # 20MB
+                'backupCount': 3,
                 'formatter': 'simple'
                 },    
             'file_security': {
                 'level': 'DEBUG',
-                'class': 'logging.handlers.RotatingFileHandler',   
+                'class': 'home.logqueue.QueuedRotatingFileHandler',   
                 'filename': os.path.join(file_root, 'backend' , 'home_security.log'),
-                'maxBytes': 1024*1024*6, # 6MB
-                'backupCount': 0,
+                'maxBytes': 1024*1024*20, # 20MB
+                'backupCount': 3,
                 'formatter': 'simple'
                 },    
             'file_migrations': {
                 'level': 'DEBUG',
-                'class': 'logging.handlers.RotatingFileHandler',   
+                'class': 'home.logqueue.QueuedRotatingFileHandler',   
                 'filename': os.path.join(file_root, 'backend' , 'home_migrations.log'),
-                'maxBytes': 1024*1024*1, # 1MB
-                'backupCount': 0,
+                'maxBytes': 1024*1024*10, # 10MB
+                'backupCount': 3,
+                'formatter': 'simple'
+                },    
+            'file_slow_queries': {
+                'level': 'WARNING',
+                'class': 'home.logqueue.QueuedRotatingFileHandler',
+                'filename': os.path.join(file_root, 'backend' , 'home_slow_queries.log'),
+                'maxBytes': 1024*1024*10, # 10MB
+                'backupCount': 3,
                 'formatter': 'simple'
                 },    
             'file_debug': {
                 'level': 'INFO',
-                'class': 'logging.handlers.RotatingFileHandler', 
+                'class': 'home.logqueue.QueuedRotatingFileHandler', 
                 'filename': os.path.join(file_root, 'debug' , 'home.log'),
-                'maxBytes': 1024*1024*1, # 1MB
-                'backupCount': 0,
+                'maxBytes': 1024*1024*10, # 10MB
+                'backupCount': 3,
                 'formatter': 'verbose'
                 },    
          },
@@ -251,6 +398,11 @@ if 'linux' in sys.platform.lower():
                 'level': 'DEBUG',
                 'propagate': False,
                 },
+            'home.slowqueries': {
+                'handlers': ['file_slow_queries'],
+                'level': 'WARNING',
+                'propagate': False,
+                },
             'wilkins': {
                 'handlers': ['file_debug'],
                 'level': 'INFO',
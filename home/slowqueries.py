@@ -0,0 +1,208 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+A slow query log. SlowQueryMiddleware wraps the cursors of every database connection so that each query is timed.
+Queries that take SLOW_QUERY_MS or longer are logged to the home.slowqueries logger and kept, along with the route
+and view that ran them, in a ring buffer of the last SLOW_QUERY_BUFFER slow queries.
+
+Slow queries are also aggregated by a fingerprint of their SQL with the literals taken out, so the same query with
+different filters (such as the ones _get_qs builds from query params) is counted as one offender. The EXPLAIN plan
+of a fingerprint is captured the first time it is seen and again every SLOW_QUERY_EXPLAIN_SECONDS. At most
+SLOW_QUERY_FINGERPRINTS fingerprints are kept; the one with the least total time is dropped to make room.
+
+Functions in observers are called with the alias and seconds of every query, slow or not.
+
+All of this is per process. The admin SlowQueries view lists the top offenders of the process that serves it, and
+the log has every slow query of every process.
+'''
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('home.slowqueries')
+
+_local = threading.local()
+_lock = threading.Lock()
+recent = deque(maxlen = getattr(settings, 'SLOW_QUERY_BUFFER', 200))
+offenders = {}
+observers = []
+
+_literals = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(\.\d+)?\b"), "?"),
+    (re.compile(r"%s|%\(\w+\)s"), "?"),
+    (re.compile(r"\(\s*\?(\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+)
+
+def fingerprint(sql):
+    '''
+    Normalize the SQL by replacing literals and parameters with ? and IN lists with (...).
+
+    @return the (fingerprint, normalized sql)
+    '''
+    normalized = sql
+    for pattern, repl in _literals:
+        normalized = pattern.sub(repl, normalized)
+    normalized = normalized.strip()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16], normalized
+
+def _explain(conn, sql, params):
+    '''
+    Get the plan of a SELECT through the backend's own cursor, which takes the same %s placeholders as the query
+    but is not timed, so that explaining is not itself recorded. Inside a transaction the EXPLAIN runs in a
+    savepoint, so that a failing one cannot break the transaction of the request.
+    '''
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    if conn.in_atomic_block and conn.needs_rollback:
+        return None #the transaction is already broken; nothing more can run in it
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.vendor == 'sqlite' else 'EXPLAIN '
+    sid = "slowq_{}".format(threading.get_ident()) if conn.in_atomic_block else None
+    cursor = conn.create_cursor()
+    try:
+        if sid:
+            cursor.execute(conn.ops.savepoint_create_sql(sid))
+        try:
+            cursor.execute(prefix + sql, params if params is not None else ())
+            plan = [' '.join(str(c) for c in row) for row in cursor.fetchall()]
+        except Exception as e:
+            if sid:
+                cursor.execute(conn.ops.savepoint_rollback_sql(sid))
+            return ['Could not explain: {}'.format(e)]
+        if sid:
+            cursor.execute(conn.ops.savepoint_commit_sql(sid))
+        return plan
+    except Exception as e:
+        return ['Could not explain: {}'.format(e)]
+    finally:
+        cursor.close()
+
+def _record(conn, sql, params, ms):
+    request = getattr(_local, 'request', None)
+    route = getattr(request, 'route_pattern', request.path) if request is not None else None
+    view = getattr(_local, 'view', None)
+    fp, normalized = fingerprint(sql)
+    now = time.time()
+    recent.append({"at" : now, "ms" : ms, "sql" : sql[:2000], "fingerprint" : fp, "route" : route, "view" : view,
+                   "database" : conn.alias})
+    with _lock:
+        o = offenders.get(fp)
+        if o is None:
+            if len(offenders) >= getattr(settings, 'SLOW_QUERY_FINGERPRINTS', 500):
+                del offenders[min(offenders, key = lambda k: offenders[k]["total_ms"])]
+            o = offenders[fp] = {"fingerprint" : fp, "sql" : normalized[:2000], "count" : 0, "total_ms" : 0.0,
+                                 "max_ms" : 0.0, "plan" : None, "explained_at" : 0, "routes" : {}}
+        o["count"] += 1
+        o["total_ms"] += ms
+        o["max_ms"] = max(o["max_ms"], ms)
+        o["last_view"] = view
+        o["routes"][route] = o["routes"].get(route, 0) + 1
+        explain = now - o["explained_at"] >= getattr(settings, 'SLOW_QUERY_EXPLAIN_SECONDS', 3600)
+        if explain:
+            o["explained_at"] = now
+    if explain:
+        plan = _explain(conn, sql, params)
+        o["plan"] = plan
+        logger.warning("%.1fms %s %s [%s] %s\n  plan: %s", ms, route, view, fp, sql, plan)
+    else:
+        logger.warning("%.1fms %s %s [%s] %s", ms, route, view, fp, sql)
+
+class TimedCursor(object):
+    '''
+    Wraps a Django cursor and times execute and executemany.
+    '''
+
+    def __init__(self, cursor, conn):
+        self.cursor = cursor
+        self.conn = conn
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self.cursor.__exit__(*exc)
+
+    def _timed(self, method, sql, params, many = False):
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            seconds = time.perf_counter() - start
+            for observer in observers:
+                observer(self.conn.alias, seconds)
+            ms = seconds * 1000
+            if ms >= getattr(settings, 'SLOW_QUERY_MS', 200):
+                try:
+                    _record(self.conn, sql, None if many else params, ms)
+                except Exception:
+                    logger.exception("Could not record a slow query.")
+
+    def execute(self, sql, params = None):
+        return self._timed(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._timed(self.cursor.executemany, sql, param_list, many = True)
+
+def install(conn):
+    '''
+    Wrap the cursors of a connection. Connections are per thread, so this is done for each of them.
+    '''
+    if getattr(conn, '_slow_queries', False):
+        return
+    original = conn.cursor
+    def cursor(*args, **kwargs):
+        return TimedCursor(original(*args, **kwargs), conn)
+    conn.cursor = cursor
+    conn._slow_queries = True
+
+def _on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+class SlowQueryMiddleware(object):
+    '''
+    Time the queries of every connection and remember which route and view the current request is on.
+    '''
+
+    def __init__(self):
+        connection_created.connect(_on_connection_created, dispatch_uid = 'home.slowqueries')
+
+    def process_request(self, request):
+        _local.request = request
+        _local.view = None
+        for conn in connections.all():
+            install(conn)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.view = "{}.{}".format(view_func.__module__, getattr(view_func, '__name__', repr(view_func)))
+
+    def process_response(self, request, response):
+        _local.request = None
+        _local.view = None
+        return response
+
+def top(sort = "total_ms", limit = 20):
+    '''
+    Get the worst offenders of this process.
+
+    @param sort: total_ms, max_ms or count
+    @param limit: the most offenders to return
+    '''
+    with _lock:
+        rows = [dict(o) for o in offenders.values()]
+    return sorted(rows, key = lambda o: o[sort], reverse = True)[:limit]
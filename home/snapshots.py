@@ -0,0 +1,123 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+Pre-rendered responses of single objects, kept as files under SNAPSHOT_DIR/<app_label>.<model_name>/<pk>.json. A
+model opts in by setting snapshot_params on its ModelAsView (see BaseModelAsView.render_snapshot); a GET of a single
+object with exactly those query params is then answered from the file without touching the ORM.
+
+The model's signals call refresh when anything in the rendered object changes. That removes the snapshot and has
+a background job (see home/jobs.py) render it again from the database, or leave it removed if the object is gone.
+Files are written to a temporary name and moved into place, so a reader never sees a partly written snapshot. Set
+SNAPSHOT_DIR to None to turn them off.
+
+Django before 1.9 cannot hold the job back until the transaction commits, so a refresh inside a transaction (such
+as from an m2m_changed receiver) is rendered once more SNAPSHOT_RECHECK_SECONDS later.
+'''
+import os
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+
+from home import jobs
+
+logger = logging.getLogger(__name__)
+
+def enabled():
+    return bool(getattr(settings, 'SNAPSHOT_DIR', None))
+
+def path(model, pk):
+    return os.path.join(settings.SNAPSHOT_DIR, "{}.{}".format(model._meta.app_label, model._meta.model_name),
+                        "{}.json".format(pk))
+
+def read(model, pk):
+    '''
+    Get the snapshot of an object as bytes, or None if there is none.
+    '''
+    try:
+        with open(path(model, pk), 'rb') as f:
+            return f.read()
+    except (OSError, ValueError):
+        return None
+
+def write(model, pk, data):
+    p = path(model, pk)
+    directory = os.path.dirname(p)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok = True)
+    tmp = "{}.{}.tmp".format(p, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+    os.replace(tmp, p)
+
+def remove(model, pk):
+    try:
+        os.remove(path(model, pk))
+    except OSError:
+        pass
+
+def _refresh(model, pks):
+    for pk in pks:
+        try:
+            data = model.render_snapshot(pk)
+            if data is None:
+                remove(model, pk)
+            else:
+                write(model, pk, data)
+        except Exception:
+            logger.exception("Could not refresh the snapshot of %s %s.", model.__name__, pk)
+            remove(model, pk) #better no snapshot than a stale one
+
+def fill(model, pk):
+    '''
+    Render the snapshot of an object for a request that found none, and have it kept for the next one. The file is
+    written by the background job, which reads what was committed; with JOBS_ALWAYS_EAGER it is written right away
+    instead, so the object is not rendered twice in the request.
+
+    @return the json string, or None if there is no such object
+    '''
+    data = model.render_snapshot(pk)
+    if data is None: #nothing to keep, and no job to queue for every GET of a missing object
+        return None
+    if not getattr(settings, 'JOBS_ALWAYS_EAGER', False):
+        refresh(model, (pk,))
+    else:
+        write(model, pk, data)
+    return data
+
+@jobs.task
+def render(label, pks):
+    _refresh(apps.get_model(label), pks)
+
+def refresh(model, pks):
+    '''
+    Render the snapshots of the objects again in a background job once the current transaction commits. The
+    current snapshots are removed when it commits, so the objects are rendered from the database until the job has
+    run.
+
+    @param model: the ModelAsView class of the objects
+    @param pks: an iterable of primary keys
+    '''
+    if not enabled():
+        return
+    pks = sorted(set(pks))
+    if not pks:
+        return
+    if not getattr(settings, 'JOBS_ALWAYS_EAGER', False):
+        stale = lambda: [remove(model, pk) for pk in pks]
+        on_commit = getattr(transaction, 'on_commit', None)
+        if on_commit is None: #Django < 1.9 removes right away
+            stale()
+        else:
+            on_commit(stale)
+    label = "{}.{}".format(model._meta.app_label, model._meta.model_name)
+    key = "snapshot:{}:{}".format(label, ",".join(str(pk) for pk in pks))
+    jobs.defer(render, label, pks, dedupe_key = key)
+    if getattr(transaction, 'on_commit', None) is None and transaction.get_connection().in_atomic_block:
+        #Django < 1.9 queues the job before the commit, so it may render the old rows; render again once the
+        #transaction has surely committed
+        jobs.defer(render, label, pks, dedupe_key = "{}:recheck".format(key),
+                   delay = getattr(settings, 'SNAPSHOT_RECHECK_SECONDS', 30))
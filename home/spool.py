@@ -0,0 +1,122 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+A durable local buffer of json records, for writes that can be acknowledged right away and stored in bulk later.
+Every process appends to its own <pid>.ndjson file in the spool directory, so appends never wait on each other
+across processes, and drain hands the records of every process to a callback a file at a time.
+
+An append holds an exclusive flock on the file while it writes. drain takes the same lock to rename a file aside
+before reading it, and an append that was waiting on the lock sees the file was moved and starts a new one, so a
+record is never written into a file that is being read. With fsync each record is on disk before append returns;
+without it a crash of the box (not just the process) can lose the last records.
+
+A file is removed only after the callback has returned, so records are handed over at least once: a drain that
+dies part way leaves its file to the next drain. Callbacks must be able to take the same record twice.
+'''
+import os
+import json
+import fcntl
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class Spool(object):
+    '''
+    The spool files in a directory.
+
+    @param directory: where to keep the files; it is created if it does not exist
+    @param fsync: whether to flush every record to disk before append returns
+    '''
+
+    def __init__(self, directory, fsync = True):
+        self.directory = directory
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+    def _path(self):
+        return os.path.join(self.directory, "{}.ndjson".format(os.getpid()))
+
+    def append(self, record):
+        '''
+        Add a json-able record to the file of this process.
+        '''
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        path = self._path()
+        with self._lock:
+            os.makedirs(self.directory, exist_ok = True)
+            while True:
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    try:
+                        current = os.stat(path).st_ino == os.fstat(fd).st_ino
+                    except FileNotFoundError:
+                        current = False
+                    if current: #otherwise a drain moved the file while this waited on the lock; open a new one
+                        os.write(fd, line)
+                        if self.fsync:
+                            os.fsync(fd)
+                        return
+                finally:
+                    os.close(fd)
+
+    def _claim(self):
+        '''
+        Move the files of every process aside, along with any a drain that died left behind.
+        '''
+        claimed = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".draining"):
+                claimed.append(path)
+            elif name.endswith(".ndjson"):
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                except FileNotFoundError:
+                    continue
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    target = "{}.{}.draining".format(path, os.getpid())
+                    os.rename(path, target)
+                    claimed.append(target)
+                finally:
+                    os.close(fd)
+        return claimed
+
+    def records(self, path):
+        '''
+        Read the records of a file, skipping a line that was only partly written when its process died.
+        '''
+        with open(path, encoding = "utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping a broken record in %s: %r", path, line)
+
+    def drain(self, handle):
+        '''
+        Hand the buffered records to handle, one call per file, removing each file once handle returns. Only one
+        drain runs at a time; the others return right away.
+
+        @param handle: called with an iterable of the records of one file
+        @return the number of files handled, or None if another drain is running
+        '''
+        if not os.path.isdir(self.directory):
+            return 0
+        lock = os.open(os.path.join(self.directory, ".drain.lock"), os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            claimed = self._claim()
+            for path in claimed:
+                handle(self.records(path))
+                os.remove(path)
+            return len(claimed)
+        finally:
+            os.close(lock)
@@ -1,9 +1,13 @@
 from django.conf.urls import patterns, include, url
 from django.conf import settings
 from .routes import routes
+from . import assets, media, metrics
 import sys
 
 urlpatterns = patterns('',
+    url(r'^{}(?P<path>.+)$'.format(settings.ASSET_URL.lstrip('/')), assets.serve),
+    url(r'^{}(?P<path>.+)$'.format(settings.MEDIA_URL.lstrip('/')), media.serve),
+    url(r'^{}$'.format(settings.METRICS_URL.lstrip('/')), metrics.view),
     url(r'', include(routes.urls)),
 )
 
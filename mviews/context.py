@@ -0,0 +1,97 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+What a ModelAsView reads from its request, each worked out the first time it is used. A GET never touches the
+body, and the query params are parsed once however many times the view and the serializer look at them.
+'''
+from json import loads as load
+
+from django.conf import settings
+from django.http import QueryDict
+from django.utils.functional import cached_property
+
+class BadPayload(ValueError):
+    '''
+    The payload could not be read. status is the status code to answer with.
+    '''
+
+    def __init__(self, msg, status = 400):
+        super(BadPayload, self).__init__(msg)
+        self.status = status
+
+class RequestContext(object):
+    '''
+    The lazily read options of a request. Any of them can be set to override what would be read from the request.
+
+    @param request: the request, or None for a view that is not answering one (such as render_snapshot)
+    @param params: the query params, defaulting to those of the request
+    @param accept: the Accept header, defaulting to that of the request
+    @param field_names: a function returning the field names of the model, to check _fields against
+    '''
+
+    def __init__(self, request = None, params = None, accept = None, field_names = tuple):
+        self.request = request
+        self.field_names = field_names
+        if params is not None:
+            self.params = params
+        if accept is not None:
+            self.accept = accept
+
+    @cached_property
+    def accept(self):
+        if self.request is None:
+            return 'application/json'
+        return self.request.META.get('HTTP_ACCEPT', 'application/json')
+
+    @cached_property
+    def params(self):
+        return QueryDict('') if self.request is None else self.request.GET
+
+    @cached_property
+    def fields(self):
+        names = self.field_names()
+        return [f for f in self.params.get('_fields', "").split(',') if f in names]
+
+    @cached_property
+    def expand(self):
+        return '_expand' in self.params
+
+    @cached_property
+    def sdepth(self):
+        depth = self.params.get('_depth')
+        return int(depth) if depth is not None and depth.isdigit() else 0
+
+    @cached_property
+    def format(self):
+        return self.params.get('_format', '')
+
+    @cached_property
+    def orient(self):
+        return self.params.get('_orient', 'rows')
+
+    @cached_property
+    def data(self):
+        '''
+        The decoded json payload, or an empty string if there is none. Raises BadPayload with status 413 if it is
+        larger than MVIEWS_MAX_BODY_BYTES, and with status 400 if it is not json.
+        '''
+        if self.request is None:
+            return ''
+        limit = getattr(settings, 'MVIEWS_MAX_BODY_BYTES', 2621440)
+        try:
+            length = int(self.request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > limit:
+            raise BadPayload("The payload is larger than {} bytes.".format(limit), 413)
+        d = self.request.read(limit + 1) #a chunked body has no length to check up front
+        if len(d) > limit:
+            raise BadPayload("The payload is larger than {} bytes.".format(limit), 413)
+        if d:
+            try:
+                d = load(d.decode('utf-8'))
+            except ValueError as e:
+                raise BadPayload("Not a valid json object: {}".format(e))
+        return d
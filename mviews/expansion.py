@@ -0,0 +1,126 @@
+"""
+Fetches everything an _expand serialization is going to touch before the serializer walks it, one depth level at a
+time. At each level the objects are grouped by model and every relation the serializer will follow (labels,
+comments, user, post_set, ...) is prefetched for the whole group at once. The relations of a level do not depend
+on each other, so they run in parallel on the mviews.idbatch thread pool, each on its own connection, and a level
+takes as long as its slowest relation instead of all of them added up.
+
+The same row can turn up in many places (the one user of a hundred posts), so the fetched objects are put through
+an identity map keyed by (model, pk): every place a row shows up gets the same instance, and its relations are
+fetched once at the next level no matter how many parents it has.
+
+The levels follow the rules of serializer.foreign_obj_to_dict and foreign_rel_to_dict, so nothing is fetched that
+the serializer would not have fetched on its own, one query per object at a time.
+"""
+from django.db import connections
+
+try:
+    from django.db.models import prefetch_related_objects as _prefetch_objects
+    def _prefetch(objs, name):
+        _prefetch_objects(objs, name)
+except ImportError: #Django < 1.10
+    from django.db.models.query import prefetch_related_objects as _prefetch_objects
+    def _prefetch(objs, name):
+        _prefetch_objects(objs, [name])
+
+from . import idbatch
+
+def relations(model):
+    '''
+    Get the relations of a model by the attribute name they are reached with, as (is many, related model).
+    '''
+    rels = model.__dict__.get('_expansion_relations')
+    if rels is None:
+        rels = {}
+        for field in model._meta.get_fields():
+            if not field.is_relation or field.related_model is None:
+                continue
+            name = field.get_accessor_name() if field.auto_created and not field.concrete else field.name
+            rels[name] = (field.many_to_many or field.one_to_many, field.related_model)
+        model._expansion_relations = rels
+    return rels
+
+def _field_names(mview, obj, depth):
+    if depth == 0:
+        if mview.fields:
+            return set(mview.fields).intersection(mview.field_names)
+        return mview.field_names
+    if hasattr(obj, "public_fields"):
+        return obj.public_fields
+    return obj._meta.get_all_field_names()
+
+def _follow(mview, obj, depth):
+    '''
+    Get the relations the serializer follows from obj as (name, is many, depth of the children), where depth 0 is a
+    row of the queryset and depth n is an object passed to foreign_obj_to_dict at depth n.
+    '''
+    rels = relations(type(obj))
+    for name in _field_names(mview, obj, depth):
+        if name not in rels:
+            continue
+        many = rels[name][0]
+        if depth == 0:
+            yield name, many, (2 if mview.sdepth >= 1 else None) if many else 1
+        elif mview.sdepth >= depth:
+            yield name, many, (depth + 2 if mview.sdepth >= depth + 1 else None) if many else depth + 1
+
+def _fetch(objs, name):
+    try:
+        _prefetch(objs, name)
+    finally:
+        connections[objs[0]._state.db or 'default'].close()
+
+def expand(mview, rows):
+    '''
+    Prefetch the relations of the rows the serializer is about to expand.
+
+    @param mview: the mview object, for its fields and sdepth
+    @param rows: the model instances of the queryset
+    @return the rows as a list
+    '''
+    rows = list(rows)
+    identity = {}
+    def canonical(obj):
+        return identity.setdefault((type(obj), obj.pk), obj)
+    level = [(canonical(r), 0) for r in rows]
+    done = set()
+    while level:
+        groups = {}
+        follow = []
+        unique = {(id(o), d) : (o, d) for o, d in level} #an object with many parents is followed once
+        for obj, depth in unique.values():
+            for name, many, child_depth in _follow(mview, obj, depth):
+                follow.append((obj, name, many, child_depth))
+                if (type(obj), obj.pk, name) not in done:
+                    done.add((type(obj), obj.pk, name))
+                    groups.setdefault((type(obj), name), []).append(obj)
+        for objs in groups.values():
+            for obj in objs:
+                if not hasattr(obj, '_prefetched_objects_cache'):
+                    obj._prefetched_objects_cache = {} #threads would race to create it
+        tasks = list(groups.items())
+        if len(tasks) == 1:
+            (model, name), objs = tasks[0]
+            _prefetch(objs, name)
+        elif tasks:
+            for f in [idbatch.executor().submit(_fetch, objs, name) for (model, name), objs in tasks]:
+                f.result()
+        level = []
+        for obj, name, many, child_depth in follow:
+            if many:
+                qs = getattr(obj, name).all()
+                cached = getattr(qs, '_result_cache', None)
+                if cached is None:
+                    continue
+                cached[:] = [canonical(c) for c in cached]
+                if child_depth is not None:
+                    level.extend((c, child_depth) for c in cached)
+            else:
+                child = getattr(obj, name, None)
+                if child is None:
+                    continue
+                same = canonical(child)
+                if same is not child:
+                    setattr(obj, name, same)
+                level.append((same, child_depth))
+    return rows
@@ -0,0 +1,249 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+
+Bulk export of whole ModelAsView tables as CSV or NDJSON, in constant memory however many rows there are. Used by
+the export_table command and the streaming endpoint in controllers/export.py.
+
+Rows are read in primary key order a chunk at a time. On PostgreSQL they come from a server-side (named) cursor,
+so the database hands over EXPORT_CHUNK_SIZE rows per round trip instead of the client buffering the whole
+result; on the other databases each chunk is its own query starting after the last pk of the one before. Rows are
+encoded and written a chunk at a time too, and with gzip each chunk of a file is a gzip member of its own (gzip
+readers take a file of several members as one stream), so a file can be cut back to the end of any chunk. The HTTP
+stream is a single gzip stream instead, flushed after each chunk, since some clients stop at the first member.
+
+export splits a table with an integer pk into pk ranges and writes each to its own part file in a process pool.
+After every chunk a part's checkpoint records the last pk and the size of the file, so a run that is stopped
+picks up where it left off: each unfinished part is cut back to its checkpoint and continued from the pk after.
+'''
+import io
+import os
+import csv
+import gzip
+import json
+import zlib
+import itertools
+from concurrent import futures
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction, models as m
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .modelviews import BaseModelAsView
+
+formats = ("csv", "ndjson")
+_cursor_ids = itertools.count()
+
+def get_model(label):
+    '''
+    Get an exportable model by app_label.model_name, raising a LookupError if it is not a ModelAsView.
+    '''
+    model = apps.get_model(label)
+    if not issubclass(model, BaseModelAsView):
+        raise LookupError("{} is not a ModelAsView.".format(label))
+    return model
+
+def columns(model):
+    '''
+    The concrete fields of a model by attname, primary key first. Models with public_fields export only those.
+    '''
+    meta = model._meta
+    public = getattr(model, "public_fields", None)
+    cols = [meta.pk.attname]
+    for f in meta.concrete_fields:
+        if f.attname not in cols and (public is None or f.name in public or f.attname in public):
+            cols.append(f.attname)
+    return cols
+
+def chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 5000)
+
+def _query(model, cols, after, upto, using):
+    qs = model._default_manager.using(using).order_by("pk")
+    if after is not None:
+        qs = qs.filter(pk__gt = after)
+    if upto is not None:
+        qs = qs.filter(pk__lte = upto)
+    return qs.values_list(*cols)
+
+def chunks(model, cols, after = None, upto = None, using = None):
+    '''
+    Read the rows of a model in pk order, a list of tuples at a time.
+
+    @param cols: the columns to read, primary key first
+    @param after: only rows with a pk greater than this
+    @param upto: only rows with a pk up to and including this
+    @param using: the database alias, defaulting to the model's default database
+    '''
+    using = using or model._default_manager.db
+    size = chunk_size()
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        sql, params = _query(model, cols, after, upto, using).query.sql_with_params()
+        with transaction.atomic(using = using): #named cursors only live inside a transaction
+            connection.ensure_connection()
+            cursor = connection.connection.cursor(name = "export_{}_{}".format(os.getpid(), next(_cursor_ids)))
+            cursor.itersize = size
+            try:
+                cursor.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(size)
+                    if not rows:
+                        return
+                    yield [tuple(r) for r in rows]
+            finally:
+                cursor.close()
+    else:
+        while True:
+            rows = list(_query(model, cols, after, upto, using)[:size])
+            if not rows:
+                return
+            yield rows
+            after = rows[-1][0]
+
+def encode(fmt, cols, rows, header = False):
+    '''
+    Encode a chunk of rows as CSV or NDJSON text.
+
+    @param header: whether to start with the CSV header row
+    '''
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if header:
+            writer.writerow(cols)
+        writer.writerows(rows)
+        return buf.getvalue()
+    encoder = DjangoJSONEncoder(separators = (',', ':'))
+    return "".join(encoder.encode(dict(zip(cols, row))) + "\n" for row in rows)
+
+def ranges(model, parts, using = None):
+    '''
+    Split the pks of a model into at most parts (after, upto) ranges of about the same width. Models without an
+    integer pk, or with no rows, are a single range.
+    '''
+    using = using or model._default_manager.db
+    pk = model._meta.pk
+    if parts > 1 and isinstance(pk, (m.AutoField, m.IntegerField)):
+        bounds = model._default_manager.using(using).aggregate(lo = m.Min("pk"), hi = m.Max("pk"))
+        if bounds["lo"] is not None:
+            lo, hi = bounds["lo"] - 1, bounds["hi"]
+            width = -(-(hi - lo) // parts)
+            return [(a, min(a + width, hi)) for a in range(lo, hi, width)]
+    return [(None, None)]
+
+def _checkpoint(path):
+    try:
+        with open(path, encoding = "utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_checkpoint(path, state):
+    tmp = "{}.tmp".format(path)
+    with open(tmp, "w", encoding = "utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def export_part(label, path, fmt, compress, after, upto, using):
+    '''
+    Write one pk range of a model to a file, continuing from its checkpoint if there is one. Runs in a worker
+    process.
+
+    @return the number of rows written by this call
+    '''
+    model = get_model(label)
+    cols = columns(model)
+    ckpt_path = "{}.checkpoint".format(path)
+    state = _checkpoint(ckpt_path)
+    if state is not None and state.get("done"):
+        return 0
+    if state is None or not os.path.exists(path):
+        state = {"last" : after, "size" : 0, "rows" : 0, "done" : False}
+    written = 0
+    def write(f, data):
+        f.write(gzip.compress(data) if compress else data)
+        f.flush()
+        os.fsync(f.fileno())
+        state["size"] = f.tell()
+    try:
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            f.truncate(state["size"]) #whatever was written after the last checkpoint is written again
+            f.seek(state["size"])
+            if fmt == "csv" and state["size"] == 0:
+                write(f, encode(fmt, cols, [], header = True).encode("utf-8"))
+                _save_checkpoint(ckpt_path, state)
+            for rows in chunks(model, cols, state["last"], upto, using):
+                write(f, encode(fmt, cols, rows).encode("utf-8"))
+                written += len(rows)
+                state.update(last = rows[-1][0], rows = state["rows"] + len(rows))
+                _save_checkpoint(ckpt_path, state)
+        state["done"] = True
+        _save_checkpoint(ckpt_path, state)
+    finally:
+        for conn in connections.all():
+            conn.close()
+    return written
+
+def export(model, out, fmt = "csv", compress = False, parts = 1, workers = None, using = None, log = None):
+    '''
+    Export a model to part files in a directory, in parallel over pk ranges, resuming an earlier run into the same
+    directory. Files are named <app_label>.<model_name>.<part>.<fmt>[.gz], and each CSV part has its own header.
+
+    @param model: the ModelAsView class
+    @param out: the directory to write to
+    @param fmt: csv or ndjson
+    @param compress: whether to gzip the files
+    @param parts: how many pk ranges to split the table into
+    @param workers: the number of worker processes, defaulting to the number of cpus
+    @param using: the database alias to read from
+    @param log: a function to report progress to
+    @return the number of rows written
+    '''
+    if fmt not in formats:
+        raise ValueError("Format {} is not supported. Use csv or ndjson.".format(fmt))
+    log = log or (lambda msg: None)
+    using = using or model._default_manager.db
+    label = "{}.{}".format(model._meta.app_label, model._meta.model_name)
+    os.makedirs(out, exist_ok = True)
+    plan_path = os.path.join(out, "{}.plan.json".format(label))
+    plan = _checkpoint(plan_path)
+    if plan is None or plan.get("fmt") != fmt or plan.get("compress") != compress:
+        plan = {"fmt" : fmt, "compress" : compress, "ranges" : ranges(model, parts, using)}
+        _save_checkpoint(plan_path, plan) #a resumed run keeps the ranges its checkpoints belong to
+    else:
+        log("Resuming the export of {} in {}.".format(label, out))
+    suffix = "{}{}".format(fmt, ".gz" if compress else "")
+    jobs = [(label, os.path.join(out, "{}.{:04d}.{}".format(label, n, suffix)), fmt, compress, after, upto, using)
+            for n, (after, upto) in enumerate(plan["ranges"])]
+    for conn in connections.all():
+        conn.close() #the workers must not share the connections of this process
+    total = 0
+    with futures.ProcessPoolExecutor(max_workers = workers) as pool:
+        for job, rows in zip(jobs, pool.map(export_part, *zip(*jobs))):
+            total += rows
+            log("Wrote {} rows to {}.".format(rows, job[1]))
+    return total
+
+def stream(model, fmt = "csv", compress = False, after = None, using = None):
+    '''
+    Export a model as an iterator of bytes, for a streaming response. Rows are in pk order, so a client that lost
+    its connection can ask for the rest with after set to the last pk it got. With compress the body is one gzip
+    stream, sync flushed after every chunk so the client gets each chunk as it is sent.
+    '''
+    if fmt not in formats:
+        raise ValueError("Format {} is not supported. Use csv or ndjson.".format(fmt))
+    cols = columns(model)
+    if compress:
+        z = zlib.compressobj(wbits = 31) #31 writes the gzip header and trailer
+        pack = lambda data: z.compress(data) + z.flush(zlib.Z_SYNC_FLUSH)
+    else:
+        pack = lambda data: data
+    if fmt == "csv":
+        yield pack(encode(fmt, cols, [], header = True).encode("utf-8"))
+    for rows in chunks(model, cols, after, None, using):
+        yield pack(encode(fmt, cols, rows).encode("utf-8"))
+    if compress:
+        yield z.flush()
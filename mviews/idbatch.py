@@ -0,0 +1,118 @@
+"""
+Resolves long lists of ids without building a single unbounded IN list. The ids are deduplicated and checked
+against the primary key field, then fetched MVIEWS_ID_CHUNK_SIZE at a time with the chunks running concurrently on
+up to MVIEWS_ID_WORKERS threads. Each thread uses its own database connection and closes it when its chunk is done
+(with the pooled backend that just hands it back to the pool). The rows are put back in the order the ids were
+asked for.
+
+With the pooled backend (see home/dbpool/base.py) every worker takes a connection of its own on top of the one of
+the request, so the chunks only run on the workers while the pool has MVIEWS_ID_WORKERS plus MVIEWS_ID_POOL_RESERVE
+connections free; otherwise they are fetched one after the other on the calling thread. A chunk whose worker still
+could not get a connection in time is fetched again on the calling thread. Size POOL['MAX_SIZE'] for the requests
+a process serves at once plus MVIEWS_ID_WORKERS for the id lookups that should run in parallel.
+
+Lists no longer than a chunk are fetched with a single query on the calling thread as before.
+"""
+import os
+import threading
+from concurrent import futures
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+
+from home.dbpool.base import PoolTimeout
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+def chunk_size():
+    return getattr(settings, 'MVIEWS_ID_CHUNK_SIZE', 500)
+
+def executor():
+    '''
+    The thread pool of this process, made on first use.
+    '''
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        with _lock:
+            if _executor_pid != os.getpid():
+                _executor = futures.ThreadPoolExecutor(max_workers = getattr(settings, 'MVIEWS_ID_WORKERS', 4))
+                _executor_pid = os.getpid()
+    return _executor
+
+def clean_ids(model, ids):
+    '''
+    Drop blanks and duplicates and convert the ids to the type of the model's primary key, keeping the order they
+    were given in.
+
+    Raises a ValueError for an id that is not valid for the primary key.
+
+    @param model: the model the ids are of
+    @param ids: an iterable of ids, usually strings from the path or the ids query param
+    @return the list of unique ids
+    '''
+    pk = model._meta.pk
+    seen = set()
+    cleaned = []
+    for i in ids:
+        if isinstance(i, str):
+            i = i.strip()
+            if not i:
+                continue
+        try:
+            i = pk.to_python(i)
+        except ValidationError:
+            raise ValueError("{} is not a valid {}.".format(i, pk.name))
+        if i not in seen:
+            seen.add(i)
+            cleaned.append(i)
+    return cleaned
+
+def _fetch(qs, ids):
+    try:
+        return list(qs.filter(pk__in = ids))
+    except PoolTimeout:
+        return None #the calling thread fetches it
+    finally:
+        connections[qs.db].close()
+
+def _workers_fit(qs, workers):
+    '''
+    Whether the pool of the queryset's database has room for the workers' connections and the reserve. Databases
+    that are not pooled always do.
+    '''
+    pool = getattr(connections[qs.db], 'pool', None)
+    return pool is None or pool.available() >= workers + getattr(settings, 'MVIEWS_ID_POOL_RESERVE', 2)
+
+def resolve(qs, ids):
+    '''
+    Get the rows of the queryset whose primary key is one of the ids, in the order of the ids. Works for querysets of
+    models, of values() dictionaries (as long as they include the primary key) and of values_list() tuples (as long
+    as the primary key comes first).
+
+    @param qs: the queryset, with everything but the id filter applied
+    @param ids: the list of ids as returned by clean_ids
+    @return the list of rows
+    '''
+    size = chunk_size()
+    qs = qs.using(qs.db) #routers are consulted per thread, so pick the database here
+    if len(ids) <= size:
+        rows = list(qs.filter(pk__in = ids))
+    else:
+        chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+        rows = []
+        if _workers_fit(qs, min(len(chunks), getattr(settings, 'MVIEWS_ID_WORKERS', 4))):
+            results = executor().map(lambda chunk: _fetch(qs, chunk), chunks)
+        else:
+            results = [None] * len(chunks)
+        for chunk, result in zip(chunks, results):
+            rows.extend(result if result is not None else qs.filter(pk__in = chunk))
+    pk = qs.model._meta.pk
+    def key(row):
+        if isinstance(row, dict):
+            return row.get(pk.attname, row.get(pk.name))
+        return row[0] if isinstance(row, tuple) else row.pk
+    position = {i : n for n, i in enumerate(ids)}
+    return sorted(rows, key = lambda row: position.get(key(row), len(position)))
@@ -0,0 +1,51 @@
+'''
+Created on Oct 19, 2026
+
+@author: derigible
+'''
+import os
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mviews import export
+
+class Command(BaseCommand):
+    '''
+    Export a whole ModelAsView table to CSV or NDJSON part files, in parallel and in constant memory. Running it
+    again into the same directory resumes a run that was stopped (and does nothing after one that finished), so
+    export into a new or emptied directory to start over. See mviews/export.py.
+    '''
+    args = '<app_label.model_name>'
+    help = 'Export a table to CSV or NDJSON files, split by pk range across worker processes.'
+    option_list = BaseCommand.option_list + (
+        make_option('--out', dest = 'out', default = None,
+                    help = 'The directory to write to. Defaults to EXPORT_TABLE_DIR/<app_label.model_name>.'),
+        make_option('--format', dest = 'format', default = 'csv',
+                    help = 'csv or ndjson.'),
+        make_option('--gzip', dest = 'gzip', action = 'store_true', default = False,
+                    help = 'Compress the files.'),
+        make_option('--parts', dest = 'parts', type = 'int', default = None,
+                    help = 'The number of pk ranges to split the table into. Defaults to the number of workers.'),
+        make_option('--workers', dest = 'workers', type = 'int', default = None,
+                    help = 'The number of worker processes. Defaults to the number of cpus.'),
+        make_option('--database', dest = 'database', default = None,
+                    help = 'The database to read from. Defaults to the one the routers pick.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Pass in exactly one app_label.model_name to export.")
+        try:
+            model = export.get_model(args[0])
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+        out = options['out'] or os.path.join(settings.EXPORT_TABLE_DIR, args[0].lower())
+        parts = options['parts'] or options['workers'] or os.cpu_count() or 1
+        try:
+            rows = export.export(model, os.path.abspath(out), options['format'], options['gzip'], parts,
+                                 options['workers'], options['database'], log = self.stdout.write)
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write("Wrote {} rows of {} to {}.".format(rows, args[0], out))
@@ -0,0 +1,64 @@
+"""
+Created on Oct 19, 2026
+
+@author: derigible
+
+The change log of the ModelAsView models, which clients that mirror them read through the changes feed in
+controllers/sync.py instead of downloading whole tables again.
+
+Every save and delete of a ModelAsView adds a Change with an increasing seq, so a client only has to remember the
+cursor of the feed: the last seq it has seen and the lower seqs whose transactions had not committed yet. Changes
+are recorded by the signals below, and by BaseModelAsView for the writes that do not send signals (bulk creates and
+updates of a queryset). A bulk create on a database that does not hand back the new keys records a single change
+with no pk, which tells the client to fetch the model again.
+"""
+from django.db import models as m
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .modelviews import BaseModelAsView
+
+class Change(m.Model):
+    '''
+    A row of a ModelAsView model that was saved or deleted.
+    '''
+    seq = m.AutoField(primary_key = True)
+    model = m.CharField('The app_label.model_name of the changed row.', max_length = 100)
+    object_pk = m.TextField('The primary key of the changed row, or null if it is not known.', null = True)
+    deleted = m.BooleanField('If the row was deleted.', default = False)
+    at = m.DateTimeField('When the change was recorded.', auto_now_add = True)
+
+    class Meta:
+        index_together = (("model", "seq"),)
+
+    @staticmethod
+    def label(model):
+        return "{}.{}".format(model._meta.app_label, model._meta.model_name)
+
+    @classmethod
+    def record(cls, model, pks, deleted = False):
+        '''
+        Record changes to rows of a model.
+
+        @param model: the model class
+        @param pks: an iterable of the primary keys of the rows; a None records a single change with no pk
+        @param deleted: if the rows were deleted
+        '''
+        pks = list(pks)
+        if not pks:
+            return
+        if None in pks:
+            pks = [None]
+        label = cls.label(model)
+        cls.objects.bulk_create([cls(model = label, object_pk = None if pk is None else str(pk), deleted = deleted)
+                                 for pk in pks])
+
+@receiver(post_save)
+def record_save(sender, instance, raw = False, **kwargs):
+    if isinstance(instance, BaseModelAsView) and not raw:
+        Change.record(sender, (instance.pk,))
+
+@receiver(post_delete)
+def record_delete(sender, instance, **kwargs):
+    if isinstance(instance, BaseModelAsView):
+        Change.record(sender, (instance.pk,), deleted = True)
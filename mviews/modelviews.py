@@ -11,15 +11,24 @@ Django models. This only adds some automatic support to the manager, nothing
 more.
 """
 
-from json import loads as load
+from urllib.parse import urlencode
 
-from django.db import models as m
+from django.db import models as m, router, transaction, DatabaseError, DEFAULT_DB_ALIAS
+from django.dispatch import Signal
 from django.views.generic.base import View
-from django.http.response import HttpResponse
+from django.http import QueryDict
+from django.http.response import HttpResponse, StreamingHttpResponse
 from django.core import serializers as sz
 from django.contrib.auth.models import AbstractBaseUser
 
-from .serializer import serialize
+from .serializer import serialize, serialize_columnar, columns
+from .context import RequestContext, BadPayload
+from . import idbatch
+from home import snapshots
+
+#sent after the writes of BaseModelAsView that send no post_save (the bulk_create of a list POST and the queryset
+#update of a PUT), with the pks of the rows and whether they were created, for receivers of post_save to follow
+bulk_saved = Signal(providing_args = ["pks", "created"])
 
 
 def err(msg, status = 400):
@@ -34,44 +43,63 @@ def err(msg, status = 400):
     resp.reason_phrase = msg
     return resp
     
-def read(request):
+def _from_context(name):
     '''
-    Read and decode the payload.
-    
-    @param request: the request object to read
-    @return the decoded request payload
+    A view attribute that is read from, and set on, the view's RequestContext.
     '''
-    d = request.read()
-    if d:
-        try:
-            d = load(d.decode('utf-8'))
-        except ValueError as e:
-            raise ValueError("Not a valid json object: {}".format(e))
-    return d
+    def fget(self):
+        return getattr(self.context, name)
+    def fset(self, value):
+        setattr(self.context, name, value)
+    return property(fget, fset)
 
 class ViewWrapper(View):
     """
     A wrapper to ensure that the view class never gets positional arguments so
     as to make it work with being combined with Models.
+    
+    The options of the request (accept, params, fields, expand, sdepth, format,
+    orient and the json payload in data) are read from a RequestContext the first time they are
+    used, so a GET never reads the body.
     """
     register_route = False
+    
+    accept = _from_context('accept')
+    params = _from_context('params')
+    fields = _from_context('fields')
+    expand = _from_context('expand')
+    sdepth = _from_context('sdepth')
+    format = _from_context('format')
+    orient = _from_context('orient')
+    data = _from_context('data')
+    
     def __init__(self, *args, **kwargs):
         super(ViewWrapper, self).__init__(**kwargs)
         
+    @property
+    def context(self):
+        ctx = self.__dict__.get('_context')
+        if ctx is None:
+            ctx = self._context = RequestContext(field_names = lambda: self.field_names)
+        return ctx
+        
+    def set_params(self, params, accept = 'application/json'):
+        '''
+        Set the query params and the options read from them.
+        
+        @param params: the QueryDict of the query params
+        @param accept: the Accept header
+        '''
+        self._context = RequestContext(params = params, accept = accept, field_names = lambda: self.field_names)
+        
     def dispatch(self, request, *args, **kwargs):
         #It makes sense why these are stored in the request, but i want them
         #in the view for convenience purposes
-        self.accept = request.META.get('HTTP_ACCEPT', 'application/json')
-        self.params = request.GET
-        self.fields = [f for f in self.params.get('_fields', "").split(',') 
-                       if f in self.field_names]
-        self.expand = '_expand' in self.params
-        self.sdepth = int(self.params['_depth']) if self.params.get('_depth', None) is not None and self.params.get('_depth', None).isdigit() else 0
+        self._context = RequestContext(request, field_names = lambda: self.field_names)
         try:
-            self.data = read(request)
-        except ValueError as e:
-            return err(e)
-        return super(ViewWrapper, self).dispatch(request, *args, **kwargs)
+            return super(ViewWrapper, self).dispatch(request, *args, **kwargs)
+        except BadPayload as e: #raised by the first use of self.data
+            return err(e, e.status)
 
 class BaseModelWrapper():
     """
@@ -119,6 +147,8 @@ class BaseModelAsView(BaseModelWrapper, ViewWrapper):
     ViewWrapper.
     """
     
+    snapshot_params = None
+    
     @property
     def m2ms(self):
         if not hasattr(self, "_m2ms"):
@@ -139,34 +169,79 @@ class BaseModelAsView(BaseModelWrapper, ViewWrapper):
             self._field_names = self.__class__._meta.get_all_field_names()
         return self._field_names
         
-    def _get_qs(self, *args, **kwargs):
+    @classmethod
+    def render_snapshot(cls, pk):
         '''
-        A helper method to get the queryset, to be used for GET, PUT, and maybe DELETE. Look at the
-        GET docs to see how this works.
+        Render the json a GET of the single object would get with the query params in the snapshot_params
+        dictionary of the class. Set snapshot_params to have the response kept in home.snapshots and served from
+        there; the model is then responsible for calling snapshots.refresh whenever the rendered object changes.
+        
+        @param pk: the primary key of the object
+        @return the json string, or None if there is no such object
+        '''
+        view = cls()
+        view.set_params(QueryDict(urlencode(cls.snapshot_params)))
+        rows = list(cls.objects.filter(pk = pk).select_related())
+        if not rows:
+            return None
+        return serialize(view, rows)
+    
+    def _snapshot(self, request, path):
+        '''
+        Get the stored snapshot if the request is exactly a json GET of one object with the snapshot_params.
+        '''
+        ids = path.split('/')[:-1]
+        if (len(ids) != 1 or 'xml' in self.accept or len(request.GET) != len(self.snapshot_params) or
+                any(request.GET.getlist(k) != [v] for k, v in self.snapshot_params.items())):
+            return None
+        try:
+            pks = idbatch.clean_ids(self.__class__, ids)
+        except ValueError:
+            return None
+        if not pks: #a blank id
+            return None
+        pk = pks[0]
+        data = snapshots.read(self.__class__, pk)
+        if data is None:
+            data = snapshots.fill(self.__class__, pk)
+        return data
+    
+    def _get_batch(self, *args, **kwargs):
+        '''
+        A helper method to get the queryset and the ids to fetch, for GET. Look at the GET docs to see how this
+        works.
+        
+        The ids are deduplicated and checked against the primary key, raising a ValueError if one is not
+        valid. A single id is filtered on; more than one is not, but returned for idbatch.resolve to fetch in
+        order.
+        
+        @return the queryset and the list of ids, or None for the ids if the queryset is all there is to it
         '''
-        def filter_by_pks(vals):
-            for f in self.field_names:
-                if getattr(self._meta.get_field_by_name(f)[0], "primary_key", False):
-                    return {f + "__in" : vals}
-            else:
-                return {}
         args = args[0].split('/')[:-1]
         if "ids" in self.params:
             args += self.params.get('ids').split(',')
+        args = idbatch.clean_ids(self.__class__, args)
+        batch_ids = None
         filtered = self.__class__.objects.all()
-        if len(args) == 1 and 'id' in self.field_names:
-            filtered = filtered.filter(id = args[0])
-        elif 'id' in self.field_names and args:
-            filtered = filtered.filter(id__in = args)
-        elif args:
-            filtered = filtered.filter(**filter_by_pks(args))            
+        if len(args) == 1:
+            filtered = filtered.filter(pk = args[0])
+        elif len(args) > 1:
+            batch_ids = args
         if self.fields:
             if self.expand:
                 filtered.only(*self.fields)
             else:
                 filtered.values(*self.fields)
         reqDict = {field : self.params[field] for field in self.field_names if field in self.params} 
-        return filtered.filter(**reqDict)
+        return filtered.filter(**reqDict), batch_ids
+    
+    def _get_qs(self, *args, **kwargs):
+        '''
+        A helper method to get the queryset, to be used for PUT and DELETE, filtered on all of the ids. Look at
+        the GET docs to see how this works.
+        '''
+        qs, ids = self._get_batch(*args, **kwargs)
+        return qs if ids is None else qs.filter(pk__in = ids)
     
     def get(self, request, *args, **kwargs):
         '''
@@ -197,13 +272,54 @@ class BaseModelAsView(BaseModelWrapper, ViewWrapper):
         fields requested, otherwise all fields are returned.
         
         If the _depth field is included with a valid number, 
+        
+        Reads may be routed to a replica. If the replica errors, the routers that have a replica_failed method are
+        told about it and the read is done again on the primary.
+        
+        Rows asked for by id come back in the order of the ids. A long list of ids is fetched in chunks in
+        parallel; see mviews.idbatch.
+        
+        Models with snapshot_params answer a GET of a single object with exactly those params from a
+        pre-rendered snapshot; see render_snapshot.
+        
+        Large lists are smaller and quicker with _format=columnar, which sends the field names once and then
+        each row as an array (or each column as an array with _orient=columns), streamed as it is encoded:
+        
+            {"columns" : ["id", <field>, ...], "rows" : [[<id>, <value>, ...], ...]}
+            
+        The first column is always the primary key, and foreign keys are sent by attname (user_id). It is
+        ignored with _expand or for xml.
         '''
-        qs = self._get_qs(*args, **kwargs)
+        if self.snapshot_params is not None and snapshots.enabled():
+            data = self._snapshot(request, *args)
+            if data is not None:
+                return HttpResponse(data, content_type = "application/json")
+        try:
+            qs, batch_ids = self._get_batch(*args, **kwargs)
+        except ValueError as e:
+            return err(e)
+        columnar = self.format == "columnar" and not self.expand and 'xml' not in self.accept
         if self.expand:
             qs = qs.select_related().prefetch_related()
+        elif columnar:
+            cols = columns(self)
+            qs = qs.values_list(*cols)
         else:
             qs = qs.values()
-        return self.response(qs)
+        def respond(qs):
+            rows = qs if batch_ids is None else idbatch.resolve(qs, batch_ids)
+            if columnar:
+                return StreamingHttpResponse(serialize_columnar(self, rows, cols), content_type = "application/json")
+            return self.response(rows)
+        try:
+            return respond(qs)
+        except DatabaseError:
+            if qs.db == DEFAULT_DB_ALIAS:
+                raise
+            for r in router.routers:
+                if hasattr(r, 'replica_failed'):
+                    r.replica_failed(qs.db)
+            return respond(qs.using(DEFAULT_DB_ALIAS))
     
     def post(self, request, *args, **kwargs):
         '''
@@ -221,8 +337,35 @@ class BaseModelAsView(BaseModelWrapper, ViewWrapper):
         If your model requires that the user is registered on create, then
         add the register_user_on_create = <user_model_field_name> where the
         value is the name of the field the user model is in. 
+        
+        To create many entities at once, pass a list of data objects instead:
+        
+        {
+            "data" : [
+                { "<data_field_name>" : "<data>" | <data>, ... }, ...
+            ]
+        }
+        
+        The list is written with a single bulk_create through the model's
+        manager, so m2m fields are not supported and nothing is returned but 
+        status 204 if successful. Since bulk_create sends no signals, the
+        changes are recorded in mviews.models.Change here and bulk_saved
+        is sent.
         '''
         user_field_name = getattr(self, 'register_user_on_create', '')
+        if type(self.data["data"]) == list:
+            if user_field_name:
+                for d in self.data["data"]:
+                    d[user_field_name] = request.user
+            from .models import Change #mviews.models imports this module
+            try:
+                with transaction.atomic(): #the changes commit with the rows, or a feed reader could pass them by
+                    created = self.__class__.objects.bulk_create([self.__class__(**d) for d in self.data["data"]])
+                    Change.record(self.__class__, (o.pk for o in created))
+            except PermissionError as e:
+                return err(e, 403)
+            bulk_saved.send(sender = self.__class__, pks = [o.pk for o in created if o.pk is not None], created = True)
+            return self.other_response()
         if user_field_name:
             self.data["data"][user_field_name] = request.user
         bp = self.__class__.objects.create(**self.data["data"])
@@ -252,10 +395,19 @@ class BaseModelAsView(BaseModelWrapper, ViewWrapper):
         
         Filtering is done in the same way as GET.
         '''
-        qs = self._get_qs(*args, **kwargs)
+        try:
+            qs = self._get_qs(*args, **kwargs)
+        except ValueError as e:
+            return err(e)
         if len(qs) > 1:
             return err("Can only update one entity at a time.")
-        qs.update(**self.data["data"])
+        update = self.data["data"] #read before anything is written, so a bad payload writes nothing
+        from .models import Change #mviews.models imports this module
+        pks = [o.pk for o in qs]
+        with transaction.atomic(): #the change commits with the update, or a feed reader could read the old row
+            qs.update(**update)
+            Change.record(self.__class__, pks)
+        bulk_saved.send(sender = self.__class__, pks = pks, created = False)
         if len(self.data) > 1: #there are many2many fields to add and delete, lets add them
             for m2m in self.m2ms:
                 print(m2m)
@@ -280,7 +432,10 @@ class BaseModelAsView(BaseModelWrapper, ViewWrapper):
         if not args:
             if "ids" not in self.params:
                 return err("Did not contain any valid ids to delete.")
-        deletes = self._get_qs(*args, **kwargs)        
+        try:
+            deletes = self._get_qs(*args, **kwargs)
+        except ValueError as e:
+            return err(e)
         deletes.delete_entity()
         return self.other_response()
     
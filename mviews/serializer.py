@@ -13,6 +13,7 @@ To make this possible, a few more attributes must be added to a model:
 
 
 import json
+from itertools import islice
 from xml.etree import ElementTree
 from collections import OrderedDict as od
 
@@ -23,6 +24,8 @@ from django.db.models.fields.related import RelatedField
 from django.db import models
 from django.db.models.manager import Manager
 
+from . import expansion
+
 
 def _output_raw(field):
     """
@@ -42,7 +45,12 @@ def foreign_obj_to_dict(mview, fobj, depth):
     else:
         fields = fobj._meta.get_all_field_names()
     fkDict = {}
+    rels = expansion.relations(type(fobj))
     for f in fields:
+        if f in rels and mview.sdepth < depth: #not followed this deep, so not loaded (or prefetched) either
+            if not rels[f][0] and fobj.serializable_value(f) is None:
+                fkDict[f] = None #an empty foreign key has always been sent as null
+            continue
         fo = getattr(fobj, f)
         if isinstance(fo, Manager):
             if mview.sdepth >= depth:
@@ -86,7 +94,7 @@ def _serialize_json(mview, qs):
     else:
         rslt = {"data" : []}
         vals = rslt["data"]
-        for m in qs:
+        for m in expansion.expand(mview, qs):
             obj = {}
             vals.append(obj)
             for f in field_names:
@@ -105,6 +113,73 @@ def _serialize_json(mview, qs):
         
     return rslt
 
+columnar_chunk_size = 1000
+
+def columns(mview):
+    """
+    The columns of a columnar response: the primary key, then the concrete
+    fields asked for with _fields (or all of them), by attname.
+    """
+    meta = mview.__class__._meta
+    attnames = {}
+    for f in meta.concrete_fields:
+        attnames[f.name] = attnames[f.attname] = f.attname
+    wanted = [attnames[f] for f in mview.fields if f in attnames] if mview.fields else list(attnames.values())
+    cols = [meta.pk.attname]
+    for c in wanted:
+        if c not in cols:
+            cols.append(c)
+    return cols
+
+def serialize_columnar(mview, rows, cols):
+    """
+    Serialize values_list tuples with the column names sent once:
+    
+        {"columns" : [<name>, ...], "rows" : [[<value>, ...], ...]}
+        
+    or, with _orient=columns, one array per column:
+    
+        {"columns" : [<name>, ...], "values" : [[<first column's values>], ...]}
+        
+    Rows are read from the queryset's iterator a chunk at a time and encoded
+    a chunk at a time, so neither the rows nor their json are all held at
+    once (the column arrays are, for _orient=columns). The first chunk is
+    read before returning, so database errors are raised to the caller
+    rather than in the middle of the stream.
+    
+    @param mview: the mview object
+    @param rows: a values_list queryset or a list of tuples, in cols order
+    @param cols: the column names
+    @return an iterator of json strings
+    """
+    encode = djson(separators = (',', ':')).encode
+    it = rows.iterator() if hasattr(rows, "iterator") else iter(rows)
+    first = list(islice(it, columnar_chunk_size))
+    head = '{{"columns":{},'.format(encode(cols))
+    if mview.orient == "columns":
+        values = [[] for c in cols]
+        batch = first
+        while batch:
+            for column, vals in zip(values, zip(*batch)):
+                column.extend(vals)
+            batch = list(islice(it, columnar_chunk_size))
+        def chunks():
+            yield head + '"values":['
+            for n, column in enumerate(values):
+                yield (',' if n else '') + encode(column)
+            yield ']}'
+    else:
+        def chunks():
+            yield head + '"rows":['
+            batch = first
+            sep = ''
+            while batch:
+                yield sep + encode(batch)[1:-1]
+                sep = ','
+                batch = list(islice(it, columnar_chunk_size))
+            yield ']}'
+    return chunks()
+
 def serialize(mview, qs, serializer=None):
     """
     One of two public methods of this package. Pass in the ModelAsView object 